@@ -0,0 +1,31 @@
+import os
+import platform
+
+
+def data_dir():
+    """Get the per-user folder LandPlayer keeps its caches in, creating it if needed"""
+    # Allow overriding the location (portable installs, benchmarks)
+    base_path = os.environ.get('LANDPLAYER_HOME')
+    if not base_path:
+        if platform.system() == 'Windows':
+            root = os.environ.get('LOCALAPPDATA') or os.environ.get('APPDATA') or os.path.expanduser('~')
+        else:
+            root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        base_path = os.path.join(root, 'LandPlayer')
+
+    os.makedirs(base_path, exist_ok=True)
+    return base_path
+
+
+def data_path(name):
+    """Get the absolute path of a file inside the LandPlayer data folder"""
+    return os.path.join(data_dir(), name)
+
+
+def file_identity(file_path):
+    """Return (size, mtime_ns) for a file, or None if it can't be stat'ed"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
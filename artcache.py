@@ -0,0 +1,263 @@
+"""Album-art thumbnail cache with background decoding.
+
+Thumbnails are decoded and resized on worker threads and kept in an LRU of
+ready-to-display PIL images, optionally backed by PNG files on disk keyed by
+file identity. The disk cache is trimmed to a size limit, least recently used
+first (a disk hit touches the file's mtime). Files known to have no art get a
+marker holding their folder's mtime, so a cover image added later is found.
+Only the final PhotoImage conversion happens on the Tk thread. PIL is imported
+by the first decode, not at startup.
+"""
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from appdata import data_path, file_identity
+from metadata import get_pipeline
+from instrument import log, span, increment
+
+THUMBNAIL_SIZE = (300, 300)
+
+# Bytes the on-disk thumbnails may take; trimming goes down to TRIM_TO of it
+DISK_CACHE_LIMIT = 64 * 1024 * 1024
+TRIM_TO = 0.8
+# Each file takes at least a filesystem block, however small
+MIN_FILE_BYTES = 4096
+
+# Marker stored in place of an image for files known to have no art
+NO_ART = object()
+
+
+class ArtCache:
+    """LRU of album-art thumbnails with on-disk backing and prefetching"""
+
+    def __init__(self, capacity=64, disk_cache=True, workers=2, size=THUMBNAIL_SIZE, artwork_loader=None,
+                 disk_limit=DISK_CACHE_LIMIT):
+        self.capacity = capacity
+        # Returns a file's artwork bytes (or None); defaults to the metadata pipeline
+        self.artwork_loader = artwork_loader or get_pipeline().artwork
+        self.size = size
+        self.disk_dir = data_path('art') if disk_cache else None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self.images = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="art")
+
+        self.disk_limit = disk_limit
+        self.disk_used = None  # Bytes on disk, unknown until the first trim
+        self.disk_lock = threading.Lock()
+        if self.disk_dir:
+            # Measure (and trim) what earlier sessions left, off the startup path
+            self.pool.submit(self.trim_disk)
+
+        # PhotoImages only ever touched from the Tk thread
+        self.photos = OrderedDict()
+
+    def _cache_key(self, file_path, identity):
+        raw = f"{file_path}|{identity[0]}|{identity[1]}|{self.size[0]}x{self.size[1]}"
+        return hashlib.sha1(raw.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def _remember(self, file_path, image):
+        with self.lock:
+            self.images[file_path] = image
+            self.images.move_to_end(file_path)
+            while len(self.images) > self.capacity:
+                self.images.popitem(last=False)
+
+    def lookup(self, file_path):
+        """Memory-only lookup: (found, image) where image is None if there is no art"""
+        with self.lock:
+            image = self.images.get(file_path)
+            if image is None:
+                return False, None
+            self.images.move_to_end(file_path)
+        return True, (None if image is NO_ART else image)
+
+    def fetch(self, file_path, artwork=None):
+        """Get a thumbnail (or None), decoding it if needed. Blocking.
+
+        Pass artwork when the caller already read the picture bytes.
+        """
+        found, image = self.lookup(file_path)
+        if found:
+            return image
+
+        identity = file_identity(file_path)
+        key = self._cache_key(file_path, identity) if identity and self.disk_dir else None
+
+        image = self._load_from_disk(key, file_path) if key else None
+        if image is None:
+            increment('art_decodes')
+            with span('art_decode'):
+                if artwork is None:
+                    artwork = self.artwork_loader(file_path)
+                image = self._decode(file_path, artwork)
+            if key:
+                self._store_on_disk(key, image, file_path)
+        else:
+            increment('art_disk_hits')
+
+        self._remember(file_path, image)
+        return None if image is NO_ART else image
+
+    def _decode(self, file_path, artwork):
+        if not artwork:
+            return NO_ART
+        from PIL import Image
+        try:
+            img = Image.open(io.BytesIO(artwork))
+            img.draft('RGB', self.size)  # Let JPEG decode at reduced size
+            img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            # Resize to fit nicely
+            img.thumbnail(self.size, Image.Resampling.LANCZOS)
+            return img
+        except Exception as e:
+            log.warning(f"Could not decode artwork for {os.path.basename(file_path)}: {e}")
+            return NO_ART
+
+    def _folder_stamp(self, file_path):
+        """The folder's mtime as marker contents; adding a cover image changes it"""
+        try:
+            return str(os.stat(os.path.dirname(file_path) or '.').st_mtime_ns).encode('ascii')
+        except OSError:
+            return b''
+
+    def _load_from_disk(self, key, file_path):
+        base = os.path.join(self.disk_dir, key)
+        try:
+            with open(base + '.none', 'rb') as f:
+                stamp = f.read()
+        except OSError:
+            pass
+        else:
+            if stamp != self._folder_stamp(file_path):
+                # The folder changed since; look for art again
+                return None
+            self._touch(base + '.none')
+            return NO_ART
+        if not os.path.exists(base + '.png'):
+            return None
+        from PIL import Image
+        try:
+            with Image.open(base + '.png') as img:
+                img.load()
+                image = img.copy()
+        except (OSError, ValueError):
+            return None
+        self._touch(base + '.png')
+        return image
+
+    def _touch(self, path):
+        # The mtime orders entries for trimming
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _store_on_disk(self, key, image, file_path):
+        base = os.path.join(self.disk_dir, key)
+        try:
+            if image is NO_ART:
+                path = base + '.none'
+                with open(path, 'wb') as f:
+                    f.write(self._folder_stamp(file_path))
+            else:
+                path = base + '.png'
+                temp_path = base + '.tmp'
+                image.save(temp_path, format='PNG')
+                os.replace(temp_path, path)
+                # A marker from before the art was found
+                if os.path.exists(base + '.none'):
+                    os.remove(base + '.none')
+            written = max(os.path.getsize(path), MIN_FILE_BYTES)
+        except OSError as e:
+            log.warning(f"Could not write artwork cache: {e}")
+            return
+        with self.lock:
+            if self.disk_used is None:
+                return
+            self.disk_used += written
+            over = self.disk_used > self.disk_limit
+        if over:
+            self.trim_disk()
+
+    def trim_disk(self):
+        """Delete the least recently used files until the disk cache fits its limit"""
+        with self.disk_lock, span('art_trim'):
+            entries = []
+            try:
+                with os.scandir(self.disk_dir) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((st.st_mtime_ns, max(st.st_size, MIN_FILE_BYTES), entry.path))
+            except OSError as e:
+                log.warning(f"Could not read artwork cache: {e}")
+                return
+            used = sum(size for _, size, _ in entries)
+            if used > self.disk_limit:
+                entries.sort()
+                target = self.disk_limit * TRIM_TO
+                removed = 0
+                for _, size, path in entries:
+                    if used <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    used -= size
+                    removed += 1
+                increment('art_disk_evictions', removed)
+                log.debug(f"Trimmed artwork cache: {removed} files removed, {used} bytes left")
+            with self.lock:
+                self.disk_used = used
+
+    def request(self, file_path, artwork=None):
+        """Start decoding in the background (if not already) and return its Future"""
+        with self.lock:
+            future = self.pending.get(file_path)
+            if future is not None:
+                return future
+            future = self.pool.submit(self.fetch, file_path, artwork)
+            self.pending[file_path] = future
+        future.add_done_callback(lambda f: self._forget_pending(file_path))
+        return future
+
+    def _forget_pending(self, file_path):
+        with self.lock:
+            self.pending.pop(file_path, None)
+
+    def offer(self, file_path, artwork):
+        """Accept artwork bytes read elsewhere so the file isn't opened again"""
+        found, _ = self.lookup(file_path)
+        if not found:
+            self.request(file_path, artwork or b'')
+
+    def prefetch(self, file_paths):
+        """Decode art for upcoming tracks ahead of time"""
+        for file_path in file_paths:
+            found, _ = self.lookup(file_path)
+            if not found:
+                self.request(file_path)
+
+    def photo(self, file_path, image):
+        """Get a Tk PhotoImage for a cached thumbnail (Tk thread only)"""
+        photo = self.photos.get(file_path)
+        if photo is not None:
+            self.photos.move_to_end(file_path)
+            return photo
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(image)
+        self.photos[file_path] = photo
+        while len(self.photos) > 8:
+            self.photos.popitem(last=False)
+        return photo
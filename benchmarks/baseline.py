@@ -0,0 +1,27 @@
+"""Saving benchmark results and comparing them with a baseline."""
+import json
+
+
+def save(path, result):
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(result, baseline, tolerance):
+    """Print each figure against the baseline's; True if any got slower than tolerance allows"""
+    regressed = False
+    width = max((len(figure) for figure in result), default=0)
+    for figure, now in result.items():
+        before = baseline.get(figure)
+        if not isinstance(before, (int, float)) or not isinstance(now, (int, float)) or before <= 0:
+            continue
+        change = (now - before) / before
+        flag = "REGRESSION" if change > tolerance else "ok"
+        regressed = regressed or change > tolerance
+        print(f"{figure:<{width}} {before:10.3f} -> {now:10.3f} ms  ({change:+.0%})  {flag}")
+    return regressed
@@ -0,0 +1,97 @@
+"""Measure how far the playback clock drifts from a synthetic track of known length.
+
+Plays a generated WAV of exact length (with a pause in the middle) and
+compares where PlaybackClock thinks playback is with the track length when
+the mixer reports the end. --load keeps CPU-bound threads running to
+check the clock under contention. Uses SDL's dummy audio driver unless
+SDL_AUDIODRIVER is set. tests/test_playclock.py runs the same check on
+virtual time as part of the test suite.
+
+    python benchmarks/clock_drift.py [--seconds 10] [--load 4]
+"""
+import os
+import sys
+import math
+import time
+import wave
+import struct
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from playclock import PlaybackClock
+
+SAMPLE_RATE = 44100
+
+
+def write_tone(path, seconds):
+    """Write a 440 Hz mono tone of exactly the given length"""
+    frames = int(seconds * SAMPLE_RATE)
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        step = 2 * math.pi * 440 / SAMPLE_RATE
+        w.writeframes(b''.join(struct.pack('<h', int(8000 * math.sin(i * step))) for i in range(frames)))
+    return frames / SAMPLE_RATE
+
+
+def burn(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--pause', type=float, default=1.0, help="pause length in the middle")
+    parser.add_argument('--load', type=int, default=0, help="CPU-bound threads to run meanwhile")
+    args = parser.parse_args()
+
+    pygame.mixer.init(frequency=SAMPLE_RATE)
+    path = os.path.join(tempfile.mkdtemp(), 'tone.wav')
+    length = write_tone(path, args.seconds)
+
+    stop = threading.Event()
+    for _ in range(args.load):
+        threading.Thread(target=burn, args=(stop,), daemon=True).start()
+
+    clock = PlaybackClock(pygame.mixer.music.get_pos)
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+    clock.start(0)
+    wall_start = time.monotonic()
+
+    last_position = 0.0
+    while pygame.mixer.music.get_busy():
+        position = clock.position()
+        if args.pause and position >= length / 2:
+            pygame.mixer.music.pause()
+            clock.pause()
+            frozen = clock.position()
+            time.sleep(args.pause)
+            moved = clock.position() - frozen
+            print(f"clock moved {moved * 1000:.1f} ms while paused")
+            pygame.mixer.music.unpause()
+            clock.resume()
+            args.pause = 0
+            continue
+        last_position = position
+        time.sleep(0.005)
+
+    wall = time.monotonic() - wall_start
+    stop.set()
+    pygame.mixer.quit()
+
+    print(f"track length        {length:.3f} s")
+    print(f"clock at end        {last_position:.3f} s  (drift {(last_position - length) * 1000:+.1f} ms)")
+    print(f"wall time playing   {wall:.3f} s  (including pause and output latency)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,490 @@
+"""Time the player's hot paths on generated media libraries.
+
+A corpus of tracks is generated locally from a few short templates (WAV,
+MP3 with an embedded APIC picture and ID3 tags, and FLAC and OGG when
+ffmpeg is available), hard-linked into artist/album folders so 100k
+tracks cost little disk space. Then, for each queue size:
+
+    scan_first_batch, scan_cold, scan_warm   open_folder / add_folder: folder
+                                             scan with an empty index, first
+                                             batch and total, then rescanned
+    shuffle                                  shuffle_queue
+    drag_1000                                1000 drag reorders (queue moves)
+    queue_snapshot_open, queue_snapshot_edit what the queue window is sent: on
+                                             opening, and after a small edit
+    save, save_compact, load, load_compact,  .lukyland queue files (tagged: with
+    load_compact_tagged                      cached durations and tags to keep)
+    queue_view_open, queue_view_refresh,     queue window: first draw, refresh
+    queue_view_scroll                        after a change, jump to the end
+
+and once, per file on a sample of each format:
+
+    probe/<ext>       duration probing and tags, as play_media reads them
+    play_media/<ext>  play_media through the real mixer (SDL dummy driver)
+    art_decode/mp3    display_audio_icon's thumbnail decoding
+
+All times are in milliseconds (the median of --repeat runs where it is
+cheap to repeat). Results are printed as JSON; figures that can't be
+measured here (no pygame, PIL, mutagen, ffmpeg or display) are listed under
+"skipped". --save and --baseline work like in startup.py.
+
+    python benchmarks/hotpaths.py [--sizes 1000,10000,100000] [--repeat 3]
+                                  [--only scan,queue] [--save base.json | --baseline base.json]
+"""
+import os
+import sys
+import json
+import math
+import time
+import wave
+import shutil
+import struct
+import random
+import zlib
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Headless, and away from the user's caches; set before the player's modules load
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ['LANDPLAYER_HOME'] = os.environ.get('LANDPLAYER_BENCH_HOME') or tempfile.mkdtemp(prefix='landplayer-bench-')
+sys.path.insert(0, ROOT)
+
+from baseline import save, load, compare
+from library import Library
+from metadata import MetadataPipeline
+from playqueue import PlayQueue
+from probe import DurationCache
+from scanner import FolderScanner
+from transcode import find_ffmpeg
+from queuefile import read_queue_file, write_queue_file, write_compact_queue_file
+
+BENCHMARKS = ('scan', 'queue', 'files', 'view', 'probe', 'play', 'art')
+TRACKS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 10
+SAMPLE_PER_FORMAT = 100  # Files timed one by one for the per-file figures
+DRAG_MOVES = 1000
+SAMPLE_RATE = 44100
+
+
+# ---- corpus ----
+
+def write_wav(path, seconds=1.0):
+    """Write a quiet 440 Hz mono tone"""
+    frames = int(seconds * SAMPLE_RATE)
+    step = 2 * math.pi * 440 / SAMPLE_RATE
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(b''.join(struct.pack('<h', int(4000 * math.sin(i * step))) for i in range(frames)))
+
+
+def cover_image(size=600):
+    """(mime type, bytes) of a cover picture: a JPEG if PIL is there, else a PNG"""
+    try:
+        from PIL import Image
+        import io
+        image = Image.linear_gradient('L').resize((size, size)).convert('RGB')
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=90)
+        return 'image/jpeg', out.getvalue()
+    except ImportError:
+        pass
+    # A gradient PNG, one filter byte per row
+    raw = b''.join(b'\x00' + b''.join(bytes((x * 255 // size, y * 255 // size, 128)) for x in range(size))
+                   for y in range(size))
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+    png = (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+           + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+    return 'image/png', png
+
+
+def _syncsafe(size):
+    return bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def _id3_frame(frame_id, payload):
+    return frame_id.encode('ascii') + struct.pack('>I', len(payload)) + b'\x00\x00' + payload
+
+
+def write_mp3(path, seconds=1.0):
+    """Write silent MPEG-1 Layer III frames behind an ID3v2.3 tag with an APIC picture"""
+    mime, picture = cover_image()
+    frames = [_id3_frame('TIT2', b'\x00Synthetic track'),
+              _id3_frame('TPE1', b'\x00Synthetic artist'),
+              _id3_frame('TALB', b'\x00Synthetic album'),
+              _id3_frame('APIC', b'\x00' + mime.encode('ascii') + b'\x00\x03cover\x00' + picture)]
+    body = b''.join(frames)
+    tag = b'ID3\x03\x00\x00' + _syncsafe(len(body)) + body
+    # 128 kbps, 44.1 kHz, stereo; all-zero side info decodes as silence
+    frame = b'\xff\xfb\x90\x00' + bytes(144 * 128000 // SAMPLE_RATE - 4)
+    count = int(seconds * SAMPLE_RATE / 1152) + 1
+    with open(path, 'wb') as f:
+        f.write(tag + frame * count)
+
+
+def make_templates(folder, ffmpeg):
+    """One short file per format; returns {extension: path} and the formats left out"""
+    os.makedirs(folder, exist_ok=True)
+    templates = {'wav': os.path.join(folder, 'template.wav'), 'mp3': os.path.join(folder, 'template.mp3')}
+    write_wav(templates['wav'])
+    write_mp3(templates['mp3'])
+    missing = {}
+    for extension, codec in (('flac', 'flac'), ('ogg', 'libvorbis')):
+        path = os.path.join(folder, 'template.' + extension)
+        if ffmpeg is None:
+            missing[extension] = "ffmpeg not found"
+            continue
+        result = subprocess.run([ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', templates['wav'],
+                                 '-c:a', codec, path], capture_output=True)
+        if result.returncode == 0 and os.path.exists(path):
+            templates[extension] = path
+        else:
+            missing[extension] = f"ffmpeg could not encode {codec}"
+    return templates, missing
+
+
+def link(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def corpus_paths(folder, count, templates):
+    """Paths of a corpus of `count` tracks laid out as artistN/albumN/NN trackN.ext"""
+    extensions = sorted(templates)
+    paths = []
+    for index in range(count):
+        album_dir = os.path.join(folder, f"artist{index // (TRACKS_PER_ALBUM * ALBUMS_PER_ARTIST):05d}",
+                                 f"album{index // TRACKS_PER_ALBUM % ALBUMS_PER_ARTIST}")
+        name = f"{index % TRACKS_PER_ALBUM + 1:02d} track{index}.{extensions[index % len(extensions)]}"
+        paths.append(os.path.join(album_dir, name))
+    return paths
+
+
+def build_corpus(folder, count, templates):
+    """Create the corpus' files (once per folder), cycling through the formats"""
+    marker = os.path.join(folder, '.complete')
+    if os.path.exists(marker):
+        return
+    for path in corpus_paths(folder, count, templates):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        link(templates[path.rsplit('.', 1)[1]], path)
+    open(marker, 'w').close()
+
+
+# ---- measuring ----
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def median_ms(function, repeat, setup=None):
+    """Median time of function(setup()) over `repeat` runs; setup isn't timed"""
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(elapsed_ms(start))
+    return statistics.median(times)
+
+
+def run_scan(folder, library):
+    """(ms to the first batch, ms to the end, files found) of one folder scan"""
+    start = time.perf_counter()
+    first_batch = None
+    found = 0
+    scanner = FolderScanner(folder, library=library).start()
+    while True:
+        # Check before polling so the last batch is never missed
+        finished = scanner.finished.is_set()
+        for batch in scanner.poll():
+            if first_batch is None:
+                first_batch = elapsed_ms(start)
+            found += len(batch)
+        if finished:
+            return first_batch, elapsed_ms(start), found
+        time.sleep(0.0005)
+
+
+def bench_scan(results, size, folder, work_dir):
+    db_path = os.path.join(work_dir, f'scan-{size}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    library = Library(db_path)
+    try:
+        first_batch, total, found = run_scan(folder, library)
+        if found != size:
+            raise RuntimeError(f"scan found {found} of {size} files")
+        results[f'scan_first_batch/{size}'] = first_batch
+        results[f'scan_cold/{size}'] = total
+        results[f'scan_warm/{size}'] = run_scan(folder, library)[1]
+    finally:
+        library.close()
+
+
+def bench_queue(results, size, paths, repeat):
+    def fresh_queue():
+        queue = PlayQueue(paths)
+        queue.set_current(size // 2)
+        return queue
+    results[f'shuffle/{size}'] = median_ms(lambda queue: queue.shuffle(), repeat, fresh_queue)
+
+    def drag(queue):
+        rng = random.Random(size)
+        for _ in range(DRAG_MOVES):
+            queue.move(rng.randrange(size), rng.randrange(size))
+    results[f'drag_{DRAG_MOVES}/{size}'] = median_ms(drag, repeat, fresh_queue)
+
+    queue = fresh_queue()
+    results[f'queue_snapshot_open/{size}'] = median_ms(lambda: (queue.ids_array(), queue.names_from(0)), repeat)
+    sent = [queue.version, queue.tracks.next_id]
+
+    def snapshot_after_edit():
+        queue.insert_paths(size // 3, paths[:10])
+        queue.changes_since(sent[0])
+        queue.names_from(sent[1])
+        sent[:] = [queue.version, queue.tracks.next_id]
+    results[f'queue_snapshot_edit/{size}'] = median_ms(snapshot_after_edit, repeat)
+
+
+def bench_files(results, size, paths, work_dir, repeat):
+    queue = PlayQueue(paths)
+    text_path = os.path.join(work_dir, f'queue-{size}.lukyland')
+    compact_path = os.path.join(work_dir, f'queue-{size}-compact.lukyland')
+    results[f'save/{size}'] = median_ms(lambda: write_queue_file(text_path, queue, 0), repeat)
+    results[f'save_compact/{size}'] = median_ms(
+        lambda: write_compact_queue_file(compact_path, queue, 0, {}), repeat)
+
+    def load_into_queue(path):
+        loaded, _, hints = read_queue_file(path)
+        PlayQueue().replace(loaded, hints)
+    results[f'load/{size}'] = median_ms(lambda: load_into_queue(text_path), repeat)
+    results[f'load_compact/{size}'] = median_ms(lambda: load_into_queue(compact_path), repeat)
+
+    # With a duration and tags cached for every entry
+    tagged_path = os.path.join(work_dir, f'queue-{size}-tagged.lukyland')
+    metadata = {path: {'duration': 180.0, 'title': os.path.basename(path), 'artist': os.path.dirname(path),
+                       'album': None} for path in paths}
+    write_compact_queue_file(tagged_path, queue, 0, metadata)
+    results[f'load_compact_tagged/{size}'] = median_ms(lambda: load_into_queue(tagged_path), repeat)
+
+
+def open_tk():
+    """A Tk root, or None when there is no display"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.geometry("400x600")
+    return root
+
+
+def bench_view(results, size, paths, root, repeat):
+    from queueview import QueueView
+    import tkinter as tk
+    queue = PlayQueue(paths)
+    names = queue.names
+
+    def settle():
+        root.update_idletasks()
+        root.update()
+
+    start = time.perf_counter()
+    view = QueueView(root, items=lambda: names, label=str, current=lambda: 0)
+    view.pack(fill=tk.BOTH, expand=True)
+    settle()
+    results[f'queue_view_open/{size}'] = elapsed_ms(start)
+
+    def refresh_after_change():
+        queue.move(0, size - 1)
+        view.refresh()
+        settle()
+    results[f'queue_view_refresh/{size}'] = median_ms(refresh_after_change, repeat)
+
+    def jump():
+        view.see(size - 1)
+        view.see(0)
+        settle()
+    results[f'queue_view_scroll/{size}'] = median_ms(jump, repeat)
+    view.destroy()
+
+
+def per_format_sample(paths, templates):
+    """Up to SAMPLE_PER_FORMAT corpus files of each format"""
+    sample = {extension: [] for extension in templates}
+    for path in paths:
+        files = sample[path.rsplit('.', 1)[1]]
+        if len(files) < SAMPLE_PER_FORMAT:
+            files.append(path)
+    return sample
+
+
+def bench_probe(results, sample, work_dir):
+    pipeline = MetadataPipeline(library=Library(os.path.join(work_dir, 'probe.db')),
+                                durations=DurationCache(os.path.join(work_dir, 'probe-durations.jsonl')))
+    for extension, files in sorted(sample.items()):
+        start = time.perf_counter()
+        for path in files:
+            pipeline.get(path)
+        results[f'probe/{extension}'] = elapsed_ms(start) / len(files)
+    pipeline.library.close()
+
+
+class IdleScheduler:
+    """Holds the engine's timers without running them; playback isn't followed"""
+
+    def call_later(self, seconds, callback):
+        return [callback]
+
+    def cancel(self, handle):
+        handle[0] = None
+
+    def call_soon_threadsafe(self, callback):
+        pass
+
+
+def bench_play(results, sample, work_dir):
+    from engine import PlayerEngine
+    from mixer import PygameMixer
+    mixer = PygameMixer(headless=True)
+    mixer.start()
+    if mixer.error:
+        raise RuntimeError(f"mixer did not start: {mixer.error}")
+    pipeline = MetadataPipeline(library=Library(os.path.join(work_dir, 'play.db')),
+                                durations=DurationCache(os.path.join(work_dir, 'play-durations.jsonl')))
+    engine = PlayerEngine(IdleScheduler(), mixer=mixer, metadata=pipeline, transcoder=False)
+    engine.normalize = False
+    for extension, files in sorted(sample.items()):
+        files = files[:SAMPLE_PER_FORMAT // 4]
+        start = time.perf_counter()
+        for path in files:
+            engine.play_media(path)
+        results[f'play_media/{extension}'] = elapsed_ms(start) / len(files)
+    engine.shutdown()
+    pipeline.library.close()
+
+
+def bench_art(results, sample, work_dir):
+    from artcache import ArtCache
+    pipeline = MetadataPipeline(library=Library(os.path.join(work_dir, 'art.db')),
+                                durations=DurationCache(os.path.join(work_dir, 'art-durations.jsonl')))
+    cache = ArtCache(capacity=1, disk_cache=False, workers=1, artwork_loader=pipeline.artwork)
+    files = sample['mp3']
+    start = time.perf_counter()
+    for path in files:
+        if cache.fetch(path) is None:
+            raise RuntimeError(f"no artwork decoded from {os.path.basename(path)}")
+    results['art_decode/mp3'] = elapsed_ms(start) / len(files)
+    pipeline.library.close()
+
+
+def missing_modules(*names):
+    missing = []
+    for name in names:
+        try:
+            __import__(name)
+        except ImportError:
+            missing.append(name)
+    return missing
+
+
+def run_benchmarks(args, work_dir):
+    results = {}
+    skipped = {}
+    only = set(args.only.split(',')) if args.only else set(BENCHMARKS)
+    templates, missing_formats = make_templates(os.path.join(work_dir, 'templates'), find_ffmpeg())
+    for extension, reason in missing_formats.items():
+        skipped[extension] = reason
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    root = open_tk() if 'view' in only else None
+    if 'view' in only and root is None:
+        skipped['queue_view'] = "no display"
+
+    for size in sizes:
+        folder = os.path.join(work_dir, f'corpus-{size}')
+        paths = corpus_paths(folder, size, templates)
+        if 'scan' in only:
+            build_corpus(folder, size, templates)
+            bench_scan(results, size, folder, work_dir)
+        if 'queue' in only:
+            bench_queue(results, size, paths, args.repeat)
+        if 'files' in only:
+            bench_files(results, size, paths, work_dir, args.repeat)
+        if root is not None:
+            bench_view(results, size, paths, root, args.repeat)
+        print(f"{size} tracks done", file=sys.stderr)
+
+    # Per-file figures on the smallest corpus
+    size = sizes[0]
+    folder = os.path.join(work_dir, f'corpus-{size}')
+    build_corpus(folder, size, templates)
+    sample = per_format_sample(corpus_paths(folder, size, templates), templates)
+    per_file = (('probe', bench_probe, ()), ('play', bench_play, ('pygame',)),
+                ('art', bench_art, ('PIL', 'mutagen')))
+    for name, bench, modules in per_file:
+        if name not in only:
+            continue
+        missing = missing_modules(*modules)
+        if missing:
+            skipped[name] = f"{', '.join(missing)} not installed"
+            continue
+        try:
+            bench(results, sample, work_dir)
+        except Exception as e:
+            skipped[name] = str(e)
+
+    if root is not None:
+        root.destroy()
+    return results, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000', help="queue sizes, comma separated")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--work-dir', help="keep the generated corpus here and reuse it next time")
+    parser.add_argument('--save', help="write the result as a baseline file")
+    parser.add_argument('--baseline', help="compare with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='landplayer-corpus-')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results, skipped = run_benchmarks(args, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'results': {figure: round(value, 3) for figure, value in results.items()},
+        'skipped': skipped,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        save(args.save, report)
+    if args.baseline:
+        return 1 if compare(report['results'], load(args.baseline)['results'], args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
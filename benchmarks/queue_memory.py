@@ -0,0 +1,82 @@
+"""Measure the memory cost per queue entry at 100k and 1M tracks.
+
+Compares the PlayQueue (interned folders, array-backed track records) with
+the plain list of path strings the player used to keep, and with a dict of
+metadata per track on top of that.
+
+    python benchmarks/queue_memory.py [count ...]
+"""
+import os
+import sys
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playqueue import PlayQueue
+
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 8
+
+
+def synthetic_paths(count):
+    """Paths laid out like a music library: artist/album/NN - title.mp3"""
+    for i in range(count):
+        album = i // TRACKS_PER_ALBUM
+        artist = album // ALBUMS_PER_ARTIST
+        yield (f"/home/user/Music/Artist {artist:05d}/Album {album:06d}/"
+               f"{i % TRACKS_PER_ALBUM + 1:02d} - Track title number {i}.mp3")
+
+
+def measure(build):
+    """Bytes allocated by build() and still alive afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def build_list(count):
+    return list(synthetic_paths(count))
+
+
+def build_list_with_metadata(count):
+    paths = list(synthetic_paths(count))
+    metadata = {path: {'duration': 180.0 + i % 60, 'title': f"Track title number {i}",
+                       'artist': f"Artist {i // 96}", 'album': f"Album {i // 12}"}
+                for i, path in enumerate(paths)}
+    return paths, metadata
+
+
+def build_queue(count):
+    return PlayQueue(synthetic_paths(count))
+
+
+def build_queue_with_metadata(count):
+    queue = PlayQueue(synthetic_paths(count))
+    for i, entry_id in enumerate(queue.ids()):
+        queue.set_metadata(entry_id, {'duration': 180.0 + i % 60, 'title': f"Track title number {i}",
+                                      'artist': f"Artist {i // 96}", 'album': f"Album {i // 12}"})
+    return queue
+
+
+def main(counts):
+    cases = [
+        ("list of paths", build_list),
+        ("list + metadata dicts", build_list_with_metadata),
+        ("PlayQueue", build_queue),
+        ("PlayQueue + metadata", build_queue_with_metadata),
+    ]
+    for count in counts:
+        print(f"{count} tracks")
+        for label, build in cases:
+            size = measure(lambda: build(count))
+            print(f"  {label:<24} {size / 2**20:8.1f} MiB  {size / count:6.1f} bytes/entry")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,330 @@
+"""Replay a long scripted listening session on virtual time and check it.
+
+The engine runs on simulation.py's virtual clock and simulated mixer, so a
+session of thousands of track changes over a queue of --tracks fake files
+takes seconds. The script is random but seeded: listening (often across
+track ends), Next/Back, multi-step skips, seeks and seek bursts, pauses,
+shuffles, drags, batch moves (by position, and by entry ID after the queue
+shifted under them, as the queue window sends them), removing entries and
+inserting them again to play next, jumps to a queue position and loop/shuffle-play/gapless changes.
+
+Whenever the mixer finishes a track, the track the engine should play next
+is worked out from the loop mode and queue at that moment, and compared
+with what the engine actually starts (or that it stops at the end of the
+queue). After every step the engine's state is checked against the mixer:
+playing/paused, the loaded source, the position, the current queue entry
+and the queue's length. Printed as JSON:
+
+    transitions        track starts: automatic (gapless or not) and scripted
+    wrong_transitions  automatic transitions that started the wrong track
+    violations         failed state checks (with the first few examples)
+    gap_ms             silence between a track's end and the next one (virtual)
+    detect_ms          time until the engine noticed a track end (virtual)
+    action_ms          wall time the engine spent on each kind of step
+    track_switch_ms    the engine's own track_switch span
+
+Exits with status 1 when anything was wrong. --save and --baseline work
+like in startup.py, on the timing figures.
+
+    python benchmarks/simulate.py [--tracks 10000] [--transitions 10000] [--seed 1]
+                                  [--no-gapless] [--save base.json | --baseline base.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from baseline import save, load, compare
+
+from simulation import simulated_engine
+from engine import LOOP_MODES, SHUFFLE_MODES, END_WATCH_INTERVAL, SEEK_INTERVAL
+from instrument import Histogram, log, metrics
+
+SETTLE_LIMIT = 1.0      # A track end the engine hasn't acted on after this long counts as missed
+POSITION_SLACK = 0.02   # Allowed difference between the engine's and the mixer's position (s)
+EXAMPLES_KEPT = 10
+# Relative weights of the scripted steps
+STEPS = {'listen': 40, 'listen_long': 6, 'next': 10, 'previous': 6, 'skip': 5, 'seek': 8,
+         'seek_burst': 4, 'pause': 6, 'shuffle': 1, 'move': 8, 'play_index': 4, 'loop_mode': 2,
+         'shuffle_mode': 2, 'gapless': 1, 'move_entries': 3, 'move_ids': 3,
+         'remove_insert': 2}
+
+
+def make_library(count, rng):
+    """Fake paths in artist/album folders with their lengths; a few tracks are very short"""
+    durations = {}
+    for i in range(count):
+        path = f"/sim/artist{i // 120}/album{i // 12}/track{i:06d}.mp3"
+        durations[path] = rng.uniform(1, 5) if rng.random() < 0.02 else rng.uniform(30, 420)
+    return durations
+
+
+class Session:
+    """Drives the engine through the script and keeps the score"""
+
+    def __init__(self, durations, rng, gapless):
+        self.rng = rng
+        self.engine, self.clock, self.mixer = simulated_engine(durations)
+        self.engine.gapless = gapless
+        self.engine.listeners.append(self.on_event)
+        self.mixer.on_track_end = self.on_track_end
+        self.paths = list(durations)
+        self.expected = None   # (file or None for a stop, queue index, end time, source the mixer went on with)
+        self.transitions = Counter()
+        self.wrong = 0
+        self.violations = 0
+        self.examples = []
+        self.gap = Histogram()
+        self.detect = Histogram()
+        self.action_ms = {}
+
+    def report(self, problem):
+        if len(self.examples) < EXAMPLES_KEPT:
+            self.examples.append(f"{self.clock.now:.2f}s: {problem}")
+
+    # ---- expectations ----
+
+    def on_track_end(self, finished, following, at):
+        """The mixer finished a track: note what the engine should do about it"""
+        engine = self.engine
+        if engine.pending_seek is not None:
+            # A seek that is yet to be applied decides what plays (it may go back into this track)
+            self.expected = None
+            return
+        index = engine.next_queue_index()
+        expected_file = engine.queue[index] if index is not None else None
+        self.expected = (expected_file, index, at, following)
+
+    def on_event(self, event, *args):
+        if event == 'seek_requested':
+            # Seeking before the engine noticed a track end is up to the seek
+            self.expected = None
+        if event != 'track_started':
+            return
+        if self.expected is None:
+            self.transitions['scripted'] += 1
+            return
+        expected_file, index, at, following = self.expected
+        self.expected = None
+        engine = self.engine
+        started = args[0]
+        if started != expected_file or engine.current_queue_index != index:
+            self.wrong += 1
+            self.report(f"expected {expected_file} at {index}, started {started} at {engine.current_queue_index}")
+            return
+        gapless = following is not None and following == engine.current_source
+        self.transitions['gapless' if gapless else 'automatic'] += 1
+        self.gap.observe(0.0 if gapless else (self.clock.now - at) * 1000)
+        self.detect.observe((self.clock.now - at) * 1000)
+
+    def settle(self):
+        """Let the engine act on a track end before the next step"""
+        deadline = self.clock.now + SETTLE_LIMIT
+        while self.expected is not None and self.clock.now < deadline:
+            self.clock.advance(END_WATCH_INTERVAL)
+            if self.expected is not None and self.expected[0] is None and not self.engine.is_playing:
+                # End of the queue: stopping was right
+                self.detect.observe((self.clock.now - self.expected[2]) * 1000)
+                self.transitions['stopped'] += 1
+                self.expected = None
+        if self.expected is not None:
+            self.wrong += 1
+            self.report(f"track end at {self.expected[2]:.2f}s not acted on")
+            self.expected = None
+
+    # ---- state checks ----
+
+    def check(self):
+        engine, mixer = self.engine, self.mixer
+
+        def violation(problem):
+            self.violations += 1
+            self.report(problem)
+
+        if engine.is_playing:
+            if not mixer.get_busy():
+                violation("engine playing, mixer idle")
+            elif mixer.source != engine.current_source:
+                violation(f"engine plays {engine.current_source}, mixer {mixer.source}")
+        elif engine.is_paused:
+            if not mixer.paused:
+                violation("engine paused, mixer not")
+        elif mixer.get_busy():
+            violation("engine stopped, mixer busy")
+
+        if engine.current_file is not None:
+            index = engine.current_queue_index
+            if not 0 <= index < len(engine.queue) or engine.queue[index] != engine.current_file:
+                violation(f"current entry {index} is not {engine.current_file}")
+        if (engine.is_playing or engine.is_paused) and engine.pending_seek is None:
+            position = engine.current_position()
+            if not -POSITION_SLACK <= position <= engine.audio_length + POSITION_SLACK:
+                violation(f"position {position:.3f} outside 0..{engine.audio_length:.3f}")
+            elif abs(position - mixer.position) > POSITION_SLACK:
+                violation(f"position {position:.3f}, mixer at {mixer.position:.3f}")
+        if len(engine.queue) != len(self.paths):
+            violation(f"queue has {len(engine.queue)} entries, not {len(self.paths)}")
+
+    # ---- the script ----
+
+    def step(self, kind):
+        engine, clock, rng = self.engine, self.clock, self.rng
+        size = len(engine.queue)
+        if kind == 'listen':
+            # Up to a bit past the end of the track, so most listens cross it
+            remaining = max(engine.audio_length - engine.current_position(), 0)
+            clock.advance(rng.uniform(0, remaining * 1.2))
+        elif kind == 'listen_long':
+            clock.advance(rng.uniform(600, 3600))
+        elif kind == 'next':
+            engine.next_track()
+        elif kind == 'previous':
+            engine.previous_track()
+        elif kind == 'skip':
+            engine.skip(rng.choice((-5, -3, -2, 2, 3, 5, 20)))
+        elif kind == 'seek':
+            engine.seek(rng.uniform(0, engine.audio_length))
+        elif kind == 'seek_burst':
+            # Key repeat: many relative seeks, merged by the throttle
+            for _ in range(rng.randint(2, 10)):
+                engine.seek_relative(rng.choice((-5, 5)))
+                clock.advance(0.03)
+            clock.advance(SEEK_INTERVAL)
+        elif kind == 'pause':
+            engine.pause()
+            clock.advance(rng.uniform(0, 30))
+            engine.resume()
+        elif kind == 'shuffle':
+            engine.shuffle_queue()
+        elif kind == 'move':
+            engine.move(rng.randrange(size), rng.randrange(size))
+        elif kind == 'move_entries':
+            # A range plus a few scattered entries, like a multi-select drag
+            first = rng.randrange(size)
+            positions = list(range(first, min(first + rng.randint(1, 50), size)))
+            positions += rng.sample(range(size), min(5, size))
+            engine.move_entries(positions, rng.randrange(size))
+        elif kind == 'move_ids':
+            # Picked from a snapshot, then the queue changes before the command runs
+            queue = engine.queue
+            entry_ids = [queue.entry_id(position) for position in rng.sample(range(size), min(8, size))]
+            before_id = queue.entry_id(rng.randrange(size))
+            engine.move(rng.randrange(size), rng.randrange(size))
+            if before_id in entry_ids:
+                before_id = None
+            engine.move_ids(entry_ids, before_id)
+            order = list(queue.ids())
+            at = order.index(before_id) if before_id is not None else len(order)
+            if order[at - len(entry_ids):at] != entry_ids:
+                self.violations += 1
+                self.report("move_ids put the entries in the wrong place")
+        elif kind == 'remove_insert':
+            # Remove some entries (maybe the current one) and play them next; the files stay the same
+            first = rng.randrange(size)
+            positions = sorted(set(range(first, min(first + rng.randint(1, 20), size))) | {engine.current_queue_index})
+            paths = [engine.queue[position] for position in positions]
+            engine.remove_entries(positions)
+            engine.insert_next(paths)
+        elif kind == 'play_index':
+            engine.play_index(rng.randrange(size))
+        elif kind == 'loop_mode':
+            engine.set_loop_mode(rng.choice(LOOP_MODES))
+        elif kind == 'shuffle_mode':
+            engine.set_shuffle_mode(rng.choice(SHUFFLE_MODES))
+        elif kind == 'gapless':
+            engine.toggle_gapless()
+        elif kind == 'restart':
+            engine.play_index(rng.randrange(size))
+
+    def run(self, transitions):
+        self.engine.add_files(self.paths)
+        kinds, weights = list(STEPS), list(STEPS.values())
+        steps = 0
+        while sum(self.transitions.values()) < transitions:
+            engine = self.engine
+            if engine.is_playing or engine.is_paused:
+                kind = self.rng.choices(kinds, weights)[0]
+            else:
+                kind = 'restart'
+            started = time.perf_counter()
+            self.step(kind)
+            ms = (time.perf_counter() - started) * 1000
+            histogram = self.action_ms.get(kind)
+            if histogram is None:
+                histogram = self.action_ms[kind] = Histogram()
+            histogram.observe(ms)
+            self.settle()
+            self.check()
+            steps += 1
+        if sorted(self.engine.queue) != sorted(self.paths):
+            self.violations += 1
+            self.report("the queue lost or gained files")
+        self.engine.shutdown()
+        return steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--transitions', type=int, default=10000, help="stop after this many track starts")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-gapless', action='store_true', help="start with gapless playback off")
+    parser.add_argument('--save', help="write the result as a baseline file")
+    parser.add_argument('--baseline', help="compare with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    log.set_level('warning')
+    # The queue's shuffle uses the random module itself
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    session = Session(make_library(args.tracks, rng), rng, gapless=not args.no_gapless)
+    steps = session.run(args.transitions)
+    wall = time.perf_counter() - started
+
+    action_ms = {kind: histogram.summary() for kind, histogram in sorted(session.action_ms.items())}
+    track_switch = metrics.snapshot()['latency'].get('track_switch')
+    results = {'wall_ms': wall * 1000}
+    for kind, summary in action_ms.items():
+        results[f'action/{kind}'] = summary['mean_ms']
+    if track_switch:
+        results['track_switch'] = track_switch['mean_ms']
+    for figure, histogram in (('gap', session.gap), ('detect', session.detect)):
+        if histogram.count:
+            results[f'{figure}_mean'] = histogram.total / histogram.count
+
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'tracks': args.tracks, 'seed': args.seed, 'gapless': not args.no_gapless},
+        'steps': steps,
+        'virtual_hours': round(session.clock.now / 3600, 2),
+        'wall_s': round(wall, 3),
+        'transitions': dict(session.transitions),
+        'wrong_transitions': session.wrong,
+        'violations': session.violations,
+        'examples': session.examples,
+        'gap_ms': session.gap.summary(),
+        'detect_ms': session.detect.summary(),
+        'action_ms': action_ms,
+        'track_switch_ms': track_switch,
+        'results': {figure: round(value, 3) for figure, value in results.items()},
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = session.wrong or session.violations
+    if args.save:
+        save(args.save, report)
+    if args.baseline and compare(report['results'], load(args.baseline)['results'], args.tolerance):
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Measure cold-start time of the player: imports, first frame, first sound.
+
+Each run starts a fresh interpreter that imports landplayer, builds the
+window and opens a generated WAV, recording (in ms since the interpreter
+started its measurement):
+
+    import        landplayer and everything it imports
+    first_frame   window mapped and drawn
+    first_sample  mixer reports the first played samples of the track
+
+The median over --runs is printed as JSON. --save stores it as a baseline,
+--baseline compares against one and exits with status 1 when any figure got
+slower by more than --tolerance. Needs a display for Tk (e.g. xvfb-run);
+uses SDL's dummy audio driver unless SDL_AUDIODRIVER is set.
+
+    python benchmarks/startup.py [--runs 5] [--save base.json | --baseline base.json]
+"""
+import os
+import sys
+import json
+import math
+import wave
+import struct
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from baseline import save, load, compare
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIGURES = ('import', 'first_frame', 'first_sample')
+SAMPLE_RATE = 44100
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = r'''
+import os, sys, time, json
+started = time.perf_counter()
+ms = lambda: round((time.perf_counter() - started) * 1000, 2)
+sys.path.insert(0, sys.argv[1])
+result = {}
+
+import landplayer
+result['import'] = ms()
+
+import tkinter as tk
+root = tk.Tk()
+root.geometry("800x600")
+player = landplayer.MediaPlayer(root)
+while not root.winfo_ismapped():
+    root.update()
+root.update_idletasks()
+root.update()
+result['first_frame'] = ms()
+
+mixer = player.worker.engine.mixer
+player.post('open_file', sys.argv[2])
+deadline = time.perf_counter() + 10
+while mixer.get_pos() <= 0 and time.perf_counter() < deadline:
+    root.update()
+    time.sleep(0.001)
+result['first_sample'] = ms() if mixer.get_pos() > 0 else None
+
+player.on_close()
+print(json.dumps(result))
+'''
+
+
+def write_tone(path, seconds=2.0):
+    """Write a short 440 Hz mono tone"""
+    frames = int(seconds * SAMPLE_RATE)
+    step = 2 * math.pi * 440 / SAMPLE_RATE
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(b''.join(struct.pack('<h', int(8000 * math.sin(i * step))) for i in range(frames)))
+
+
+def run_once(tone_path, home):
+    env = dict(os.environ, LANDPLAYER_HOME=home)
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT, tone_path], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    # The player prints as it goes; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', help="write the result as a baseline file")
+    parser.add_argument('--baseline', help="compare with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    tone_path = os.path.join(work_dir, 'tone.wav')
+    write_tone(tone_path)
+    # A fresh data folder each run, like a first launch
+    runs = [run_once(tone_path, tempfile.mkdtemp(dir=work_dir)) for _ in range(args.runs)]
+
+    result = {}
+    for figure in FIGURES:
+        values = [run[figure] for run in runs if run.get(figure) is not None]
+        result[figure] = round(statistics.median(values), 2) if values else None
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        save(args.save, result)
+    if args.baseline:
+        return 1 if compare(result, load(args.baseline), args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
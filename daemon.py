@@ -0,0 +1,402 @@
+"""Run the player without a window and control it from the command line.
+
+    landplayer daemon [--foreground]   start the background player
+           [--log-level debug|info|warning|error|off]
+    landplayer play [PATH ...]         play files/folders (or resume)
+    landplayer enqueue PATH ...        add files/folders to the queue
+    landplayer play-next FILE ...      insert files after the current track
+    landplayer remove N|N-M ...        remove queue entries (numbered from 1)
+    landplayer move N|N-M ... --to N   move queue entries together
+    landplayer dedupe | remove-missing
+    landplayer pause | resume | toggle | stop | next | prev | shuffle
+    landplayer seek [+|-]SECONDS|MM:SS
+    landplayer volume PERCENT
+    landplayer loop none|media|queue
+    landplayer shuffle-play off|on|folder|artist
+    landplayer normalize on|off | analyze
+    landplayer load FILE | save FILE [--compact]
+    landplayer status | quit
+    landplayer metrics [--prometheus]  timings and counters of the running daemon
+
+The daemon runs a PlayerEngine on an asyncio loop and listens on a local
+Unix socket. Every command is one JSON line in each direction, handled
+directly on the loop, so a command costs a single round trip.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+from appdata import data_path
+from engine import LOOP_MODES, SHUFFLE_MODES, PlayerEngine, format_time
+from instrument import LEVELS, log, metrics, span
+
+CONNECT_TIMEOUT = 5.0   # Seconds a client waits for the daemon
+STARTUP_TIMEOUT = 10.0  # Seconds `landplayer daemon` waits for the socket to appear
+
+
+def socket_path():
+    """Where the daemon listens"""
+    path = os.environ.get('LANDPLAYER_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, 'landplayer.sock')
+    return data_path('landplayer.sock')
+
+
+class AsyncioScheduler:
+    """Runs engine timers on an asyncio loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def call_later(self, seconds, callback):
+        return self.loop.call_later(seconds, callback)
+
+    def cancel(self, handle):
+        handle.cancel()
+
+    def call_soon_threadsafe(self, callback):
+        self.loop.call_soon_threadsafe(callback)
+
+
+def parse_position(text, current):
+    """Seek target from '90', '1:30', '+10' or '-5' (relative to current)"""
+    relative = text[:1] in '+-'
+    sign = -1 if text[:1] == '-' else 1
+    if relative:
+        text = text[1:]
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return current + sign * seconds if relative else seconds
+
+
+def parse_positions(specs):
+    """Queue positions (from 0) for entry numbers and ranges from 1: '4', '7-12'"""
+    positions = []
+    for spec in specs:
+        first, _, last = spec.partition('-')
+        positions.extend(range(int(first) - 1, int(last or first)))
+    return positions
+
+
+class ControlServer:
+    """Answers command lines from clients by calling into the engine"""
+
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.server = None
+        self.stopped = None
+
+    async def serve(self):
+        self.stopped = asyncio.Event()
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        try:
+            os.chmod(self.path, 0o600)
+        except OSError:
+            pass
+        log.info(f"Listening on {self.path}")
+        async with self.server:
+            await self.stopped.wait()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    with span(f"command.{request.get('cmd')}"):
+                        result = self.dispatch(request.get('cmd'), request.get('args') or [])
+                    response = {'ok': True, 'status': self.engine.status()}
+                    if result is not None:
+                        response['result'] = result
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+                if self.stopped.is_set():
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, command, args):
+        engine = self.engine
+        if command == 'status':
+            return None
+        if command == 'play':
+            if args:
+                return self.play_paths(args)
+            if engine.is_paused:
+                engine.resume()
+            elif not engine.is_playing and engine.queue:
+                engine.play_index(max(engine.current_queue_index, 0))
+            return None
+        if command == 'enqueue':
+            return self.enqueue_paths(args)
+        if command == 'play-next':
+            return engine.insert_next([path for path in args if not os.path.isdir(path)])
+        if command == 'remove':
+            return engine.remove_entries(args)
+        if command == 'move':
+            engine.move_entries(args[:-1], args[-1])
+            return None
+        simple = {
+            'pause': engine.pause,
+            'resume': engine.resume,
+            'toggle': engine.toggle_pause,
+            'stop': engine.stop,
+            'next': engine.next_track,
+            'prev': engine.previous_track,
+            'shuffle': engine.shuffle_queue,
+            'analyze': engine.analyze_loudness,
+            'dedupe': engine.dedupe_queue,
+            'remove-missing': engine.remove_missing,
+        }
+        if command in simple:
+            simple[command]()
+            return None
+        if command == 'seek':
+            engine.seek(parse_position(args[0], engine.current_position()))
+            return None
+        if command == 'volume':
+            engine.set_volume(args[0])
+            return None
+        if command == 'loop':
+            engine.set_loop_mode(args[0])
+            return None
+        if command == 'shuffle-play':
+            engine.set_shuffle_mode(args[0])
+            return None
+        if command == 'normalize':
+            engine.set_normalize(args[0] == 'on')
+            return None
+        if command == 'metrics':
+            return metrics.prometheus() if args and args[0] == 'prometheus' else metrics.snapshot()
+        if command == 'load':
+            return engine.load_queue(args[0])
+        if command == 'save':
+            return engine.save_queue(args[0], compact=len(args) > 1 and args[1] == 'compact')
+        if command == 'quit':
+            engine.shutdown()
+            self.stopped.set()
+            return None
+        raise ValueError(f"Unknown command: {command}")
+
+    def play_paths(self, paths):
+        """Replace the queue with files and folders and start playing"""
+        folders = [path for path in paths if os.path.isdir(path)]
+        files = [path for path in paths if not os.path.isdir(path)]
+        if files:
+            if not self.engine.open_file(files[0]):
+                raise ValueError("Video files are not supported (audio only)")
+            self.engine.add_files(files[1:])
+            self.scan_folders(folders, replace=False)
+        else:
+            self.scan_folders(folders, replace=True)
+        return None
+
+    def enqueue_paths(self, paths):
+        """Add files and folders to the end of the queue"""
+        added = self.engine.add_files([path for path in paths if not os.path.isdir(path)])
+        self.scan_folders([path for path in paths if os.path.isdir(path)], replace=False)
+        return added
+
+    def scan_folders(self, folders, replace):
+        if not folders:
+            return
+        if replace:
+            self.engine.open_folder(folders[0])
+        else:
+            self.engine.add_folder(folders[0])
+        # A new scan would cancel the running one
+        for folder in folders[1:]:
+            log.warning(f"Only one folder scan runs at a time, skipped {folder}")
+
+
+def run_daemon(path):
+    """Run the engine and control server until told to quit"""
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Daemon mode needs Unix domain sockets, which this system lacks")
+        return 1
+    if os.path.exists(path):
+        try:
+            send_command('status', path=path)
+            print(f"A LandPlayer daemon is already running on {path}")
+            return 1
+        except OSError:
+            # Left behind by a daemon that didn't shut down cleanly
+            os.unlink(path)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    from mixer import PygameMixer
+    engine = PlayerEngine(AsyncioScheduler(loop), mixer=PygameMixer(headless=True))
+    server = ControlServer(engine, path)
+    try:
+        import signal
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, lambda: server.stopped and server.stopped.set())
+    except (ImportError, NotImplementedError, RuntimeError):
+        pass
+    try:
+        loop.run_until_complete(server.serve())
+    finally:
+        engine.shutdown()
+        loop.close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+
+def spawn_daemon(path, log_level=None):
+    """Start the daemon in the background and wait until it accepts commands"""
+    if getattr(sys, 'frozen', False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.abspath(sys.argv[0])]
+    command += ['daemon', '--foreground']
+    if log_level:
+        command += ['--log-level', log_level]
+    # The daemon keeps its own copy of the file descriptor
+    with open(data_path('daemon.log'), 'ab') as log_file:
+        subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT,
+                         start_new_session=True, close_fds=True)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            send_command('status', path=path)
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def send_command(command, args=(), path=None):
+    """Send one command to the daemon and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(path or socket_path())
+        client.sendall(json.dumps({'cmd': command, 'args': list(args)}).encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                raise ConnectionError("daemon closed the connection")
+            data += chunk
+    return json.loads(data)
+
+
+def format_status(status):
+    position = format_time(status['position'])
+    duration = format_time(status['duration']) if status['duration'] else "--:--"
+    name = os.path.basename(status['file']) if status['file'] else "(nothing)"
+    return (f"{status['state']:<8} {position}/{duration}  "
+            f"[{status['index'] + 1}/{status['queue_length']}]  {name}  "
+            f"vol {int(status['volume'])}%  loop {status['loop']}  shuffle {status['shuffle']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='landplayer', description="Control the LandPlayer daemon")
+    commands = parser.add_subparsers(dest='command', required=True)
+    daemon = commands.add_parser('daemon', help="start the background player")
+    daemon.add_argument('--foreground', action='store_true', help="don't detach")
+    daemon.add_argument('--log-level', choices=LEVELS, help="how much the daemon logs (default info)")
+    commands.add_parser('play', help="play files/folders, or resume").add_argument('paths', nargs='*')
+    commands.add_parser('enqueue', help="add files/folders to the queue").add_argument('paths', nargs='+')
+    commands.add_parser('play-next', help="insert files after the current track").add_argument('paths', nargs='+')
+    commands.add_parser('remove', help="remove queue entries: N or N-M, numbered from 1").add_argument(
+        'entries', nargs='+')
+    move = commands.add_parser('move', help="move queue entries together")
+    move.add_argument('entries', nargs='+', help="N or N-M, numbered from 1")
+    move.add_argument('--to', type=int, required=True, help="where the first of them ends up")
+    for name in ('pause', 'resume', 'toggle', 'stop', 'next', 'prev', 'shuffle', 'analyze', 'dedupe',
+                 'remove-missing', 'status', 'quit'):
+        commands.add_parser(name)
+    commands.add_parser('seek', help="[+|-]SECONDS or MM:SS").add_argument('position')
+    commands.add_parser('volume', help="0-100").add_argument('percent', type=float)
+    commands.add_parser('loop').add_argument('mode', choices=LOOP_MODES)
+    commands.add_parser('shuffle-play', help="play in random order without reordering the queue").add_argument(
+        'mode', choices=SHUFFLE_MODES)
+    commands.add_parser('normalize', help="per-track loudness normalization").add_argument(
+        'state', choices=('on', 'off'))
+    commands.add_parser('load', help="load a .lukyland queue").add_argument('file')
+    save = commands.add_parser('save', help="save the queue as .lukyland")
+    save.add_argument('file')
+    save.add_argument('--compact', action='store_true')
+    commands.add_parser('metrics', help="timings and counters").add_argument(
+        '--prometheus', action='store_true', help="Prometheus text format instead of JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    path = socket_path()
+
+    if args.command == 'daemon':
+        if args.foreground:
+            if args.log_level:
+                log.set_level(args.log_level)
+            return run_daemon(path)
+        if spawn_daemon(path, args.log_level):
+            print(f"LandPlayer daemon running ({path})")
+            return 0
+        print(f"Daemon did not start, see {data_path('daemon.log')}")
+        return 1
+
+    if args.command in ('play', 'enqueue', 'play-next'):
+        # The daemon has its own working directory
+        command_args = [os.path.abspath(path_arg) for path_arg in args.paths]
+    elif args.command == 'remove':
+        command_args = parse_positions(args.entries)
+    elif args.command == 'move':
+        command_args = parse_positions(args.entries) + [args.to - 1]
+    elif args.command == 'seek':
+        command_args = [args.position]
+    elif args.command == 'volume':
+        command_args = [args.percent]
+    elif args.command in ('loop', 'shuffle-play'):
+        command_args = [args.mode]
+    elif args.command == 'normalize':
+        command_args = [args.state]
+    elif args.command == 'load':
+        command_args = [os.path.abspath(args.file)]
+    elif args.command == 'save':
+        command_args = [os.path.abspath(args.file)] + (['compact'] if args.compact else [])
+    elif args.command == 'metrics':
+        command_args = ['prometheus'] if args.prometheus else []
+    else:
+        command_args = []
+
+    try:
+        response = send_command(args.command, command_args, path=path)
+    except OSError as e:
+        print(f"LandPlayer daemon is not running ({e}); start it with: landplayer daemon")
+        return 1
+    if not response.get('ok'):
+        print(f"Error: {response.get('error')}")
+        return 1
+    if args.command == 'metrics':
+        if args.prometheus:
+            sys.stdout.write(response['result'])
+        else:
+            print(json.dumps(response['result'], indent=2))
+    elif args.command != 'quit':
+        print(format_status(response['status']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1416 @@
+"""Playback and queue logic, independent of any user interface.
+
+PlayerEngine owns the play queue, the mixer and everything that keeps
+playback going: gapless handoffs, the end-of-track watch, seeking, folder
+scans and queue files. It never touches Tk; timers go through a scheduler
+with call_later(seconds, callback) -> handle and cancel(handle), the mixer's
+end events come in through its call_soon_threadsafe(callback), and whatever
+shows the player (the Tk window, the daemon) subscribes to its events:
+
+    track_started(file_path)  playback_state()   seek_requested(position)
+    queue_changed()           loop_mode(mode)    volume(volume)
+    shuffle_mode(mode)
+    scan_progress(dirs_scanned, dirs_found, files_found)
+    scan_finished(added)      scan_stopped()     missing_files(paths)
+    track_length(duration)    (a converted copy replaced the playing file)
+    loudness_progress(done, total)   loudness_finished(measured)
+
+All methods must be called from the scheduler's thread.
+"""
+import os
+import time
+
+from appdata import file_identity
+from metadata import get_pipeline
+from scanner import FolderScanner
+from playqueue import PlayQueue
+from shuffleorder import ShuffleOrder
+from queuefile import ExistenceChecker, read_queue_file, write_compact_queue_file, write_queue_file
+from seektable import get_seek_tables, open_at
+from playclock import PlaybackClock
+from transcode import find_ffmpeg, get_transcoder, needs_transcoding
+from loudness import LoudnessScan, gain_factor
+from instrument import log, span, increment, observe
+
+# Playback timer settings (seconds)
+# Without mixer end events the end of a track is found by a timed check:
+END_WATCH_WINDOW = 0.25         # Start watching closely this long before a track ends
+END_WATCH_INTERVAL = 0.01       # How often to check for the end inside that window
+UNKNOWN_LENGTH_INTERVAL = 0.25  # End check rate when the track length is unknown
+SEEK_INTERVAL = 0.15            # Seeks requested faster than this (key repeat) are merged
+SCAN_POLL_INTERVAL = 0.05       # How often finished folder-scan batches are queued
+CHECK_POLL_INTERVAL = 0.1       # How often missing-file reports are applied
+TRANSCODE_POLL_INTERVAL = 0.25  # How often a conversion the player waits for is checked
+TRANSCODE_AHEAD = 3             # Upcoming tracks converted ahead of time
+LOUDNESS_POLL_INTERVAL = 0.25   # How often finished loudness results are stored
+LOUDNESS_AHEAD = 3              # Upcoming tracks measured ahead of time when normalizing
+
+LOOP_MODES = ("none", "media", "queue")
+# Shuffle play; "folder" and "artist" also keep tracks of one folder/artist apart
+SHUFFLE_MODES = ("off", "on", "folder", "artist")
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.wmv')
+
+
+def is_video_file(file_path):
+    """Check if file is a video format"""
+    return os.path.splitext(file_path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def format_time(seconds):
+    minutes = int(seconds // 60)
+    secs = int(seconds % 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+
+class PlayerEngine:
+    """Queue, mixer and playback state of one player"""
+
+    def __init__(self, scheduler, mixer=None, metadata=None, transcoder=None, monotonic=time.monotonic):
+        if mixer is None:
+            from mixer import PygameMixer
+            mixer = PygameMixer()
+        self.scheduler = scheduler
+        self.mixer = mixer
+        mixer.on_end = self.end_event_posted
+        # Clock for throttling and timings; a simulation passes its virtual one
+        self.monotonic = monotonic
+        self.listeners = []
+
+        self.current_file = None
+        self.current_source = None  # What the mixer plays: current_file or its converted copy
+        self.is_playing = False
+        self.is_paused = False
+        self.audio_length = 0
+        self.stopped_position = 0
+        self.end_job = None
+        # Position comes from the mixer's played-sample count, not wall time
+        self.clock = PlaybackClock(mixer.get_pos, monotonic)
+        self.loop_mode = "none"  # "none", "media", or "queue"
+        self.queue = PlayQueue()
+        self.shuffle_mode = "off"
+        self.shuffle_order = ShuffleOrder(self.queue)  # Play order while shuffling; the queue keeps its own
+        self.volume = 100  # Default volume at 100%
+        self.folder_scanner = None
+        self.scan_job = None
+        self.scan_replaces_queue = False
+        self.scan_added_count = 0
+        self.scan_started = 0
+        # Wanted gapless playback; only used if the mixer turns out to deliver end events
+        self.gapless = True
+        self.mixer_queued_file = None  # Next track already handed to the mixer
+        self.mixer_queued_source = None
+        self.queue_checker = None
+        self.queue_check_job = None
+        self.missing_files = []
+        self.metadata = metadata or get_pipeline()
+        # Artist spreading needs the tags of tracks that haven't played yet
+        self.shuffle_order.lookup_metadata = self.cached_metadata
+        self.seek_tables = get_seek_tables()
+        self.pending_seek = None   # Target of a seek that hasn't been applied yet
+        self.seek_job = None
+        self.last_seek_time = 0
+        self.seek_stream = None    # Spliced stream the mixer plays after a fallback seek
+        self.seek_stream_start = 0.0  # Track time at the start of that stream, the mixer's zero
+        self.transcoder = transcoder  # Looked up on first need; False for none
+        self.transcode_wait = None    # (file_path, future) of a conversion the player needs
+        self.transcode_job = None
+        self.normalize = True         # Apply each track's loudness gain
+        self.track_gain = 1.0         # Volume factor of the playing track
+        self.mixer_queued_gain = 1.0
+        self.loudness_scan = None
+        self.loudness_job = None
+        self.loudness_stored = 0
+        self.loudness_tried = set()   # Files already sent for analysis this session
+
+    @property
+    def gapless_active(self):
+        """Gapless playback is on and the mixer supports it.
+
+        Before the mixer has started nobody knows yet, and asking would start
+        it, so until then this is what was asked for.
+        """
+        return self.gapless and (not self.mixer.started or self.mixer.events_available)
+
+    def emit(self, event, *args):
+        """Tell every listener about an event"""
+        for listener in list(self.listeners):
+            try:
+                listener(event, *args)
+            except Exception as e:
+                log.error(f"Error in {event} listener: {e}")
+
+    @property
+    def current_queue_index(self):
+        """Position of the current entry in the queue (-1 if none), tracked by entry identity"""
+        return self.queue.current_index
+
+    @current_queue_index.setter
+    def current_queue_index(self, position):
+        self.queue.set_current(position)
+
+    def status(self):
+        """Snapshot of the playback state"""
+        if self.is_paused:
+            state = "paused"
+        elif self.is_playing:
+            state = "playing"
+        else:
+            state = "stopped"
+        return {
+            "state": state,
+            "file": self.current_file,
+            "index": self.current_queue_index,
+            "entry_id": self.queue.current_id,
+            "queue_length": len(self.queue),
+            "position": self.current_position(),
+            "duration": self.audio_length,
+            "volume": self.volume,
+            "loop": self.loop_mode,
+            "shuffle": self.shuffle_mode,
+            "gapless": self.gapless_active,
+            "scanning": self.folder_scanner is not None,
+            "normalize": self.normalize,
+            "gain": self.track_gain,
+        }
+
+    # ---- settings ----
+
+    def set_volume(self, value):
+        """Set the volume (0-100%)"""
+        self.volume = max(0.0, min(float(value), 100.0))
+        self.apply_volume()
+        self.emit('volume', self.volume)
+
+    def apply_volume(self):
+        """Hand the mixer the volume with the playing track's gain applied"""
+        # The mixer takes 0.0 to 1.0
+        self.mixer.set_volume(self.volume / 100.0 * self.track_gain)
+
+    def set_normalize(self, enabled):
+        """Turn per-track loudness normalization on or off"""
+        self.normalize = bool(enabled)
+        log.info(f"Volume normalization: {'On' if self.normalize else 'Off'}")
+        self.track_gain = self.gain_for(self.current_file)
+        self.apply_volume()
+        # The preloaded track's gain was worked out with the old setting
+        self.mixer_queued_gain = self.gain_for(self.mixer_queued_file)
+        self.refresh_preload()
+
+    def toggle_normalize(self):
+        self.set_normalize(not self.normalize)
+
+    def set_loop_mode(self, mode):
+        if mode not in LOOP_MODES:
+            raise ValueError(f"Unknown loop mode: {mode}")
+        self.loop_mode = mode
+        if mode == "media":
+            log.info("Loop mode: Media (looping current media)")
+        elif mode == "queue":
+            log.info("Loop mode: Queue (looping entire queue)")
+        else:
+            log.info("Loop mode: None (no looping)")
+        self.refresh_preload()
+        self.emit('loop_mode', mode)
+
+    def cycle_loop_mode(self):
+        """Toggle through loop modes: none -> media -> queue -> none"""
+        self.set_loop_mode(LOOP_MODES[(LOOP_MODES.index(self.loop_mode) + 1) % len(LOOP_MODES)])
+
+    def set_shuffle_mode(self, mode):
+        """Play the queue in a random order without reordering it"""
+        if mode not in SHUFFLE_MODES:
+            raise ValueError(f"Unknown shuffle mode: {mode}")
+        was_off = self.shuffle_mode == "off"
+        self.shuffle_mode = mode
+        self.shuffle_order.spread = mode if mode in ("folder", "artist") else None
+        if was_off and mode != "off":
+            # A new round; what is playing now counts as played
+            self.shuffle_order.start()
+        log.info(f"Shuffle play: {mode.capitalize()}")
+        self.refresh_preload()
+        self.emit('shuffle_mode', mode)
+
+    def toggle_gapless(self):
+        """Turn gapless playback on or off"""
+        if not self.mixer.events_available:
+            log.warning("Gapless playback is not available on this system")
+            return
+        self.gapless = not self.gapless
+        log.info(f"Gapless playback: {'On' if self.gapless else 'Off'}")
+        self.refresh_preload()
+
+    # ---- queue editing ----
+
+    def shuffle_queue(self):
+        """Shuffle the queue randomly"""
+        if len(self.queue) <= 1:
+            log.info("Queue has only one or no items, nothing to shuffle")
+            return
+
+        # Shuffle the queue; the current entry keeps its identity
+        self.queue.shuffle()
+
+        log.info(f"Queue shuffled! ({len(self.queue)} items)")
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def move(self, source, destination):
+        """Move a queue entry; the current entry is tracked by identity"""
+        if (0 <= source < len(self.queue) and 0 <= destination < len(self.queue)
+                and source != destination):
+            item = self.queue[source]
+            self.queue.move(source, destination)
+            log.debug(f"Moved '{os.path.basename(item)}' from position {source} to {destination}")
+            self.emit('queue_changed')
+            self.refresh_preload()
+
+    # Batch edits: each applies in one go and reports one queue change
+
+    def entry_ids_at(self, positions):
+        """Entry IDs at some queue positions, in queue order (out-of-range ones are skipped)"""
+        size = len(self.queue)
+        return [self.queue.entry_id(position) for position in sorted(set(positions)) if 0 <= position < size]
+
+    def move_entries(self, positions, destination):
+        """Move entries (a range or a selection) together so the first ends up at destination"""
+        entry_ids = self.entry_ids_at(positions)
+        if not entry_ids:
+            return
+        self.queue.move_ids(entry_ids, destination)
+        log.debug(f"Moved {len(entry_ids)} entries to position {destination}")
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def move_ids(self, entry_ids, before_id=None):
+        """Move entries together, in this order, in front of before_id (None: to the end)"""
+        queue = self.queue
+        entry_ids = [entry_id for entry_id in dict.fromkeys(entry_ids) if entry_id in queue]
+        if not entry_ids:
+            return
+        if before_id is None:
+            destination = len(queue)
+        elif before_id in queue and before_id not in entry_ids:
+            destination = self.remaining_position(before_id, entry_ids)
+        else:
+            log.debug("Move target left the queue; nothing moved")
+            return
+        queue.move_ids(entry_ids, destination)
+        log.debug(f"Moved {len(entry_ids)} entries")
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def play_ids_next(self, entry_ids):
+        """Move entries to right after the current one so they play next"""
+        queue = self.queue
+        current_id = queue.current_id
+        entry_ids = [entry_id for entry_id in dict.fromkeys(entry_ids)
+                     if entry_id in queue and entry_id != current_id]
+        if not entry_ids:
+            return
+        destination = self.remaining_position(current_id, entry_ids) + 1 if current_id is not None else 0
+        queue.move_ids(entry_ids, destination)
+        if self.shuffle_mode != "off":
+            self.shuffle_order.play_next(entry_ids)
+        log.debug(f"Playing next: {len(entry_ids)} entries")
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def remaining_position(self, entry_id, moving_ids):
+        """Position of an entry once the moving entries are taken out"""
+        position = self.queue.position_of(entry_id)
+        return position - sum(1 for moving_id in moving_ids if self.queue.position_of(moving_id) < position)
+
+    def play_id(self, entry_id):
+        """Play a queue entry wherever it is now (nothing if it was removed)"""
+        if entry_id in self.queue:
+            self.play_index(self.queue.position_of(entry_id))
+
+    def remove_entries(self, positions):
+        """Remove the entries at some positions, return how many were removed"""
+        entry_ids = self.entry_ids_at(positions)
+        if entry_ids:
+            self.remove_ids(entry_ids)
+            log.info(f"Removed {len(entry_ids)} entries from the queue")
+        return len(entry_ids)
+
+    def remove_ids(self, entry_ids):
+        """Remove entries by ID (ones already gone are ignored); playback moves on if the current one goes"""
+        doomed = {entry_id for entry_id in entry_ids if entry_id in self.queue}
+        if not doomed:
+            return
+        current_id = self.queue.current_id
+        following_id = None
+        if current_id in doomed and self.shuffle_mode == "off":
+            # The first surviving entry after the current one takes over
+            position = self.current_queue_index + 1
+            while position < len(self.queue) and self.queue.entry_id(position) in doomed:
+                position += 1
+            if position < len(self.queue):
+                following_id = self.queue.entry_id(position)
+        self.queue.remove_ids(doomed)
+        if current_id in doomed:
+            self.replace_removed_current(following_id)
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def replace_removed_current(self, following_id):
+        """The current entry was removed: go on with following_id like after a finished track"""
+        active = self.is_playing or self.is_paused
+        if self.shuffle_mode != "off":
+            next_index = self.next_shuffled_index()
+            if next_index is not None:
+                following_id = self.shuffle_order.advance()
+        elif following_id is None and self.loop_mode == "queue" and self.queue:
+            following_id = self.queue.entry_id(0)
+
+        if following_id is None:
+            # Nothing left to go on with
+            self.stop()
+            self.current_file = None
+            return
+        self.queue.current_id = following_id
+        if active:
+            self.play_media(self.queue.path_of(following_id))
+        else:
+            # Play starts from there
+            self.current_file = None
+            self.stopped_position = 0
+
+    def dedupe_queue(self):
+        """Remove repeated files, keeping the first of each (or the current one), return how many"""
+        queue = self.queue
+        current_id = queue.current_id
+        current_path = queue.path_of(current_id) if current_id is not None else None
+        seen = set()
+        duplicates = []
+        for entry_id in queue.ids():
+            path = queue.path_of(entry_id)
+            if path in seen or (path == current_path and entry_id != current_id):
+                duplicates.append(entry_id)
+            else:
+                seen.add(path)
+        if duplicates:
+            self.remove_ids(duplicates)
+        log.info(f"Removed {len(duplicates)} duplicate entries")
+        return len(duplicates)
+
+    def remove_missing(self):
+        """Check every entry in the background and remove the files that are gone"""
+        self.cancel_queue_check()
+        current_id = self.queue.current_id
+        entries = [(entry_id, self.queue.path_of(entry_id)) for entry_id in self.queue.ids()
+                   if entry_id != current_id]
+        self.missing_files = []
+        if entries:
+            self.queue_checker = ExistenceChecker(entries).start()
+            self.pump_queue_check()
+
+    def insert_next(self, file_paths):
+        """Insert files right after the current entry so they play next, return how many"""
+        audio_files = [path for path in file_paths if not is_video_file(path)]
+        if len(audio_files) < len(file_paths):
+            log.warning("Video files not supported (audio only)")
+        if not audio_files:
+            return 0
+
+        new_ids = self.queue.insert_paths(self.current_queue_index + 1, audio_files)
+        log.debug(f"Playing next: {len(audio_files)} files")
+        if self.shuffle_mode != "off":
+            self.shuffle_order.play_next(new_ids)
+
+        # If nothing is playing, start with the first of them
+        if not self.is_playing and not self.is_paused:
+            self.queue.current_id = new_ids[0]
+            self.play_media(audio_files[0])
+
+        self.emit('queue_changed')
+        self.refresh_preload()
+        return len(audio_files)
+
+    def open_file(self, file_path):
+        """Replace the queue with one file and play it"""
+        if is_video_file(file_path):
+            log.warning("Video files not supported (audio only)")
+            return False
+        self.cancel_folder_scan()
+        self.cancel_queue_check()
+        self.current_file = file_path
+        self.queue.replace([file_path])
+        self.current_queue_index = 0
+        self.play_media(file_path)
+        self.emit('queue_changed')
+        return True
+
+    def open_folder(self, folder_path):
+        """Replace the queue with everything under a folder (no video)"""
+        self.cancel_queue_check()
+        self.queue.clear()
+        self.emit('queue_changed')
+        self.start_folder_scan(folder_path, replace=True)
+
+    def add_files(self, file_paths):
+        """Add files to the end of the queue, return how many were added"""
+        audio_files = [path for path in file_paths if not is_video_file(path)]
+        if len(audio_files) < len(file_paths):
+            log.warning("Video files not supported (audio only)")
+        if not audio_files:
+            return 0
+
+        first_index = len(self.queue)
+        self.queue.extend(audio_files)
+        for path in audio_files:
+            log.debug(f"Added to queue: {os.path.basename(path)}")
+
+        # If nothing is playing, start playing the added file
+        if not self.is_playing and not self.is_paused:
+            self.current_queue_index = first_index
+            self.play_media(audio_files[0])
+
+        self.emit('queue_changed')
+        self.refresh_preload()
+        return len(audio_files)
+
+    def add_folder(self, folder_path):
+        """Add all audio files from a folder (and its subfolders) to the end of the queue"""
+        self.start_folder_scan(folder_path, replace=False)
+
+    # ---- folder scans ----
+
+    def start_folder_scan(self, folder_path, replace):
+        """Scan a folder tree in the background, streaming tracks into the queue"""
+        self.cancel_folder_scan()
+        self.scan_replaces_queue = replace
+        self.scan_added_count = 0
+        self.folder_scanner = FolderScanner(folder_path).start()
+        self.scan_started = time.monotonic()
+        log.info(f"Scanning folder: {folder_path}")
+        self.pump_folder_scan()
+
+    def cancel_folder_scan(self):
+        """Stop a running folder scan, keeping the tracks already queued"""
+        if self.folder_scanner is not None:
+            if self.folder_scanner.is_running():
+                self.folder_scanner.cancel()
+                log.info(f"Folder scan cancelled ({self.scan_added_count} files queued)")
+            self.folder_scanner = None
+            self.emit('scan_stopped')
+        if self.scan_job is not None:
+            self.scheduler.cancel(self.scan_job)
+            self.scan_job = None
+
+    def pump_folder_scan(self):
+        """Move finished scan batches into the queue"""
+        self.scan_job = None
+        scanner = self.folder_scanner
+        if scanner is None:
+            return
+
+        # Check before polling so the last batch is never missed
+        finished = scanner.finished.is_set()
+        batches = scanner.poll()
+
+        for batch in batches:
+            # Opening a folder plays its first file; adding only does if nothing is playing
+            if self.scan_replaces_queue:
+                start_playing = self.scan_added_count == 0
+            else:
+                start_playing = (self.scan_added_count == 0 and not self.is_playing
+                                 and not self.is_paused and len(self.queue) == 0)
+            first_index = len(self.queue)
+            self.queue.extend(batch)
+            self.scan_added_count += len(batch)
+
+            if start_playing:
+                self.current_queue_index = first_index
+                self.play_media(self.queue[first_index])
+        if batches:
+            self.emit('queue_changed')
+            self.refresh_preload()
+
+        if finished:
+            self.folder_scanner = None
+            observe('folder_scan', (time.monotonic() - self.scan_started) * 1000)
+            if self.scan_added_count:
+                log.info(f"Added {self.scan_added_count} audio files to queue from folder")
+            else:
+                log.info("No audio files found in folder")
+            self.emit('scan_finished', self.scan_added_count)
+            return
+
+        self.emit('scan_progress', *scanner.progress())
+        self.scan_job = self.scheduler.call_later(SCAN_POLL_INTERVAL, self.pump_folder_scan)
+
+    # ---- queue files ----
+
+    def save_queue(self, file_path, compact=False):
+        """Save the current queue to a file (compact=True for the binary format)"""
+        if not self.queue:
+            log.info("Queue is empty, nothing to save")
+            return False
+        if compact:
+            # Store known durations/tags too so they're available without probing
+            metadata = self.metadata.library.cached_metadata(self.queue)
+            metadata.update(self.queue.known_metadata())
+            write_compact_queue_file(file_path, self.queue, self.current_queue_index, metadata)
+        else:
+            write_queue_file(file_path, self.queue, self.current_queue_index)
+        log.info(f"Queue saved to: {file_path}")
+        log.info(f"Saved {len(self.queue)} items")
+        return True
+
+    def load_queue(self, file_path):
+        """Load a queue from a file, resuming at its saved position"""
+        loaded_queue, saved_index, hints = read_queue_file(file_path)
+
+        # Filter out video files (existence is checked in the background)
+        audio_files = []
+        kept = []
+        video_count = 0
+        for index, file in enumerate(loaded_queue):
+            if is_video_file(file):
+                video_count += 1
+                if index < saved_index:
+                    saved_index -= 1
+            else:
+                audio_files.append(file)
+                kept.append(index)
+        if hints is not None and video_count:
+            hints = hints.select(kept)
+
+        if not audio_files:
+            log.warning("No valid audio files found in queue")
+            return 0
+
+        # Find the saved track, or the first existing one after it
+        start_index = min(saved_index, len(audio_files) - 1)
+        skipped = []
+        while start_index < len(audio_files) and not os.path.exists(audio_files[start_index]):
+            skipped.append(audio_files[start_index])
+            start_index += 1
+        if start_index == len(audio_files):
+            start_index = None
+
+        # Stop current playback if any
+        if self.is_playing or self.is_paused:
+            self.mixer.stop()
+            self.discard_mixer_queue()
+            self.is_playing = False
+            self.is_paused = False
+
+        # Set the new queue
+        self.cancel_folder_scan()
+        self.cancel_queue_check()
+        # Durations and tags saved with a compact queue are kept on its entries
+        self.queue.replace(audio_files, hints)
+
+        log.info(f"Queue loaded from: {file_path}")
+        log.info(f"Loaded {len(audio_files)} audio files")
+        if video_count > 0:
+            log.warning(f"Warning: {video_count} video files skipped (audio only)")
+
+        # Check everything not yet checked, upcoming tracks first
+        ids = list(self.queue.ids())
+        first_checked = min(saved_index, len(ids) - 1)
+        last_checked = len(ids) if start_index is None else start_index
+        entries = [(ids[i], audio_files[i]) for i in range(last_checked + 1, len(ids))]
+        entries += [(ids[i], audio_files[i]) for i in range(0, first_checked)]
+        self.missing_files = []
+        if entries:
+            self.queue_checker = ExistenceChecker(entries).start()
+
+        # Drop the missing entries we ran into while looking for the start
+        self.queue.remove_ids(ids[first_checked:last_checked])
+        self.missing_files.extend(skipped)
+
+        # Start playing the saved track
+        if start_index is not None:
+            self.queue.current_id = ids[start_index]
+            self.play_media(self.queue[self.current_queue_index])
+        elif entries:
+            # Nothing after the saved position exists; try from the start
+            self.current_queue_index = 0
+            self.play_media(self.queue[0])
+
+        self.emit('queue_changed')
+        self.pump_queue_check()
+        return len(audio_files)
+
+    def cancel_queue_check(self):
+        """Stop checking a loaded queue for missing files"""
+        if self.queue_checker is not None:
+            self.queue_checker.cancel()
+            self.queue_checker = None
+        if self.queue_check_job is not None:
+            self.scheduler.cancel(self.queue_check_job)
+            self.queue_check_job = None
+
+    def pump_queue_check(self):
+        """Remove entries the background check found missing"""
+        self.queue_check_job = None
+        checker = self.queue_checker
+        finished = checker is None or checker.finished.is_set()
+
+        missing_ids = []
+        if checker is not None:
+            for entry_id, path in checker.poll():
+                # Entries may have been removed or be playing by now
+                if entry_id in self.queue and entry_id != self.queue.current_id:
+                    missing_ids.append(entry_id)
+                    self.missing_files.append(path)
+        if missing_ids:
+            self.queue.remove_ids(missing_ids)
+            self.emit('queue_changed')
+            self.refresh_preload()
+
+        if not finished:
+            self.queue_check_job = self.scheduler.call_later(CHECK_POLL_INTERVAL, self.pump_queue_check)
+            return
+
+        self.queue_checker = None
+        if self.missing_files:
+            log.warning(f"Warning: {len(self.missing_files)} files not found and were removed from the queue")
+            for path in self.missing_files:
+                log.warning(f"  Missing: {path}")
+            missing, self.missing_files = self.missing_files, []
+            self.emit('missing_files', missing)
+
+    # ---- track changes ----
+
+    def play_index(self, position):
+        """Skip to the track at a queue position"""
+        if 0 <= position < len(self.queue):
+            if self.shuffle_mode != "off" and position != self.current_queue_index:
+                # Back returns to what was playing before the jump
+                self.shuffle_order.push_history(self.queue.current_id)
+            self.current_queue_index = position
+            selected_file = self.queue[position]
+            log.debug(f"Skipping to: {os.path.basename(selected_file)}")
+            self.play_media(selected_file)
+            self.emit('queue_changed')
+
+    def play_next_in_queue(self):
+        """Play the next file in the queue"""
+        if self.shuffle_mode != "off":
+            if self.next_shuffled_index() is not None:
+                self.skip_shuffled(1)
+            else:
+                self.end_of_queue()
+        elif self.current_queue_index < len(self.queue) - 1:
+            self.current_queue_index += 1
+            next_file = self.queue[self.current_queue_index]
+            log.debug(f"Playing next in queue: {os.path.basename(next_file)}")
+            self.play_media(next_file)
+            self.emit('queue_changed')
+        else:
+            # Reached end of queue
+            if self.loop_mode == "queue":
+                # Loop back to start of queue
+                log.debug("Looping queue from beginning")
+                self.current_queue_index = 0
+                self.play_media(self.queue[0])
+                self.emit('queue_changed')
+            else:
+                self.end_of_queue()
+
+    def end_of_queue(self):
+        """Nothing follows the track that just finished"""
+        log.info("End of queue")
+        self.stopped_position = min(self.clock.position(), self.audio_length or float('inf'))
+        self.is_playing = False
+        self.is_paused = False
+        self.emit('playback_state')
+
+    def play_previous_in_queue(self):
+        """Play the previous file in the queue or restart current"""
+        # Get current playback time
+        current_time = self.current_position()
+
+        if self.shuffle_mode != "off":
+            # Back through what actually played
+            self.skip_shuffled(-1)
+        # If less than 3 seconds, go to previous track
+        elif current_time < 3 and self.current_queue_index > 0:
+            self.current_queue_index -= 1
+            prev_file = self.queue[self.current_queue_index]
+            log.debug(f"Playing previous in queue: {os.path.basename(prev_file)}")
+            self.play_media(prev_file)
+            self.emit('queue_changed')
+        else:
+            # Restart current track
+            log.debug("Restarting current track")
+            if self.current_file:
+                self.play_media(self.current_file)
+
+    def next_track(self):
+        """Skip to next track in queue"""
+        if self.shuffle_mode != "off":
+            self.skip_shuffled(1)
+        elif self.current_queue_index < len(self.queue) - 1:
+            self.play_next_in_queue()
+        else:
+            # At last track
+            if self.loop_mode == "queue" and self.queue:
+                # Loop back to start
+                log.debug("Looping queue from beginning")
+                self.current_queue_index = 0
+                self.play_media(self.queue[0])
+                self.emit('queue_changed')
+            else:
+                log.debug("Already at last track")
+
+    def previous_track(self):
+        """Go to previous track or restart current"""
+        self.play_previous_in_queue()
+
+    def skip(self, count):
+        """Act like count presses of Next (negative: Back) but load only the last track"""
+        if self.shuffle_mode != "off":
+            self.skip_shuffled(count)
+            return
+        if count == 1:
+            self.next_track()
+            return
+        if count == -1:
+            self.previous_track()
+            return
+        if not count or not self.queue:
+            return
+
+        if count > 0:
+            if self.loop_mode == "queue":
+                target = (self.current_queue_index + count) % len(self.queue)
+            else:
+                target = min(self.current_queue_index + count, len(self.queue) - 1)
+        else:
+            # The first Back press only restarts a track that has played a while
+            steps = -count - (1 if self.current_position() >= 3 else 0)
+            target = max(self.current_queue_index - steps, 0)
+
+        if target != self.current_queue_index or (count > 0 and self.loop_mode == "queue"):
+            self.play_index(target)
+        elif count > 0:
+            log.debug("Already at last track")
+        elif self.current_file:
+            log.debug("Restarting current track")
+            self.play_media(self.current_file)
+
+    def skip_shuffled(self, count):
+        """skip() through the shuffled order, and back through the ones played before"""
+        if not self.queue:
+            return
+        order = self.shuffle_order
+        start_id = self.queue.current_id
+        if count > 0:
+            for _ in range(count):
+                if self.next_shuffled_index() is None:
+                    break
+                self.queue.current_id = order.advance()
+        else:
+            # The first Back press only restarts a track that has played a while
+            for _ in range(-count - (1 if self.current_position() >= 3 else 0)):
+                previous_id = order.back()
+                if previous_id is None:
+                    break
+                self.queue.current_id = previous_id
+
+        if self.queue.current_id != start_id:
+            next_file = self.queue.path_of(self.queue.current_id)
+            log.debug(f"Playing shuffled: {os.path.basename(next_file)}")
+            self.play_media(next_file)
+            self.emit('queue_changed')
+        elif count > 0:
+            log.debug("Already at last track")
+        elif self.current_file:
+            log.debug("Restarting current track")
+            self.play_media(self.current_file)
+
+    def play_media(self, file_path):
+        """Play audio file"""
+        with span('track_switch'):
+            increment('track_switches')
+            self._play_media(file_path)
+
+    def _play_media(self, file_path):
+        self.cancel_transcode_wait()
+        try:
+            source = self.playable_source(file_path)
+            # Get audio length (and tags/art) from one read of the file, cached across runs
+            with span('probe'):
+                self.audio_length = self.track_length(file_path, source)
+
+            # Load and play audio
+            with span('mixer_load'):
+                self.mixer.load(source)
+                self.mixer.play()
+                self.discard_mixer_queue()
+
+            # Set volume to current level, with the track's stored gain
+            self.track_gain = self.gain_for(file_path)
+            self.apply_volume()
+
+            self.on_track_started(file_path, source)
+
+            # Not converted yet: switch to the copy once it's ready
+            if source == file_path:
+                self.wait_for_conversion(file_path)
+
+            # Get the following track ready for a gapless handoff
+            self.refresh_preload()
+
+        except Exception as e:
+            log.error(f"Error playing file: {e}")
+            # Formats the mixer can't open at all play once converted
+            if self.can_convert(file_path):
+                self.stop()
+                self.wait_for_conversion(file_path)
+                self.current_file = file_path
+                log.info(f"Converting {os.path.basename(file_path)} for playback...")
+                return
+            # Try to play next in queue if there's an error
+            if self.current_queue_index < len(self.queue) - 1:
+                self.play_next_in_queue()
+
+    def track_length(self, file_path, source):
+        """Duration of a track, from its converted copy when it has one"""
+        duration = self.load_metadata(file_path)['duration']
+        if source != file_path:
+            # The original's length may be unknown (raw AAC), the copy's isn't
+            duration = self.metadata.get(source)['duration'] or duration
+        return duration
+
+    def cached_metadata(self, file_paths):
+        """Metadata the library already has for some files, without reading them"""
+        library = self.metadata.library
+        return library.cached_metadata(file_paths) if library is not None else {}
+
+    def load_metadata(self, file_path):
+        """Get a file's duration and tags, remembering them on its queue entry"""
+        metadata = self.metadata.get(file_path)
+        current_id = self.queue.current_id
+        if current_id is not None and self.queue.path_of(current_id) == file_path:
+            self.queue.set_metadata(current_id, metadata)
+        return metadata
+
+    def on_track_started(self, file_path, source=None):
+        """Update state once the mixer has started a track"""
+        self.cancel_seek()
+        self.close_seek_stream()
+        self.is_playing = True
+        self.is_paused = False
+        self.current_file = file_path
+        self.current_source = source or file_path
+        if self.shuffle_mode != "off":
+            self.shuffle_order.played(self.queue.current_id)
+        self.clock.start(0)
+        self.restart_end_watch()
+
+        log.info(f"Now playing: {os.path.basename(file_path)}")
+        self.emit('track_started', file_path)
+
+    def next_queue_index(self):
+        """Index of the track that should follow the current one, or None"""
+        if self.loop_mode == "media":
+            if 0 <= self.current_queue_index < len(self.queue):
+                return self.current_queue_index
+            return None
+        if self.shuffle_mode != "off":
+            return self.next_shuffled_index()
+        if self.current_queue_index < len(self.queue) - 1:
+            return self.current_queue_index + 1
+        if self.loop_mode == "queue" and self.queue:
+            return 0
+        return None
+
+    def next_shuffled_index(self):
+        """Position of the next track in the shuffled order, None at the end of a round"""
+        following = self.shuffle_order.peek()
+        if not following and self.loop_mode == "queue" and len(self.queue) > 1:
+            # Another round, which doesn't start with the track just played
+            self.shuffle_order.new_round()
+            self.shuffle_order.played(self.queue.current_id)
+            following = self.shuffle_order.peek()
+        return self.queue.position_of(following[0]) if following else None
+
+    def upcoming_files(self, count):
+        """The next few files that will play, following the loop and shuffle modes"""
+        upcoming = []
+        if not self.queue or self.loop_mode == "media":
+            return upcoming
+        if self.shuffle_mode != "off":
+            return [self.queue.path_of(entry_id) for entry_id in self.shuffle_order.peek(count)]
+        index = self.current_queue_index
+        for _ in range(count):
+            index += 1
+            if index >= len(self.queue):
+                if self.loop_mode != "queue":
+                    break
+                index = 0
+            if index == self.current_queue_index:
+                break
+            upcoming.append(self.queue[index])
+        return upcoming
+
+    # ---- converted copies ----
+
+    def find_transcoder(self):
+        """The transcoding cache, or None without ffmpeg (looked up on first need)"""
+        if self.transcoder is None:
+            self.transcoder = get_transcoder() or False
+        return self.transcoder or None
+
+    def can_convert(self, file_path):
+        return needs_transcoding(file_path) and self.find_transcoder() is not None
+
+    def playable_source(self, file_path):
+        """The file to hand the mixer: the converted copy if there is one"""
+        if not self.can_convert(file_path):
+            return file_path
+        return self.transcoder.lookup(file_path) or file_path
+
+    def prefetch_conversions(self):
+        """Convert upcoming tracks the mixer handles poorly before their turn"""
+        upcoming = [path for path in self.upcoming_files(TRANSCODE_AHEAD) if needs_transcoding(path)]
+        if upcoming and self.find_transcoder() is not None:
+            self.transcoder.prefetch(upcoming)
+
+    def wait_for_conversion(self, file_path):
+        """Convert a file if it needs it and come back to it when done"""
+        if not self.can_convert(file_path):
+            return
+        self.transcode_wait = (file_path, self.transcoder.request(file_path))
+        if self.transcode_job is None:
+            self.transcode_job = self.scheduler.call_later(TRANSCODE_POLL_INTERVAL, self.check_conversion)
+
+    def cancel_transcode_wait(self):
+        """Stop waiting for a conversion (it still finishes and stays cached)"""
+        self.transcode_wait = None
+        if self.transcode_job is not None:
+            self.scheduler.cancel(self.transcode_job)
+            self.transcode_job = None
+
+    def check_conversion(self):
+        """Play the converted copy the player was waiting for once it's ready"""
+        self.transcode_job = None
+        if self.transcode_wait is None:
+            return
+        file_path, future = self.transcode_wait
+        if not future.done():
+            self.transcode_job = self.scheduler.call_later(TRANSCODE_POLL_INTERVAL, self.check_conversion)
+            return
+        self.transcode_wait = None
+        if file_path != self.current_file:
+            return
+
+        playing = self.is_playing or self.is_paused
+        try:
+            source = future.result()
+        except Exception as e:
+            log.warning(f"Could not convert {os.path.basename(file_path)}: {e}")
+            if not playing:
+                # It can't be played either way
+                self.play_next_in_queue()
+            return
+
+        if playing:
+            self.switch_source(source)
+        else:
+            self.play_media(file_path)
+
+    def switch_source(self, source):
+        """Carry on playing the current track from its converted copy"""
+        position = self.current_position()
+        paused = self.is_paused
+        self.cancel_seek()
+        self.current_source = source
+        self.audio_length = self.track_length(self.current_file, source)
+        position = self.restart_stream_at(position)
+        self.clock.start(position)
+        if paused:
+            self.mixer.pause()
+            self.clock.pause()
+        else:
+            self.restart_end_watch()
+        log.info(f"Playing converted copy of {os.path.basename(self.current_file)}")
+        self.emit('track_length', self.audio_length)
+
+    # ---- loudness ----
+
+    def gain_for(self, file_path):
+        """Volume factor for a track from its stored loudness (1.0 if unknown or off)"""
+        if not self.normalize or not file_path:
+            return 1.0
+        stored = self.metadata.library.get_loudness(file_path)
+        return gain_factor(*stored) if stored else 1.0
+
+    def analyze_loudness(self, file_paths=None):
+        """Measure files (default: the library index and the queue) in the background"""
+        if file_paths is None:
+            library = self.metadata.library
+            file_paths = library.files_without_loudness()
+            file_paths += [path for path in self.queue if library.get_loudness(path) is None]
+        file_paths = [path for path in dict.fromkeys(file_paths) if path not in self.loudness_tried]
+        if not file_paths:
+            log.info("No tracks left to analyze")
+            if self.loudness_scan is None:
+                self.emit('loudness_finished', 0)
+            return
+        log.info(f"Analyzing loudness of {len(file_paths)} tracks")
+        self.loudness_tried.update(file_paths)
+        if self.loudness_scan is None:
+            self.loudness_scan = LoudnessScan(find_ffmpeg())
+            self.loudness_stored = 0
+            self.loudness_job = self.scheduler.call_later(LOUDNESS_POLL_INTERVAL, self.pump_loudness_scan)
+        self.loudness_scan.add(file_paths)
+
+    def measure_upcoming(self):
+        """Measure the next few tracks before their turn so their gain is ready"""
+        if not self.normalize:
+            return
+        library = self.metadata.library
+        upcoming = [path for path in self.upcoming_files(LOUDNESS_AHEAD)
+                    if path not in self.loudness_tried and library.get_loudness(path) is None]
+        if upcoming:
+            self.analyze_loudness(upcoming)
+
+    def pump_loudness_scan(self):
+        """Store finished loudness results"""
+        self.loudness_job = None
+        scan = self.loudness_scan
+        if scan is None:
+            return
+        library = self.metadata.library
+        for file_path, result in scan.poll():
+            identity = file_identity(file_path)
+            if result is not None and identity is not None:
+                library.store_loudness(file_path, identity, result)
+                self.loudness_stored += 1
+                # The preloaded track starts with its gain when it comes up
+                if file_path == self.mixer_queued_file:
+                    self.mixer_queued_gain = self.gain_for(file_path)
+
+        if scan.finished:
+            scan.close()
+            self.loudness_scan = None
+            log.info(f"Loudness analysis finished: {self.loudness_stored} tracks")
+            self.emit('loudness_finished', self.loudness_stored)
+            return
+        self.emit('loudness_progress', scan.done, scan.total)
+        self.loudness_job = self.scheduler.call_later(LOUDNESS_POLL_INTERVAL, self.pump_loudness_scan)
+
+    def cancel_loudness_scan(self):
+        if self.loudness_job is not None:
+            self.scheduler.cancel(self.loudness_job)
+            self.loudness_job = None
+        if self.loudness_scan is not None:
+            self.loudness_scan.close()
+            self.loudness_scan = None
+            # Files that never got their turn may be tried again
+            self.loudness_tried.clear()
+            log.info("Loudness analysis cancelled")
+            self.emit('loudness_finished', self.loudness_stored)
+
+    # ---- gapless handoff ----
+
+    def discard_mixer_queue(self):
+        """Forget the mixer's queued track after a load/play/stop replaced it"""
+        self.mixer_queued_file = None
+        # Stopping the old track posts an end event we must not act on
+        self.mixer.clear_end_events()
+
+    def refresh_preload(self):
+        """Queue the upcoming track in the mixer so it starts without a gap"""
+        with span('preload'):
+            self._refresh_preload()
+
+    def _refresh_preload(self):
+        self.prefetch_conversions()
+        self.measure_upcoming()
+        if not self.current_file or not (self.is_playing or self.is_paused) or not self.gapless_active:
+            return
+
+        next_index = self.next_queue_index()
+        if next_index is None:
+            # The mixer can't unqueue; a stale queued track is stopped at handoff
+            return
+
+        next_file = self.queue[next_index]
+        if next_file == self.mixer_queued_file:
+            return
+        source = self.playable_source(next_file)
+        if source == next_file and self.can_convert(next_file):
+            # Not converted yet; it starts through play_media when its turn comes
+            return
+        try:
+            # Probe now so the handoff itself does no file I/O
+            self.metadata.get(source)
+            self.mixer.queue(source)
+            self.mixer_queued_file = next_file
+            self.mixer_queued_source = source
+            self.mixer_queued_gain = self.gain_for(next_file)
+        except Exception as e:
+            log.warning(f"Could not preload {os.path.basename(next_file)}: {e}")
+            self.mixer_queued_file = None
+
+    def on_gapless_handoff(self):
+        """The mixer moved on to the queued track by itself"""
+        queued_file = self.mixer_queued_file
+        self.mixer_queued_file = None
+
+        # The queue may have changed since the track was handed to the mixer
+        next_index = self.next_queue_index()
+        if next_index is None or self.queue[next_index] != queued_file:
+            self.mixer.stop()
+            self.discard_mixer_queue()
+            self.on_track_finished()
+            return
+
+        increment('gapless_handoffs')
+        if self.shuffle_mode != "off" and self.loop_mode != "media":
+            self.queue.current_id = self.shuffle_order.advance()
+        else:
+            self.current_queue_index = next_index
+        self.audio_length = self.track_length(queued_file, self.mixer_queued_source)
+        self.track_gain = self.mixer_queued_gain
+        self.apply_volume()
+        self.on_track_started(queued_file, self.mixer_queued_source)
+        self.emit('queue_changed')
+        self.refresh_preload()
+
+    def on_track_finished(self):
+        """Move on after the current track played to its end"""
+        if self.loop_mode == "media":
+            # Loop current media
+            log.debug("Looping current media")
+            self.play_media(self.current_file)
+        else:
+            # Play next in queue or loop queue (or stop if loop_mode is "none")
+            log.debug("Track finished")
+            self.play_next_in_queue()
+
+    # ---- pause / stop ----
+
+    def toggle_pause(self):
+        """Toggle pause/resume for audio playback"""
+        if self.is_paused:
+            self.resume()
+        else:
+            self.pause()
+
+    def pause(self):
+        if self.current_file and self.is_playing:
+            self.mixer.pause()
+            self.clock.pause()
+            self.is_paused = True
+            self.is_playing = False
+            self.stop_end_watch()
+            log.debug("Paused")
+            self.emit('playback_state')
+
+    def resume(self):
+        if self.current_file and self.is_paused:
+            self.mixer.unpause()
+            self.is_paused = False
+            self.is_playing = True
+            self.clock.resume()
+            self.restart_end_watch()
+            log.debug("Resumed")
+            self.emit('playback_state')
+
+    def stop(self):
+        """Stop playback, keeping the queue and its current entry"""
+        self.cancel_transcode_wait()
+        if not (self.is_playing or self.is_paused):
+            return
+        self.cancel_seek()
+        self.mixer.stop()
+        self.discard_mixer_queue()
+        self.close_seek_stream()
+        self.stop_end_watch()
+        self.is_playing = False
+        self.is_paused = False
+        self.stopped_position = 0
+        log.debug("Stopped")
+        self.emit('playback_state')
+
+    # ---- position and end of track ----
+
+    def current_position(self):
+        """Current playback position in seconds"""
+        if self.pending_seek is not None:
+            return self.pending_seek
+        if not self.is_playing and not self.is_paused:
+            return self.stopped_position
+        return self.clock.position()
+
+    def restart_end_watch(self):
+        self.stop_end_watch()
+        self.check_track_end()
+
+    def stop_end_watch(self):
+        if self.end_job is not None:
+            self.scheduler.cancel(self.end_job)
+            self.end_job = None
+
+    def end_event_posted(self):
+        """The mixer posted its end event (called on the mixer's waiter thread)"""
+        self.scheduler.call_soon_threadsafe(self.check_track_end)
+
+    def check_track_end(self):
+        """Detect the end of the current track.
+
+        The mixer's end event wakes this up the moment a track runs out. A
+        mixer without end events gets a timed check instead: it sleeps until
+        shortly before the track is due to end, then looks closely.
+        """
+        self.end_job = None
+        if not self.is_playing or self.is_paused:
+            return
+
+        ended = self.mixer.ended()
+        busy = self.mixer.get_busy()
+        if ended and busy and self.mixer_queued_file:
+            # The mixer already started the queued track by itself
+            self.on_gapless_handoff()
+            return
+        if not busy:
+            # Music has finished
+            self.on_track_finished()
+            return
+        if self.mixer.events_available:
+            # The next end event calls again
+            return
+
+        if self.audio_length > 0:
+            remaining = self.audio_length - self.current_position()
+            if remaining > END_WATCH_WINDOW:
+                delay = min(remaining - END_WATCH_WINDOW, 60.0)
+            else:
+                delay = END_WATCH_INTERVAL
+        else:
+            # Unknown length, nothing to aim for
+            delay = UNKNOWN_LENGTH_INTERVAL
+        self.end_job = self.scheduler.call_later(delay, self.check_track_end)
+
+    # ---- seeking ----
+
+    def seek_relative(self, offset):
+        """Seek by an offset in seconds (relative to a still pending seek)"""
+        if self.current_file and self.audio_length > 0:
+            self.seek(self.current_position() + offset)
+
+    def seek(self, position):
+        """Seek to a specific position in the audio.
+
+        Listeners hear about the target right away; the seek itself happens
+        at most once per SEEK_INTERVAL, so a held arrow key costs one seek
+        per burst.
+        """
+        if not (self.current_file and self.audio_length > 0):
+            return
+        increment('seek_requests')
+        self.pending_seek = max(0, min(position, self.audio_length))
+        self.emit('seek_requested', self.pending_seek)
+
+        if self.seek_job is None:
+            wait = self.last_seek_time + SEEK_INTERVAL - self.monotonic()
+            self.seek_job = self.scheduler.call_later(max(0, wait), self.apply_seek)
+
+    def cancel_seek(self):
+        """Forget a seek that hasn't been applied yet"""
+        self.pending_seek = None
+        if self.seek_job is not None:
+            self.scheduler.cancel(self.seek_job)
+            self.seek_job = None
+
+    def apply_seek(self):
+        """Seek the mixer to the latest requested position"""
+        self.seek_job = None
+        position = self.pending_seek
+        self.pending_seek = None
+        if position is None or not self.current_file:
+            return
+        self.last_seek_time = self.monotonic()
+        with span('seek'):
+            self._apply_seek(position)
+
+    def _apply_seek(self, position):
+        if self.mixer_queued_file and self.mixer.ended() and self.mixer.get_busy():
+            # The track ran out while the seek waited; don't seek in the one that followed
+            self.on_gapless_handoff()
+            return
+        try:
+            try:
+                # Move within the stream that is already open
+                if not self.mixer.get_busy() and not self.is_paused:
+                    raise self.mixer.error("music is not playing")
+                if position < self.seek_stream_start:
+                    raise self.mixer.error("position is before the start of the spliced stream")
+                # The mixer counts from the start of the stream it plays
+                self.mixer.set_pos(position - self.seek_stream_start)
+                if self.is_paused:
+                    self.mixer.unpause()
+            except self.mixer.error:
+                # The decoder can't seek (or the track already ended): restart it
+                position = self.restart_stream_at(position)
+
+            # Count from the new position
+            self.clock.start(position)
+            self.is_playing = True
+            self.is_paused = False
+
+            # The end of the track moved, restart the watch
+            self.restart_end_watch()
+
+            log.debug(f"Seeked to: {format_time(position)}")
+            self.emit('playback_state')
+        except Exception as e:
+            log.error(f"Error seeking: {e}")
+
+    def restart_stream_at(self, position):
+        """Reload the current track starting at a position, return where it starts.
+
+        With a seek table the mixer gets a stream that begins at the nearest
+        seek point, so only the stretch from there to the target (at most
+        one table step) has to be decoded.
+        """
+        table = self.seek_tables.get(self.current_source)
+        stream = None
+        stream_start = 0.0
+        if table is not None and len(table) > 1:
+            stream, stream_start = open_at(self.current_source, table, position)
+
+        if stream is not None:
+            extension = os.path.splitext(self.current_source)[1][1:].lower()
+            self.mixer.load(stream, extension)
+            try:
+                self.mixer.play(start=position - stream_start)
+            except self.mixer.error:
+                # Can't skip ahead within the stream either: start at the seek point
+                self.mixer.play()
+                position = stream_start
+        else:
+            self.mixer.load(self.current_source)
+            self.mixer.play(start=position)
+        # The mixer has let go of the previous stream now
+        self.close_seek_stream()
+        self.seek_stream = stream
+        self.seek_stream_start = stream_start
+
+        self.apply_volume()
+        # Reloading dropped the preloaded next track
+        self.discard_mixer_queue()
+        self.refresh_preload()
+        return position
+
+    def close_seek_stream(self):
+        if self.seek_stream is not None:
+            self.seek_stream.close()
+            self.seek_stream = None
+        self.seek_stream_start = 0.0
+
+    def shutdown(self):
+        """Stop playback and background work"""
+        self.cancel_folder_scan()
+        self.cancel_queue_check()
+        self.cancel_loudness_scan()
+        self.stop()
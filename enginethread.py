@@ -0,0 +1,236 @@
+"""Run the playback engine on its own thread, fed by a command queue.
+
+The Tk window never calls into PlayerEngine directly: it posts commands
+(play, seek, pause, next, ...) that the engine thread runs in order, and
+reads state from snapshots the engine thread publishes. Probing, mixer
+calls, folder scans and queue files therefore never hold up the window.
+
+Commands posted faster than the engine runs them collapse: repeated
+Next/Back presses add up to one skip that loads a single track, and the
+newest seek target, volume or queue position replaces an older one still
+waiting. Only the newest waiting command is merged, so order is kept.
+
+The engine thread serves as the engine's scheduler (call_later/cancel),
+so its timers run on the same thread as its commands.
+
+While the queue window is open it gets the queue's edits (in terms of
+entry IDs) whenever the order changed, and the names of only those entries
+it hasn't been sent yet (entry IDs are never reused), so track changes send
+nothing and an edit costs about the same for any queue length. A newly
+opened window, or one that fell too far behind the queue's journal of
+edits, gets the whole order once.
+"""
+import time
+import heapq
+import threading
+from collections import deque
+
+from engine import PlayerEngine
+from instrument import log, span, increment, observe
+
+STATE_INTERVAL = 1.0           # Fresh state snapshot this often while playing (seconds)
+QUEUE_SNAPSHOT_INTERVAL = 0.25  # Least time between queue snapshots sent to the window
+UPCOMING_COUNT = 3              # Upcoming files listed in each snapshot
+
+# How a command merges with the same command still waiting: replace or add up
+REPLACE = 'replace'
+ADD = 'add'
+COLLAPSE = {
+    'skip': ADD,
+    'seek_relative': ADD,
+    'seek': REPLACE,
+    'set_volume': REPLACE,
+    'play_index': REPLACE,
+    'play_id': REPLACE,
+}
+
+
+class EngineThread:
+    """A PlayerEngine running on a worker thread"""
+
+    def __init__(self, engine_factory=PlayerEngine):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.commands = deque()  # [name, args, time posted] waiting to run
+        self.timers = []         # Heap of [due, sequence, callback]
+        self.timer_sequence = 0
+        # (event, args, state) for the window; deque appends/pops are thread-safe
+        self.outbox = deque()
+        self.running = False
+        self.watching_queue = False
+        self.queue_snapshot_job = None
+        self.last_queue_snapshot = 0
+        self.sent_queue_version = None  # Queue order the window has
+        self.sent_names_below = 0       # The window knows the names of entry IDs below this
+        self.state_job = None
+
+        self.engine = engine_factory(self)
+        self.engine.listeners.append(self.forward_event)
+        # Readable from any thread; replaced, never modified
+        self.state = self.snapshot()
+        self.thread = threading.Thread(target=self.run, name="engine", daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    # ---- scheduler interface (engine thread) ----
+
+    def call_later(self, seconds, callback):
+        with self.lock:
+            self.timer_sequence += 1
+            timer = [time.monotonic() + seconds, self.timer_sequence, callback]
+            heapq.heappush(self.timers, timer)
+            self.wakeup.notify()
+        return timer
+
+    def cancel(self, handle):
+        # Cancelled timers stay in the heap and are skipped when due
+        handle[2] = None
+
+    def call_soon_threadsafe(self, callback):
+        """Run a callback on the engine thread as soon as it is free (any thread)"""
+        self.call_later(0, callback)
+
+    # ---- commands (any thread) ----
+
+    def post(self, command, *args):
+        """Ask the engine thread to run engine.<command>(*args)"""
+        if command == 'next_track':
+            command, args = 'skip', (1,)
+        elif command == 'previous_track':
+            command, args = 'skip', (-1,)
+        with self.lock:
+            merge = COLLAPSE.get(command)
+            if merge and self.commands and self.commands[-1][0] == command:
+                waiting = self.commands[-1]
+                if merge == ADD:
+                    waiting[1] = (waiting[1][0] + args[0],)
+                else:
+                    waiting[1] = args
+                increment('commands_collapsed')
+            else:
+                self.commands.append([command, args, time.monotonic()])
+            self.wakeup.notify()
+
+    def stop(self, timeout=2.0):
+        """Shut the engine down and wait for the thread to finish"""
+        self.post('shutdown')
+        with self.lock:
+            self.running = False
+            self.wakeup.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.running and not self.commands and not self.due_timer():
+                    wait = self.timers[0][0] - time.monotonic() if self.timers else None
+                    self.wakeup.wait(wait)
+                callback = None
+                if self.commands:
+                    command, args, posted = self.commands.popleft()
+                elif self.running:
+                    callback = heapq.heappop(self.timers)[2]
+                else:
+                    break
+            try:
+                if callback is not None:
+                    callback()
+                else:
+                    # Time spent waiting behind other commands, then running
+                    observe('command_wait', (time.monotonic() - posted) * 1000)
+                    with span('command.' + command):
+                        self.run_command(command, args)
+            except Exception:
+                log.error("Error in playback engine:", exc_info=True)
+            if callback is None:
+                # Every command answers with fresh state
+                self.publish('state')
+
+    def due_timer(self):
+        """Whether the earliest timer is due, dropping cancelled ones (lock held)"""
+        while self.timers and self.timers[0][2] is None:
+            heapq.heappop(self.timers)
+        return bool(self.timers) and self.timers[0][0] <= time.monotonic()
+
+    def run_command(self, command, args):
+        if command == 'watch_queue':
+            self.watching_queue = args[0]
+            if self.watching_queue:
+                # A newly opened window starts from nothing
+                self.sent_queue_version = None
+                self.sent_names_below = 0
+                self.schedule_queue_snapshot()
+            return
+        getattr(self.engine, command)(*args)
+
+    # ---- publishing (engine thread) ----
+
+    def snapshot(self):
+        engine = self.engine
+        state = engine.status()
+        state['at'] = time.monotonic()
+        state['upcoming'] = engine.upcoming_files(UPCOMING_COUNT)
+        return state
+
+    def publish(self, event, *args):
+        self.state = self.snapshot()
+        self.outbox.append((event, args, self.state))
+        # Keep the position fresh while playing
+        if self.state['state'] == "playing" and self.state_job is None:
+            self.state_job = self.call_later(STATE_INTERVAL, self.publish_periodic)
+
+    def publish_periodic(self):
+        self.state_job = None
+        self.publish('state')
+
+    def forward_event(self, event, *args):
+        self.publish(event, *args)
+        if event == 'queue_changed' and self.watching_queue:
+            self.schedule_queue_snapshot()
+
+    def schedule_queue_snapshot(self):
+        """Send the window the queue's order, at most every QUEUE_SNAPSHOT_INTERVAL"""
+        if self.queue_snapshot_job is None:
+            wait = self.last_queue_snapshot + QUEUE_SNAPSHOT_INTERVAL - time.monotonic()
+            self.queue_snapshot_job = self.call_later(max(0, wait), self.publish_queue_snapshot)
+
+    def publish_queue_snapshot(self):
+        self.queue_snapshot_job = None
+        self.last_queue_snapshot = time.monotonic()
+        queue = self.engine.queue
+        if not self.watching_queue or queue.version == self.sent_queue_version:
+            return
+        with span('queue_snapshot'):
+            # The edits since the window's copy if the queue still has them all, else the whole order
+            changes = queue.changes_since(self.sent_queue_version)
+            ids = queue.ids_array() if changes is None else None
+            names = queue.names_from(self.sent_names_below)
+        self.sent_queue_version = queue.version
+        self.sent_names_below = queue.tracks.next_id
+        if changes is None:
+            self.outbox.append(('queue_snapshot', (ids, names), self.state))
+        else:
+            self.outbox.append(('queue_changes', (changes, names, len(queue)), self.state))
+
+    # ---- window side ----
+
+    def receive(self):
+        """Take the events published since the last call (window thread)"""
+        received = []
+        while self.outbox:
+            received.append(self.outbox.popleft())
+        return received
+
+    def position(self):
+        """Playback position, extrapolated from the newest snapshot"""
+        state = self.state
+        if state['state'] != "playing":
+            return state['position']
+        position = state['position'] + time.monotonic() - state['at']
+        if state['duration']:
+            position = min(position, state['duration'])
+        return position
@@ -0,0 +1,232 @@
+"""Log levels, timing spans, counters and latency histograms.
+
+Messages go through `log` at a level (debug, info, warning, error) and are
+only printed at or above the level in LANDPLAYER_LOG (default info; 'off'
+prints nothing). Per-action chatter is debug, so it costs nothing unless
+asked for.
+
+`span(name)` times a block into a latency histogram. Spans opened inside
+another one on the same thread are recorded as parts of the outermost one,
+and an outermost span slower than SLOW_SPAN_MS is logged with that
+breakdown, e.g.
+
+    Slow command.skip: 412.0 ms (probe 388.2, mixer_load 21.5, track_switch 410.9)
+
+`increment(name)` counts events. Everything is kept in memory under one
+lock; `metrics.dump(path)` writes it as JSON, or in Prometheus' text
+format for a .prom/.txt path. With LANDPLAYER_METRICS set to a path the
+metrics are dumped there when the program exits.
+"""
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+import traceback
+from collections import deque
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'off': 100}
+# Upper bounds of the latency histogram buckets (ms); the last bucket is open
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SLOW_SPAN_MS = 100      # Outermost spans slower than this are logged with their parts
+SLOW_SPANS_KEPT = 20    # Recent slow spans included in dumps
+
+
+class Log:
+    """print() with a level threshold"""
+
+    def __init__(self, level='info'):
+        self.threshold = LEVELS['info']
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.threshold = LEVELS.get(str(level).lower(), LEVELS['info'])
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.threshold
+
+    def write(self, level, message):
+        if LEVELS[level] >= self.threshold:
+            print(message)
+
+    def debug(self, message):
+        self.write('debug', message)
+
+    def info(self, message):
+        self.write('info', message)
+
+    def warning(self, message):
+        self.write('warning', message)
+
+    def error(self, message, exc_info=False):
+        """An error; with exc_info, followed by the traceback of the exception being handled"""
+        if exc_info and self.enabled('error'):
+            message = f"{message}\n{traceback.format_exc().rstrip()}"
+        self.write('error', message)
+
+
+class Histogram:
+    """Counts of observed latencies per bucket, with their sum and maximum"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS_MS, self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'mean_ms': round(self.total / self.count, 3) if self.count else None,
+                'p50_ms': self.quantile(0.5), 'p95_ms': self.quantile(0.95), 'max_ms': round(self.max, 3),
+                'buckets': {bound: count for bound, count in zip([str(bound) for bound in BUCKETS_MS] + ['+Inf'],
+                                                                 self.buckets) if count}}
+
+
+class Metrics:
+    """Counters, histograms and recent slow spans of the whole process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.slow = deque(maxlen=SLOW_SPANS_KEPT)
+        self.started = time.time()
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, ms):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def record_slow(self, name, ms, parts):
+        with self.lock:
+            self.slow.append({'span': name, 'ms': round(ms, 3), 'at': time.time(),
+                              'parts': [[part, round(part_ms, 3)] for part, part_ms in parts]})
+
+    def snapshot(self):
+        with self.lock:
+            return {'uptime_s': round(time.time() - self.started, 3),
+                    'counters': dict(self.counters),
+                    'latency': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                    'slow': list(self.slow)}
+
+    def prometheus(self):
+        """The metrics in Prometheus' text exposition format"""
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                metric = 'landplayer_' + _metric_name(name) + '_total'
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, histogram in sorted(self.histograms.items()):
+                metric = 'landplayer_' + _metric_name(name) + '_ms'
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS_MS, histogram.buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.total:.3f}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Write the metrics to a file: Prometheus text for .prom/.txt, else JSON"""
+        if os.path.splitext(path)[1].lower() in ('.prom', '.txt'):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+def _metric_name(name):
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+log = Log(os.environ.get('LANDPLAYER_LOG', 'info'))
+metrics = Metrics()
+_open_spans = threading.local()
+
+
+class span:
+    """Time a block into the `name` histogram: with span('probe'): ...
+
+    slow_ms=None keeps background work (conversions, analysis) out of the
+    slow-span log.
+    """
+
+    __slots__ = ('name', 'slow_ms', 'start', 'parts')
+
+    def __init__(self, name, slow_ms=SLOW_SPAN_MS):
+        self.name = name
+        self.slow_ms = slow_ms
+
+    def __enter__(self):
+        stack = getattr(_open_spans, 'stack', None)
+        if stack is None:
+            stack = _open_spans.stack = []
+        stack.append(self)
+        self.parts = []
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.start) * 1000
+        stack = _open_spans.stack
+        stack.pop()
+        metrics.observe(self.name, ms)
+        if stack:
+            # The outermost span collects every span inside it, innermost first
+            stack[0].parts.append((self.name, ms))
+        elif self.slow_ms is not None and ms >= self.slow_ms:
+            metrics.record_slow(self.name, ms, self.parts)
+            if log.enabled('info'):
+                parts = ', '.join(f"{part} {part_ms:.1f}" for part, part_ms in self.parts)
+                log.info(f"Slow {self.name}: {ms:.1f} ms" + (f" ({parts})" if parts else ""))
+        return False
+
+
+def increment(name, amount=1):
+    metrics.increment(name, amount)
+
+
+def observe(name, ms):
+    metrics.observe(name, ms)
+
+
+def _dump_at_exit():
+    path = os.environ.get('LANDPLAYER_METRICS')
+    if path:
+        try:
+            metrics.dump(path)
+        except OSError as e:
+            log.warning(f"Could not write metrics: {e}")
+
+
+atexit.register(_dump_at_exit)
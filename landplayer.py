@@ -1,20 +1,41 @@
 import tkinter as tk
-from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
-import pygame
 import os
 import sys
-from mutagen.mp3 import MP3
-from PIL import Image, ImageTk
-import io
 import time
-import random
-import json
 import platform
-
-# Initialize pygame mixer for audio
-pygame.mixer.init()
+import multiprocessing
+from engine import format_time, is_video_file
+from enginethread import EngineThread
+from artcache import ArtCache, THUMBNAIL_SIZE
+from queueview import QueueView, QueueRows
+from transcode import find_ffmpeg
+from waveform import WaveformCache
+from waveformbar import WaveformBar
+from instrument import log, observe
+
+WINDOW_TITLE = "LandPlayer - Audio Player"
+
+MIN_UI_INTERVAL = 0.05  # Fastest progress display refresh (seconds)
+SEEK_STEP = 5           # Seconds moved by the arrow keys
+
+ART_PREFETCH_COUNT = 3  # Upcoming tracks whose album art is decoded ahead of time
+ART_POLL_INTERVAL = 20  # ms between checks for a background-decoded thumbnail
+WAVEFORM_POLL_INTERVAL = 100  # ms between checks for a background-computed waveform
+
+# ms between checks for engine events: quickly while things happen, slowly when idle
+EVENT_POLL_INTERVAL = 15
+IDLE_POLL_INTERVAL = 100
+BUSY_PERIOD = 1.0       # Seconds of fast polling after the last command or event
+# Modifier bits of a Tk event's state
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+# The loop button names the mode a click switches to
+LOOP_BUTTON_TEXT = {"none": "Loop: Media", "media": "Loop: Queue", "queue": "Loop: None"}
+SHUFFLE_MENU_LABELS = (("off", "Off"), ("on", "On"), ("folder", "On, Spread Folders"),
+                       ("artist", "On, Spread Artists"))
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -33,100 +54,330 @@ def set_windows_appid():
             import ctypes
             myappid = 'lukyland.landplayer.audioplayer.1.0'  # Arbitrary string
             ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
-            print("Windows AppUserModelID set")
+            log.debug("Windows AppUserModelID set")
         except Exception as e:
-            print(f"Could not set AppUserModelID: {e}")
+            log.warning(f"Could not set AppUserModelID: {e}")
 
 class MediaPlayer:
-    def __init__(self, root):
+    """Tk window on top of a PlayerEngine running on its own thread"""
+
+    def __init__(self, root, worker=None):
         self.root = root
-        self.current_file = None
-        self.is_playing = False
-        self.is_paused = False
-        self.audio_length = 0
+        self.worker = worker or EngineThread()
+        # The window only reads snapshots of the engine's state
+        self.state = self.worker.state
+        self.last_activity = 0
+        self.queue_rows = QueueRows()  # The queue as the engine thread last sent it
         self.update_job = None
-        self.is_seeking = False
-        self.start_time = 0
-        self.seek_position = 0
+        self.shown_time = None
         self.pause_button = None
         self.loop_button = None
         self.screen_button = None
-        self.loop_mode = "none"  # "none", "media", or "queue"
         self.is_fullscreen = False
-        self.queue = []
-        self.current_queue_index = -1
         self.queue_window = None
-        self.drag_start_index = None
-        self.volume = 100  # Default volume at 100%
-
-        # Set window icon
-        self.set_window_icon(self.root)
+        self.queue_view = None
+        self.drag_start_id = None   # Entry pressed to start a drag
+        self.art_cache = ArtCache()
+        # Art read along with a track's tags goes straight to the art cache (thread-safe)
+        self.worker.engine.metadata.artwork_sink = self.art_cache.offer
+        self.art_request = None
+        self.art_job = None
+        self.placeholder_photo = None
+        self.icon_photo = None
+        self.waveforms = WaveformCache(find_ffmpeg())
+        self.waveform_request = None
+        self.waveform_job = None
+
+        self.build_window()
+
+        # Set window icon (for the queue window too)
+        self.set_window_icon()
 
         # Bind keyboard shortcuts
-        self.root.bind('<space>', lambda e: self.toggle_pause())
-        self.root.bind('<Control-Right>', lambda e: self.next_track())
-        self.root.bind('<Control-Left>', lambda e: self.previous_track())
+        self.root.bind('<space>', lambda e: self.post('toggle_pause'))
+        self.root.bind('<Control-Right>', lambda e: self.post('next_track'))
+        self.root.bind('<Control-Left>', lambda e: self.post('previous_track'))
         self.root.bind('<F11>', lambda e: self.toggle_fullscreen())
-        self.root.bind('<Left>', lambda e: self.seek_backward())
-        self.root.bind('<Right>', lambda e: self.seek_forward())
-
-    def set_window_icon(self, window):
-        """Set the window icon if landplayer.ico exists"""
+        self.root.bind('<Left>', lambda e: self.post('seek_relative', -SEEK_STEP))
+        self.root.bind('<Right>', lambda e: self.post('seek_relative', SEEK_STEP))
+        self.root.bind('<Map>', self.on_window_mapped)
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+
+        # Start the engine and listen for what it reports
+        self.worker.start()
+        self.poll_engine()
+
+    def post(self, command, *args):
+        """Hand a command to the engine thread"""
+        self.worker.post(command, *args)
+        self.last_activity = time.monotonic()
+
+    def command(self, command, *args):
+        """Callback for a widget that posts a command"""
+        return lambda: self.post(command, *args)
+
+    def on_close(self):
+        self.worker.stop()
+        self.waveforms.close()
+        self.root.destroy()
+
+    def build_window(self):
+        """Create the menus, artwork area and control panel"""
+        root = self.root
+        # Not running yet, so its settings can be read directly
+        engine = self.worker.engine
+
+        # Create menu bar
+        menubar = tk.Menu(root)
+        root.config(menu=menubar)
+
+        # Create File menu
+        file_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="File", menu=file_menu)
+
+        # Add menu items to File menu
+        file_menu.add_command(label="Open File", command=self.open_file)
+        file_menu.add_command(label="Open Folder", command=self.open_folder)
+        file_menu.add_separator()
+        file_menu.add_command(label="Add File", command=self.add_file_to_queue)
+        file_menu.add_command(label="Add File to Play Next", command=lambda: self.add_file_to_queue(play_next=True))
+        file_menu.add_command(label="Add Folder", command=self.add_folder_to_queue)
+        file_menu.add_command(label="Cancel Folder Scan", command=self.command('cancel_folder_scan'))
+
+        # Create Queue menu
+        queue_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Queue", menu=queue_menu)
+        queue_menu.add_command(label="Show Queue", command=self.show_queue_window)
+        queue_menu.add_command(label="Shuffle", command=self.command('shuffle_queue'))
+        queue_menu.add_command(label="Remove Duplicates", command=self.command('dedupe_queue'))
+        queue_menu.add_command(label="Remove Missing Files", command=self.command('remove_missing'))
+        # Random play order that leaves the queue as it is
+        shuffle_menu = tk.Menu(queue_menu, tearoff=0)
+        queue_menu.add_cascade(label="Shuffle Play", menu=shuffle_menu)
+        self.shuffle_var = tk.StringVar(value=engine.shuffle_mode)
+        for mode, label in SHUFFLE_MENU_LABELS:
+            shuffle_menu.add_radiobutton(label=label, value=mode, variable=self.shuffle_var,
+                                         command=lambda: self.post('set_shuffle_mode', self.shuffle_var.get()))
+        # Follows the engine's state: it stays off where the mixer has no end events
+        self.gapless_var = tk.BooleanVar(value=engine.gapless_active)
+        queue_menu.add_checkbutton(label="Gapless Playback", variable=self.gapless_var,
+                                   command=self.command('toggle_gapless'))
+        self.normalize_var = tk.BooleanVar(value=engine.normalize)
+        queue_menu.add_checkbutton(label="Normalize Volume", variable=self.normalize_var,
+                                   command=lambda: self.post('set_normalize', self.normalize_var.get()))
+        queue_menu.add_command(label="Analyze Loudness", command=self.command('analyze_loudness'))
+        queue_menu.add_command(label="Cancel Loudness Analysis", command=self.command('cancel_loudness_scan'))
+        queue_menu.add_separator()
+        queue_menu.add_command(label="Save Queue", command=self.save_queue)
+        queue_menu.add_command(label="Save Compact Queue", command=lambda: self.save_queue(compact=True))
+        queue_menu.add_command(label="Load Queue", command=self.load_queue)
+
+        # Create black content area
+        content_area = tk.Frame(root, bg="black")
+        content_area.pack(fill=tk.BOTH, expand=True)
+
+        # Create label for video display
+        self.video_label = tk.Label(content_area, bg="black")
+        self.video_label.pack(fill=tk.BOTH, expand=True)
+
+        # Create bottom control panel
+        bottom_frame = tk.Frame(root)
+        bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
+
+        # Progress bar with time labels on same line
+        progress_frame = tk.Frame(bottom_frame)
+        progress_frame.pack(fill=tk.X, pady=(0, 5))
+
+        self.time_left = tk.Label(progress_frame, text="00:00")
+        self.time_left.pack(side=tk.LEFT, padx=(0, 5))
+
+        # Progress bar, with the track's waveform behind it once it's known
+        self.progress_bar = WaveformBar(progress_frame)
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        # Bind click event to progress bar for seeking
+        self.progress_bar.bind('<Button-1>', self.on_progress_click)
+
+        self.time_right = tk.Label(progress_frame, text="/")
+        self.time_right.pack(side=tk.LEFT, padx=(5, 0))
+
+        # Create frame for buttons and volume
+        controls_frame = tk.Frame(bottom_frame)
+        controls_frame.pack(fill=tk.X)
+
+        # Button controls frame (left side)
+        button_frame = tk.Frame(controls_frame)
+        button_frame.pack(side=tk.LEFT, expand=True)
+
+        # Create control buttons
+        self.loop_button = tk.Button(button_frame, text=LOOP_BUTTON_TEXT[engine.loop_mode], width=10,
+                                     command=self.command('cycle_loop_mode'))
+        back_button = tk.Button(button_frame, text="Back", width=6, command=self.command('previous_track'))
+        self.pause_button = tk.Button(button_frame, text="Pause", width=8, command=self.command('toggle_pause'))
+        next_button = tk.Button(button_frame, text="Next", width=6, command=self.command('next_track'))
+        self.screen_button = tk.Button(button_frame, text="Screen: Full", width=11,
+                                       command=self.toggle_fullscreen)
+        for btn in (self.loop_button, back_button, self.pause_button, next_button, self.screen_button):
+            btn.pack(side=tk.LEFT, padx=5)
+
+        # Volume control frame (right side)
+        volume_frame = tk.Frame(controls_frame)
+        volume_frame.pack(side=tk.RIGHT, padx=(20, 0))
+
+        tk.Label(volume_frame, text="Volume:").pack(side=tk.LEFT, padx=(0, 5))
+
+        # Volume percentage label (created first, setting the slider updates it)
+        self.volume_label = tk.Label(volume_frame, text=f"{int(engine.volume)}%", width=5)
+
+        # Volume slider (0-100%)
+        volume_slider = tk.Scale(volume_frame, from_=0, to=100, orient=tk.HORIZONTAL,
+                                 command=lambda value: self.post('set_volume', value), length=150, showvalue=0)
+        volume_slider.set(engine.volume)
+        volume_slider.pack(side=tk.LEFT)
+        self.volume_label.pack(side=tk.LEFT, padx=(5, 0))
+
+    def set_window_icon(self):
+        """Set the icon of the main window and every window opened later"""
+        # Use resource_path to find icon in both dev and EXE
+        icon_path = resource_path('landplayer.ico')
+        if not os.path.exists(icon_path):
+            log.warning(f"Icon file not found: {icon_path}")
+            return
         try:
-            # Use resource_path to find icon in both dev and EXE
-            icon_path = resource_path('landplayer.ico')
-            if os.path.exists(icon_path):
-                window.iconbitmap(icon_path)
-                # Also try to set it using PhotoImage for better compatibility
-                try:
-                    img = Image.open(icon_path)
-                    photo = ImageTk.PhotoImage(img)
-                    window.iconphoto(True, photo)
-                except:
-                    pass
-                print(f"Icon loaded: {icon_path}")
-            else:
-                print(f"Icon file not found: {icon_path}")
+            # default= applies it to later Toplevels as well (Windows only)
+            self.root.iconbitmap(default=icon_path)
+            log.debug(f"Icon loaded: {icon_path}")
+        except tk.TclError:
+            # Elsewhere decode it once with PIL, after the window is up
+            self.root.after_idle(self.set_icon_photo, icon_path)
+
+    def set_icon_photo(self, icon_path):
+        try:
+            from PIL import Image, ImageTk
+            with Image.open(icon_path) as img:
+                self.icon_photo = ImageTk.PhotoImage(img)
+            # True makes it the default for windows opened later
+            self.root.iconphoto(True, self.icon_photo)
+            log.debug(f"Icon loaded: {icon_path}")
         except Exception as e:
-            print(f"Could not load icon: {e}")
-
-    def set_volume(self, value):
-        """Set the volume (0-100%)"""
-        self.volume = float(value)
-        # pygame.mixer.music.set_volume takes 0.0 to 1.0
-        pygame.mixer.music.set_volume(self.volume / 100.0)
-        volume_label.config(text=f"{int(self.volume)}%")
-
-    def seek_backward(self):
-        """Seek 5 seconds backward"""
-        if self.current_file and self.audio_length > 0:
-            current_position = progress_bar['value']
-            new_position = max(0, current_position - 5)
-            self.seek_audio(new_position)
-            print(f"Seeked backward to: {self.format_time(new_position)}")
-
-    def seek_forward(self):
-        """Seek 5 seconds forward"""
-        if self.current_file and self.audio_length > 0:
-            current_position = progress_bar['value']
-            new_position = min(self.audio_length, current_position + 5)
-            self.seek_audio(new_position)
-            print(f"Seeked forward to: {self.format_time(new_position)}")
-
-    def toggle_loop_mode(self):
-        """Toggle through loop modes: none -> media -> queue -> none"""
-        if self.loop_mode == "none":
-            self.loop_mode = "media"
-            self.loop_button.config(text="Loop: Queue")
-            print("Loop mode: Media (looping current media)")
-        elif self.loop_mode == "media":
-            self.loop_mode = "queue"
-            self.loop_button.config(text="Loop: None")
-            print("Loop mode: Queue (looping entire queue)")
-        else:  # queue
-            self.loop_mode = "none"
-            self.loop_button.config(text="Loop: Media")
-            print("Loop mode: None (no looping)")
+            log.warning(f"Could not load icon: {e}")
+
+    # ---- engine events ----
+
+    def poll_engine(self):
+        """Apply what the engine thread published and route its events to on_<event>"""
+        received = self.worker.receive()
+        for event, args, state in received:
+            if event not in ('queue_snapshot', 'queue_changes'):
+                # From the engine publishing it to the window acting on it
+                observe('event_delivery', (time.monotonic() - state['at']) * 1000)
+            shown_entry = self.state['entry_id']
+            self.state = state
+            handler = getattr(self, 'on_' + event, None)
+            if handler is not None:
+                handler(*args)
+            if state['gapless'] != self.gapless_var.get():
+                self.gapless_var.set(state['gapless'])
+            if state['entry_id'] != shown_entry:
+                self.update_queue_window()
+
+        now = time.monotonic()
+        if received:
+            self.last_activity = now
+        busy = now - self.last_activity < BUSY_PERIOD
+        self.root.after(EVENT_POLL_INTERVAL if busy else IDLE_POLL_INTERVAL, self.poll_engine)
+
+    def on_track_started(self, file_path):
+        duration = self.state['duration']
+
+        # Update pause button text
+        self.pause_button.config(text="Pause")
+
+        # Update total time display
+        if duration > 0:
+            self.time_right.config(text=format_time(duration))
+            self.progress_bar['maximum'] = duration
+        else:
+            self.time_right.config(text="--:--")
+
+        self.progress_bar['value'] = 0
+
+        # Display audio icon and get the next tracks' art ready
+        self.display_audio_icon(file_path)
+        self.art_cache.prefetch(self.state['upcoming'][:ART_PREFETCH_COUNT])
+        self.display_waveform(file_path)
+
+        # Start updating progress
+        self.shown_time = None
+        self.restart_progress()
+
+    def on_track_length(self, duration):
+        # The converted copy of the track knows its length
+        self.time_right.config(text=format_time(duration))
+        self.progress_bar['maximum'] = duration
+
+    def on_playback_state(self):
+        self.pause_button.config(text="Resume" if self.state['state'] == "paused" else "Pause")
+        self.restart_progress()
+
+    def on_seek_requested(self, position):
+        # Jump the display right away; the engine applies the seek shortly
+        self.progress_bar['value'] = position
+        self.shown_time = format_time(position)
+        self.time_left.config(text=self.shown_time)
+
+    def on_queue_changed(self):
+        self.update_queue_window()
+
+    def on_queue_snapshot(self, ids, names):
+        # May still arrive just after the queue window was closed
+        if self.queue_window is not None:
+            self.queue_rows.update(ids, names)
+            self.update_queue_window()
+
+    def on_queue_changes(self, changes, names, size):
+        if self.queue_window is not None:
+            self.queue_rows.apply(changes, names)
+            if len(self.queue_rows) != size:
+                # The copy went astray; have the whole order sent again
+                self.post('watch_queue', True)
+            self.update_queue_window()
+
+    def on_loop_mode(self, mode):
+        self.loop_button.config(text=LOOP_BUTTON_TEXT[mode])
+
+    def on_shuffle_mode(self, mode):
+        self.shuffle_var.set(mode)
+
+    def on_volume(self, volume):
+        self.volume_label.config(text=f"{int(volume)}%")
+
+    def on_scan_progress(self, dirs_scanned, dirs_found, files_found):
+        # Report progress in the title bar
+        self.root.title(f"{WINDOW_TITLE} (Scanning {dirs_scanned}/{dirs_found} folders, {files_found} files)")
+
+    def on_scan_stopped(self):
+        self.root.title(WINDOW_TITLE)
+
+    def on_scan_finished(self, added):
+        self.root.title(WINDOW_TITLE)
+        if not added:
+            messagebox.showinfo("No Audio Files", "No audio files found in folder.")
+
+    def on_loudness_progress(self, done, total):
+        self.root.title(f"{WINDOW_TITLE} (Analyzing loudness {done}/{total})")
+
+    def on_loudness_finished(self, measured):
+        self.root.title(WINDOW_TITLE)
+
+    def on_missing_files(self, paths):
+        shown = "\n".join(os.path.basename(path) for path in paths[:10])
+        if len(paths) > 10:
+            shown += f"\n... and {len(paths) - 10} more"
+        messagebox.showwarning("Missing Files",
+            f"{len(paths)} files in the queue were not found and were removed:\n\n{shown}")
+
+    # ---- menu commands ----
 
     def toggle_fullscreen(self):
         """Toggle between fullscreen and windowed mode"""
@@ -135,40 +386,18 @@ class MediaPlayer:
             self.root.attributes('-fullscreen', False)
             self.is_fullscreen = False
             self.screen_button.config(text="Screen: Full")
-            print("Switched to windowed mode")
+            log.debug("Switched to windowed mode")
         else:
             # Enter fullscreen
             self.root.attributes('-fullscreen', True)
             self.is_fullscreen = True
             self.screen_button.config(text="Screen: Window")
-            print("Switched to fullscreen mode")
-
-    def shuffle_queue(self):
-        """Shuffle the queue randomly"""
-        if len(self.queue) <= 1:
-            print("Queue has only one or no items, nothing to shuffle")
-            return
-
-        # Save the currently playing file
-        current_file = self.current_file if self.current_queue_index >= 0 else None
-
-        # Shuffle the queue
-        random.shuffle(self.queue)
-
-        # Find the new index of the currently playing file
-        if current_file:
-            try:
-                self.current_queue_index = self.queue.index(current_file)
-            except ValueError:
-                self.current_queue_index = 0
-
-        print(f"Queue shuffled! ({len(self.queue)} items)")
-        self.update_queue_window()
+            log.debug("Switched to fullscreen mode")
 
-    def save_queue(self):
-        """Save the current queue to a file"""
-        if not self.queue:
-            print("Queue is empty, nothing to save")
+    def save_queue(self, compact=False):
+        """Save the current queue to a file (compact=True for the binary format)"""
+        if not self.state['queue_length']:
+            log.info("Queue is empty, nothing to save")
             return
 
         file_path = filedialog.asksaveasfilename(
@@ -178,152 +407,22 @@ class MediaPlayer:
         )
 
         if file_path:
-            try:
-                queue_data = {
-                    "queue": self.queue,
-                    "current_index": self.current_queue_index
-                }
-                with open(file_path, 'w') as f:
-                    json.dump(queue_data, f, indent=2)
-                print(f"Queue saved to: {file_path}")
-                print(f"Saved {len(self.queue)} items")
-            except Exception as e:
-                print(f"Error saving queue: {e}")
+            self.post('save_queue', file_path, compact)
 
     def load_queue(self):
-        """Load a queue from a file"""
+        """Load a queue from a file, resuming at its saved position"""
         file_path = filedialog.askopenfilename(
             title="Load Queue",
             filetypes=[("lukyland", "*.lukyland"), ("All Files", "*.*")]
         )
 
         if file_path:
-            try:
-                with open(file_path, 'r') as f:
-                    queue_data = json.load(f)
-
-                # Load the queue
-                loaded_queue = queue_data.get("queue", [])
-
-                # Filter out files that don't exist and video files
-                valid_files = []
-                invalid_count = 0
-                video_count = 0
-                for file in loaded_queue:
-                    if os.path.exists(file):
-                        if not self.is_video_file(file):
-                            valid_files.append(file)
-                        else:
-                            video_count += 1
-                    else:
-                        invalid_count += 1
-
-                if not valid_files:
-                    print("No valid audio files found in queue")
-                    return
-
-                # Stop current playback if any
-                if self.is_playing or self.is_paused:
-                    pygame.mixer.music.stop()
-                    self.is_playing = False
-                    self.is_paused = False
-
-                # Set the new queue
-                self.queue = valid_files
-                self.current_queue_index = 0
-
-                print(f"Queue loaded from: {file_path}")
-                print(f"Loaded {len(valid_files)} audio files")
-                if invalid_count > 0:
-                    print(f"Warning: {invalid_count} files not found and were skipped")
-                if video_count > 0:
-                    print(f"Warning: {video_count} video files skipped (audio only)")
-
-                # Start playing the first track
-                if self.queue:
-                    self.play_media(self.queue[0])
-
-                self.update_queue_window()
-
-            except Exception as e:
-                print(f"Error loading queue: {e}")
-
-    def on_drag_start(self, event):
-        """Handle start of drag operation"""
-        # Get the index of the item being dragged
-        self.drag_start_index = self.queue_listbox.nearest(event.y)
-
-    def on_drag_motion(self, event):
-        """Handle drag motion to highlight drop position"""
-        # Get current position
-        current_index = self.queue_listbox.nearest(event.y)
-
-        # Clear previous selection
-        self.queue_listbox.selection_clear(0, tk.END)
-
-        # Highlight current position
-        if 0 <= current_index < len(self.queue):
-            self.queue_listbox.selection_set(current_index)
-
-    def on_drag_release(self, event):
-        """Handle end of drag operation and reorder queue"""
-        if self.drag_start_index is None:
-            return
-
-        # Get the drop index
-        drop_index = self.queue_listbox.nearest(event.y)
+            self.post('load_queue', file_path)
 
-        # Make sure indices are valid
-        if (0 <= self.drag_start_index < len(self.queue) and 
-            0 <= drop_index < len(self.queue) and 
-            self.drag_start_index != drop_index):
-
-            # Get the item being moved
-            item = self.queue[self.drag_start_index]
-
-            # Remove from old position
-            self.queue.pop(self.drag_start_index)
-
-            # Insert at new position
-            self.queue.insert(drop_index, item)
-
-            # Update current_queue_index if needed
-            if self.drag_start_index == self.current_queue_index:
-                # Currently playing item was moved
-                self.current_queue_index = drop_index
-            elif self.drag_start_index < self.current_queue_index <= drop_index:
-                # Item moved from before to after current
-                self.current_queue_index -= 1
-            elif drop_index <= self.current_queue_index < self.drag_start_index:
-                # Item moved from after to before current
-                self.current_queue_index += 1
-
-            print(f"Moved '{os.path.basename(item)}' from position {self.drag_start_index} to {drop_index}")
-
-            # Update display
-            self.update_queue_window()
-
-        # Reset drag start index
-        self.drag_start_index = None
-
-    def on_queue_double_click(self, event):
-        """Handle double-click on queue item to skip to that track"""
-        # Get the index of the clicked item
-        click_index = self.queue_listbox.nearest(event.y)
-
-        if 0 <= click_index < len(self.queue):
-            # Skip to the selected track
-            self.current_queue_index = click_index
-            selected_file = self.queue[click_index]
-            print(f"Skipping to: {os.path.basename(selected_file)}")
-            self.play_media(selected_file)
-            self.update_queue_window()
-
-    def is_video_file(self, file_path):
-        """Check if file is a video format"""
-        video_formats = ['.mp4', '.avi', '.mkv', '.mov', '.wmv']
-        file_ext = os.path.splitext(file_path)[1].lower()
-        return file_ext in video_formats
+    def warn_video(self):
+        messagebox.showwarning("Video Not Supported",
+            "This is an audio-only player.\nVideo files are not supported.")
+        log.warning("Video files not supported (audio only)")
 
     def open_file(self):
         file_path = filedialog.askopenfilename(
@@ -335,47 +434,18 @@ class MediaPlayer:
         )
         if file_path:
             # Check if it's a video file
-            if self.is_video_file(file_path):
-                messagebox.showwarning("Video Not Supported", 
-                    "This is an audio-only player.\nVideo files are not supported.")
-                print("Video files not supported (audio only)")
+            if is_video_file(file_path):
+                self.warn_video()
                 return
-
-            self.current_file = file_path
-            self.queue = [file_path]
-            self.current_queue_index = 0
-            self.play_media(file_path)
-            self.update_queue_window()
+            self.post('open_file', file_path)
 
     def open_folder(self):
         folder_path = filedialog.askdirectory(title="Open Folder")
         if folder_path:
-            # Get all audio files from the folder (no video)
-            audio_extensions = ['.mp3', '.wav', '.flac', '.aac', '.ogg']
-            self.queue = []
-
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path):
-                    _, ext = os.path.splitext(file_path)
-                    if ext.lower() in audio_extensions:
-                        self.queue.append(file_path)
-
-            # Sort queue alphabetically
-            self.queue.sort()
-
-            if self.queue:
-                self.current_queue_index = 0
-                print(f"Loaded {len(self.queue)} audio files from folder")
-                print(f"Queue: {[os.path.basename(f) for f in self.queue]}")
-                self.play_media(self.queue[0])
-                self.update_queue_window()
-            else:
-                messagebox.showinfo("No Audio Files", "No audio files found in folder.")
-                print("No audio files found in folder")
+            self.post('open_folder', folder_path)
 
-    def add_file_to_queue(self):
-        """Add a single file to the end of the queue"""
+    def add_file_to_queue(self, play_next=False):
+        """Add a single file to the end of the queue (or right after the current entry)"""
         file_path = filedialog.askopenfilename(
             title="Add Audio File to Queue",
             filetypes=[
@@ -385,57 +455,147 @@ class MediaPlayer:
         )
         if file_path:
             # Check if it's a video file
-            if self.is_video_file(file_path):
-                messagebox.showwarning("Video Not Supported", 
-                    "This is an audio-only player.\nVideo files are not supported.")
-                print("Video files not supported (audio only)")
+            if is_video_file(file_path):
+                self.warn_video()
                 return
-
-            self.queue.append(file_path)
-            print(f"Added to queue: {os.path.basename(file_path)}")
-
-            # If nothing is playing, start playing the added file
-            if not self.is_playing and not self.is_paused:
-                self.current_queue_index = len(self.queue) - 1
-                self.play_media(file_path)
-
-            self.update_queue_window()
+            self.post('insert_next' if play_next else 'add_files', [file_path])
 
     def add_folder_to_queue(self):
-        """Add all audio files from a folder to the end of the queue"""
+        """Add all audio files from a folder (and its subfolders) to the end of the queue"""
         folder_path = filedialog.askdirectory(title="Add Folder to Queue")
         if folder_path:
-            audio_extensions = ['.mp3', '.wav', '.flac', '.aac', '.ogg']
-            added_files = []
+            self.post('add_folder', folder_path)
+
+    # ---- queue window ----
 
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path):
-                    _, ext = os.path.splitext(file_path)
-                    if ext.lower() in audio_extensions:
-                        added_files.append(file_path)
+    def on_drag_start(self, event):
+        """Select on click (Shift extends, Ctrl toggles) and remember the row for a drag"""
+        view = self.queue_view
+        rows = self.queue_rows
+        index = view.nearest(event.y)
+        self.drag_start_id = None
+        if not 0 <= index < len(rows):
+            return
+        anchor = view.anchor_index()
+        if event.state & SHIFT_MASK and anchor is not None:
+            view.selection_clear()
+            view.selection_set(anchor, index)
+            return
+        if event.state & CONTROL_MASK:
+            if view.selection_includes(index):
+                view.selection_clear(index)
+            else:
+                view.selection_set(index)
+            view.anchor = rows.entry_id(index)
+            return
 
-            # Sort files alphabetically
-            added_files.sort()
+        # A press inside the selection may start dragging all of it
+        if not view.selection_includes(index):
+            view.selection_clear()
+            view.selection_set(index)
+        view.anchor = rows.entry_id(index)
+        self.drag_start_id = view.anchor
 
-            if added_files:
-                # If nothing is playing, mark the first file to play
-                start_playing = not self.is_playing and not self.is_paused and len(self.queue) == 0
+    def on_drag_motion(self, event):
+        """Mark where the dragged rows would go"""
+        if self.drag_start_id is None:
+            return
+        index = self.queue_view.nearest(event.y)
+        if 0 <= index < len(self.queue_rows) and self.queue_rows.entry_id(index) != self.drag_start_id:
+            self.queue_view.show_drop(index)
+        else:
+            self.queue_view.show_drop(None)
 
-                # Add to queue
-                self.queue.extend(added_files)
+    def on_drag_release(self, event):
+        """Move the selected rows to the drop position in one batch"""
+        if self.drag_start_id is None:
+            return
+        view = self.queue_view
+        # The queue may have changed during the drag; find the pressed row again
+        source, destination = self.queue_rows.index_of(self.drag_start_id), view.nearest(event.y)
+        self.drag_start_id = None
+        view.show_drop(None)
+        if source is None:
+            return
+        if not 0 <= destination < len(self.queue_rows) or destination == source:
+            # A click without a drag picks just that row
+            view.selection_clear()
+            view.selection_set(source)
+            return
 
-                print(f"Added {len(added_files)} audio files to queue from folder")
+        # The pressed row lands on the drop row, the rest of the selection around it
+        positions = view.curselection()
+        self.move_selection(positions, destination - sum(1 for position in positions if position < source))
+
+    def move_selection(self, positions, first, play_next=False):
+        """Move rows together so they start at `first` among the others"""
+        rows = self.queue_rows
+        first = max(0, min(first, len(rows) - len(positions)))
+        # Positions may be stale by the time the engine runs this; entries aren't
+        entry_ids = [rows.entry_id(index) for index in positions]
+        # The row that ends up after them: the first-th of the rows not moving
+        before = first
+        for position in positions:
+            if position > before:
+                break
+            before += 1
+        before_id = rows.entry_id(before) if before < len(rows) else None
+        rows.move(entry_ids, before_id)  # Shown before the engine confirms
+        self.queue_view.see(first)
+        if play_next:
+            # The engine puts them after whatever is current when it gets there
+            self.post('play_ids_next', entry_ids)
+        else:
+            self.post('move_ids', entry_ids, before_id)
 
-                # If nothing was playing, start playing the first added file
-                if start_playing:
-                    self.current_queue_index = 0
-                    self.play_media(self.queue[0])
+    def remove_selection(self, event=None):
+        """Remove the selected rows from the queue"""
+        entry_ids = self.queue_view.selected_ids()
+        if not entry_ids:
+            return
+        self.queue_rows.remove(entry_ids)
+        self.queue_view.selection_clear()
+        self.queue_view.anchor = None
+        self.post('remove_ids', entry_ids)
+
+    def select_all(self, event=None):
+        if self.queue_rows:
+            self.queue_view.selection_set(0, len(self.queue_rows) - 1)
+        return 'break'
+
+    def play_selection(self):
+        entry_ids = self.queue_view.selected_ids()
+        if entry_ids:
+            self.post('play_id', entry_ids[0])
+
+    def play_selection_next(self):
+        """Move the selected rows to just after the current entry"""
+        positions = self.queue_view.curselection()
+        current = self.queue_rows.index_of(self.state['entry_id'])
+        if positions and current is not None and current not in positions:
+            first = current + 1 - sum(1 for position in positions if position < current)
+            self.move_selection(positions, first, play_next=True)
+
+    def move_selection_to(self, where):
+        positions = self.queue_view.curselection()
+        if positions:
+            self.move_selection(positions, 0 if where == 'top' else len(self.queue_rows))
+
+    def on_queue_menu(self, event):
+        """Right-click: act on the selection (the clicked row if it isn't selected)"""
+        view = self.queue_view
+        index = view.nearest(event.y)
+        if 0 <= index < len(self.queue_rows) and not view.selection_includes(index):
+            view.selection_clear()
+            view.selection_set(index)
+            view.anchor = self.queue_rows.entry_id(index)
+        self.queue_menu.tk_popup(event.x_root, event.y_root)
 
-                self.update_queue_window()
-            else:
-                messagebox.showinfo("No Audio Files", "No audio files found in folder.")
-                print("No audio files found in folder")
+    def on_queue_double_click(self, event):
+        """Handle double-click on queue item to skip to that track"""
+        index = self.queue_view.nearest(event.y)
+        if 0 <= index < len(self.queue_rows):
+            self.post('play_id', self.queue_rows.entry_id(index))
 
     def show_queue_window(self):
         """Open or focus the queue window"""
@@ -448,434 +608,226 @@ class MediaPlayer:
             self.queue_window = tk.Toplevel(self.root)
             self.queue_window.title("Queue")
             self.queue_window.geometry("500x400")
+            self.queue_window.protocol('WM_DELETE_WINDOW', self.close_queue_window)
 
-            # Set icon for queue window
-            self.set_window_icon(self.queue_window)
-
-            # Create frame for queue list
-            queue_frame = tk.Frame(self.queue_window)
-            queue_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-            # Add scrollbar
-            scrollbar = tk.Scrollbar(queue_frame)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-            # Create listbox for queue items
-            self.queue_listbox = tk.Listbox(queue_frame, yscrollcommand=scrollbar.set, font=("Arial", 10))
-            self.queue_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-            scrollbar.config(command=self.queue_listbox.yview)
+            # Create the queue list; only the visible rows are ever drawn
+            self.queue_view = QueueView(self.queue_window,
+                                        items=lambda: self.queue_rows,
+                                        label=str,
+                                        current=lambda: self.state['entry_id'])
+            self.queue_view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
             # Bind drag and drop events
-            self.queue_listbox.bind('<Button-1>', self.on_drag_start)
-            self.queue_listbox.bind('<B1-Motion>', self.on_drag_motion)
-            self.queue_listbox.bind('<ButtonRelease-1>', self.on_drag_release)
+            self.queue_view.canvas.bind('<Button-1>', self.on_drag_start)
+            self.queue_view.canvas.bind('<B1-Motion>', self.on_drag_motion)
+            self.queue_view.canvas.bind('<ButtonRelease-1>', self.on_drag_release)
 
             # Bind double-click event
-            self.queue_listbox.bind('<Double-Button-1>', self.on_queue_double_click)
-
-            # Populate the queue
-            self.update_queue_window()
+            self.queue_view.canvas.bind('<Double-Button-1>', self.on_queue_double_click)
+
+            # Edits of the selection
+            self.queue_menu = tk.Menu(self.queue_window, tearoff=0)
+            self.queue_menu.add_command(label="Play", command=self.play_selection)
+            self.queue_menu.add_command(label="Play Next", command=self.play_selection_next)
+            self.queue_menu.add_command(label="Move to Top", command=lambda: self.move_selection_to('top'))
+            self.queue_menu.add_command(label="Move to Bottom", command=lambda: self.move_selection_to('bottom'))
+            self.queue_menu.add_command(label="Remove", command=self.remove_selection)
+            self.queue_menu.add_separator()
+            self.queue_menu.add_command(label="Remove Duplicates", command=self.command('dedupe_queue'))
+            self.queue_menu.add_command(label="Remove Missing Files", command=self.command('remove_missing'))
+            self.queue_view.canvas.bind('<Button-3>', self.on_queue_menu)
+            self.queue_window.bind('<Delete>', self.remove_selection)
+            self.queue_window.bind('<BackSpace>', self.remove_selection)
+            self.queue_window.bind('<Control-a>', self.select_all)
+
+            # The engine sends the queue's order and names while the window is open
+            self.post('watch_queue', True)
+
+    def close_queue_window(self):
+        self.post('watch_queue', False)
+        self.queue_window.destroy()
+        self.queue_window = None
+        self.queue_rows = QueueRows()
 
     def update_queue_window(self):
-        """Update the queue window with current queue"""
+        """Update the queue window with current queue (redraws only the visible rows)"""
         if self.queue_window is not None and tk.Toplevel.winfo_exists(self.queue_window):
-            # Clear current list
-            self.queue_listbox.delete(0, tk.END)
-
-            # Add all items in queue
-            for i, file_path in enumerate(self.queue):
-                filename = os.path.basename(file_path)
-                # Mark currently playing track
-                if i == self.current_queue_index:
-                    display_text = f"► {filename}"
-                    self.queue_listbox.insert(tk.END, display_text)
-                    # Highlight currently playing
-                    self.queue_listbox.itemconfig(i, bg='lightblue')
-                else:
-                    self.queue_listbox.insert(tk.END, filename)
-
-    def play_next_in_queue(self):
-        """Play the next file in the queue"""
-        if self.current_queue_index < len(self.queue) - 1:
-            self.current_queue_index += 1
-            next_file = self.queue[self.current_queue_index]
-            print(f"Playing next in queue: {os.path.basename(next_file)}")
-            self.play_media(next_file)
-            self.update_queue_window()
-        else:
-            # Reached end of queue
-            if self.loop_mode == "queue":
-                # Loop back to start of queue
-                print("Looping queue from beginning")
-                self.current_queue_index = 0
-                self.play_media(self.queue[0])
-                self.update_queue_window()
-            else:
-                print("End of queue")
-                self.is_playing = False
-                self.is_paused = False
-                if self.pause_button:
-                    self.pause_button.config(text="Pause")
-
-    def play_previous_in_queue(self):
-        """Play the previous file in the queue or restart current"""
-        # Get current playback time
-        current_time = progress_bar['value']
-
-        # If less than 3 seconds, go to previous track
-        if current_time < 3 and self.current_queue_index > 0:
-            self.current_queue_index -= 1
-            prev_file = self.queue[self.current_queue_index]
-            print(f"Playing previous in queue: {os.path.basename(prev_file)}")
-            self.play_media(prev_file)
-            self.update_queue_window()
-        else:
-            # Restart current track
-            print("Restarting current track")
-            if self.current_file:
-                self.play_media(self.current_file)
-
-    def next_track(self):
-        """Skip to next track in queue"""
-        if self.current_queue_index < len(self.queue) - 1:
-            self.play_next_in_queue()
-        else:
-            # At last track
-            if self.loop_mode == "queue":
-                # Loop back to start
-                print("Looping queue from beginning")
-                self.current_queue_index = 0
-                self.play_media(self.queue[0])
-                self.update_queue_window()
-            else:
-                print("Already at last track")
-
-    def previous_track(self):
-        """Go to previous track or restart current"""
-        self.play_previous_in_queue()
-
-    def play_media(self, file_path):
-        """Play audio file"""
-        try:
-            # Get audio length
-            file_ext = os.path.splitext(file_path)[1].lower()
-
-            if file_ext == '.mp3':
-                audio = MP3(file_path)
-                self.audio_length = audio.info.length
-            else:
-                # For other audio formats
-                try:
-                    sound = pygame.mixer.Sound(file_path)
-                    self.audio_length = sound.get_length()
-                except:
-                    # If Sound fails, load and estimate
-                    pygame.mixer.music.load(file_path)
-                    self.audio_length = 0
-
-            # Load and play audio
-            pygame.mixer.music.load(file_path)
-            pygame.mixer.music.play()
-
-            # Set volume to current level
-            pygame.mixer.music.set_volume(self.volume / 100.0)
-
-            self.is_playing = True
-            self.is_paused = False
-            self.current_file = file_path
-
-            # Update pause button text
-            if self.pause_button:
-                self.pause_button.config(text="Pause")
-
-            # Update total time display
-            if self.audio_length > 0:
-                total_time = self.format_time(self.audio_length)
-                time_right.config(text=total_time)
-                progress_bar['maximum'] = self.audio_length
-            else:
-                time_right.config(text="--:--")
-
-            progress_bar['value'] = 0
-
-            # Display audio icon
-            self.display_audio_icon(file_path)
-
-            # Start updating progress
-            self.start_time = time.time()
-            self.seek_position = 0
-            self.update_progress()
+            self.queue_view.refresh()
 
-            print(f"Now playing: {os.path.basename(file_path)}")
+    # ---- artwork ----
 
-        except Exception as e:
-            print(f"Error playing file: {e}")
-            # Try to play next in queue if there's an error
-            if self.current_queue_index < len(self.queue) - 1:
-                self.play_next_in_queue()
-
-    def toggle_pause(self):
-        """Toggle pause/resume for audio playback"""
-        if not self.current_file:
+    def display_audio_icon(self, file_path):
+        """Show the track's album art, decoding it in the background if needed"""
+        found, image = self.art_cache.lookup(file_path)
+        if found:
+            self.show_artwork(file_path, image)
             return
 
-        if self.is_paused:
-            # Resume
-            pygame.mixer.music.unpause()
-            self.is_paused = False
-            self.is_playing = True
-
-            # Adjust start_time to account for paused duration
-            self.start_time = time.time() - (progress_bar['value'] - self.seek_position)
-
-            # Update button
-            self.pause_button.config(text="Pause")
+        # Show the placeholder now and swap the art in once it's decoded
+        self.show_artwork(file_path, None)
+        self.art_request = (file_path, self.art_cache.request(file_path))
+        if self.art_job is None:
+            self.art_job = self.root.after(ART_POLL_INTERVAL, self.poll_artwork)
 
-            # Restart progress updates
-            self.update_progress()
-
-            print("Resumed")
-        else:
-            # Pause
-            if self.is_playing:
-                pygame.mixer.music.pause()
-                self.is_paused = True
-                self.is_playing = False
-
-                # Update button
-                self.pause_button.config(text="Resume")
+    def poll_artwork(self):
+        """Display a background-decoded thumbnail once it is ready"""
+        self.art_job = None
+        if self.art_request is None:
+            return
+        file_path, future = self.art_request
+        if not future.done():
+            self.art_job = self.root.after(ART_POLL_INTERVAL, self.poll_artwork)
+            return
 
-                print("Paused")
+        self.art_request = None
+        # Only show it if the track is still the one playing
+        if file_path == self.state['file']:
+            try:
+                self.show_artwork(file_path, future.result())
+            except Exception as e:
+                log.warning(f"Could not load artwork: {e}")
 
-    def display_audio_icon(self, file_path):
-        try:
-            # Try to extract album art
-            from mutagen.id3 import ID3
-            audio = ID3(file_path)
-
-            # Look for album art
-            for key in audio.keys():
-                if key.startswith('APIC'):
-                    artwork = audio[key].data
-                    img = Image.open(io.BytesIO(artwork))
-
-                    # Resize to fit nicely
-                    img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
-
-                    video_label.config(image=photo, text='')
-                    video_label.image = photo
-                    return
-        except:
-            pass
+    def show_artwork(self, file_path, image):
+        """Put a thumbnail (or the placeholder when image is None) on screen"""
+        video_label = self.video_label
+        if image is not None:
+            try:
+                photo = self.art_cache.photo(file_path, image)
+                video_label.config(image=photo, text='')
+                video_label.image = photo
+                return
+            except Exception as e:
+                log.warning(f"Could not display artwork: {e}")
 
         # If no album art, show a default music icon
         try:
-            # Create a simple music note icon
-            icon_img = Image.new('RGB', (300, 300), color='black')
-            photo = ImageTk.PhotoImage(icon_img)
-            video_label.config(image=photo, text="♪ Now Playing ♪", 
-                             compound='center', fg='white', 
+            # Create a simple music note icon once and reuse it (no PIL needed)
+            if self.placeholder_photo is None:
+                width, height = THUMBNAIL_SIZE
+                self.placeholder_photo = tk.PhotoImage(width=width, height=height)
+                self.placeholder_photo.put('black', to=(0, 0, width, height))
+            video_label.config(image=self.placeholder_photo, text="♪ Now Playing ♪",
+                             compound='center', fg='white',
                              font=('Arial', 24))
-            video_label.image = photo
+            video_label.image = self.placeholder_photo
         except Exception as e:
             # Fallback to just text
-            video_label.config(image='', text="♪ Now Playing ♪", 
+            video_label.config(image='', text="♪ Now Playing ♪",
                              fg='white', font=('Arial', 24))
 
-    def update_progress(self):
-        if self.is_playing and pygame.mixer.music.get_busy() and not self.is_paused:
-            # Calculate elapsed time from start plus any seek offset
-            elapsed = (time.time() - self.start_time) + self.seek_position
+    # ---- waveform ----
 
-            # Update progress bar
-            if self.audio_length > 0:
-                progress_bar['value'] = min(elapsed, self.audio_length)
-            else:
-                progress_bar['value'] = elapsed
-
-            # Update time label
-            current_time = self.format_time(elapsed)
-            time_left.config(text=current_time)
-
-            # Schedule next update
-            self.update_job = self.root.after(100, self.update_progress)
-        elif self.is_playing and not pygame.mixer.music.get_busy() and not self.is_paused:
-            # Music has finished
-            if self.loop_mode == "media":
-                # Loop current media
-                print("Looping current media")
-                self.play_media(self.current_file)
-            else:
-                # Play next in queue or loop queue (or stop if loop_mode is "none")
-                print("Track finished")
-                self.play_next_in_queue()
+    def display_waveform(self, file_path):
+        """Draw the track's waveform overview, computing it in the background if needed"""
+        found, peaks = self.waveforms.lookup(file_path)
+        self.progress_bar.set_peaks(peaks)
+        if found:
+            # The next track's overview is ready when it starts
+            self.waveforms.prefetch(self.state['upcoming'][:1])
+            return
 
-    def seek_audio(self, position):
-        """Seek to a specific position in the audio"""
-        if self.current_file and self.audio_length > 0:
-            try:
-                # Stop current playback
-                pygame.mixer.music.stop()
+        self.waveform_request = (file_path, self.waveforms.request(file_path))
+        if self.waveform_job is None:
+            self.waveform_job = self.root.after(WAVEFORM_POLL_INTERVAL, self.poll_waveform)
+
+    def poll_waveform(self):
+        """Draw a background-computed overview once it is ready"""
+        self.waveform_job = None
+        if self.waveform_request is None:
+            return
+        file_path, future = self.waveform_request
+        if not future.done():
+            self.waveform_job = self.root.after(WAVEFORM_POLL_INTERVAL, self.poll_waveform)
+            return
 
-                # Reload and play from new position
-                pygame.mixer.music.load(self.current_file)
-                pygame.mixer.music.play(start=position)
+        self.waveform_request = None
+        if file_path == self.state['file']:
+            try:
+                self.progress_bar.set_peaks(future.result())
+            except Exception as e:
+                log.warning(f"Could not load waveform: {e}")
+            self.waveforms.prefetch(self.state['upcoming'][:1])
 
-                # Restore volume
-                pygame.mixer.music.set_volume(self.volume / 100.0)
+    # ---- progress display ----
 
-                # Update timing variables
-                self.start_time = time.time()
-                self.seek_position = position
-                self.is_playing = True
-                self.is_paused = False
+    def restart_progress(self):
+        """(Re)start the progress display tick"""
+        if self.update_job is not None:
+            self.root.after_cancel(self.update_job)
+            self.update_job = None
+        self.update_progress()
 
-                # Update button
-                if self.pause_button:
-                    self.pause_button.config(text="Pause")
+    def update_progress(self):
+        """Refresh the time label and progress bar, only as often as they change"""
+        self.update_job = None
+        duration = self.state['duration']
+        if self.state['state'] != "playing":
+            return
+        # Nothing to draw while minimized; <Map> restarts the tick
+        if self.root.state() == 'iconic':
+            return
 
-                # Restart progress updates if needed
-                if self.update_job is None:
-                    self.update_progress()
+        elapsed = self.worker.position()
 
-                print(f"Seeked to: {self.format_time(position)}")
-            except Exception as e:
-                print(f"Error seeking: {e}")
+        # Update progress bar
+        if duration > 0:
+            self.progress_bar['value'] = min(elapsed, duration)
+        else:
+            self.progress_bar['value'] = elapsed
+
+        # Update time label
+        current_time = format_time(elapsed)
+        if current_time != self.shown_time:
+            self.time_left.config(text=current_time)
+            self.shown_time = current_time
+
+        # Wake up when the label ticks over or the bar moves by a pixel
+        delay = 1.0 - (elapsed % 1.0)
+        if duration > 0:
+            delay = min(delay, duration / max(self.progress_bar.winfo_width(), 1))
+        delay = max(MIN_UI_INTERVAL, min(delay, 1.0))
+        self.update_job = self.root.after(int(delay * 1000), self.update_progress)
+
+    def on_window_mapped(self, event):
+        """Resume the progress tick when the window is restored"""
+        if event.widget is self.root and self.update_job is None:
+            self.update_progress()
 
     def on_progress_click(self, event):
         """Handle clicks on the progress bar to seek"""
-        if self.audio_length > 0:
+        audio_length = self.state['duration']
+        if audio_length > 0:
             # Calculate position based on click
             click_position = event.x
-            bar_width = progress_bar.winfo_width()
+            bar_width = self.progress_bar.winfo_width()
 
             # Calculate time position
-            new_position = (click_position / bar_width) * self.audio_length
-            new_position = max(0, min(new_position, self.audio_length))
-
-            # Update progress bar immediately
-            progress_bar['value'] = new_position
-            time_left.config(text=self.format_time(new_position))
-
-            # Seek to new position
-            self.seek_audio(new_position)
-
-    def format_time(self, seconds):
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
-        return f"{minutes:02d}:{secs:02d}"
-
-# Set Windows AppUserModelID before creating window
-set_windows_appid()
-
-# Create the main window
-root = tk.Tk()
-root.title("LandPlayer - Audio Player")
-root.geometry("800x600")
-
-# Create player instance
-player = MediaPlayer(root)
-
-# Create menu bar
-menubar = tk.Menu(root)
-root.config(menu=menubar)
-
-# Create File menu
-file_menu = tk.Menu(menubar, tearoff=0)
-menubar.add_cascade(label="File", menu=file_menu)
-
-# Add menu items to File menu
-file_menu.add_command(label="Open File", command=player.open_file)
-file_menu.add_command(label="Open Folder", command=player.open_folder)
-file_menu.add_separator()
-file_menu.add_command(label="Add File", command=player.add_file_to_queue)
-file_menu.add_command(label="Add Folder", command=player.add_folder_to_queue)
-
-# Create Queue menu
-queue_menu = tk.Menu(menubar, tearoff=0)
-menubar.add_cascade(label="Queue", menu=queue_menu)
-queue_menu.add_command(label="Show Queue", command=player.show_queue_window)
-queue_menu.add_command(label="Shuffle", command=player.shuffle_queue)
-queue_menu.add_separator()
-queue_menu.add_command(label="Save Queue", command=player.save_queue)
-queue_menu.add_command(label="Load Queue", command=player.load_queue)
-
-# Create black content area
-content_area = tk.Frame(root, bg="black")
-content_area.pack(fill=tk.BOTH, expand=True)
-
-# Create label for video display
-video_label = tk.Label(content_area, bg="black")
-video_label.pack(fill=tk.BOTH, expand=True)
-
-# Create bottom control panel
-bottom_frame = tk.Frame(root)
-bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
-
-# Progress bar with time labels on same line
-progress_frame = tk.Frame(bottom_frame)
-progress_frame.pack(fill=tk.X, pady=(0, 5))
-
-time_left = tk.Label(progress_frame, text="00:00")
-time_left.pack(side=tk.LEFT, padx=(0, 5))
-
-# Progress bar
-progress_bar = ttk.Progressbar(progress_frame, orient=tk.HORIZONTAL, mode='determinate')
-progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
-
-# Bind click event to progress bar for seeking
-progress_bar.bind('<Button-1>', player.on_progress_click)
-
-time_right = tk.Label(progress_frame, text="/")
-time_right.pack(side=tk.LEFT, padx=(5, 0))
-
-# Create frame for buttons and volume
-controls_frame = tk.Frame(bottom_frame)
-controls_frame.pack(fill=tk.X)
-
-# Button controls frame (left side)
-button_frame = tk.Frame(controls_frame)
-button_frame.pack(side=tk.LEFT, expand=True)
-
-# Create control buttons
-for i in range(1, 6):
-    if i == 1:
-        # Button 1 is the Loop button
-        btn = tk.Button(button_frame, text="Loop: Media", width=10, command=player.toggle_loop_mode)
-        player.loop_button = btn
-    elif i == 2:
-        # Button 2 is the Back button
-        btn = tk.Button(button_frame, text="Back", width=6, command=player.previous_track)
-    elif i == 3:
-        # Button 3 is the pause/resume button
-        btn = tk.Button(button_frame, text="Pause", width=8, command=player.toggle_pause)
-        player.pause_button = btn
-    elif i == 4:
-        # Button 4 is the Next button
-        btn = tk.Button(button_frame, text="Next", width=6, command=player.next_track)
-    elif i == 5:
-        # Button 5 is the Screen toggle button
-        btn = tk.Button(button_frame, text="Screen: Full", width=11, command=player.toggle_fullscreen)
-        player.screen_button = btn
-    btn.pack(side=tk.LEFT, padx=5)
-
-# Volume control frame (right side)
-volume_frame = tk.Frame(controls_frame)
-volume_frame.pack(side=tk.RIGHT, padx=(20, 0))
-
-tk.Label(volume_frame, text="Volume:").pack(side=tk.LEFT, padx=(0, 5))
-
-# Volume slider (0-100%)
-volume_slider = tk.Scale(volume_frame, from_=0, to=100, orient=tk.HORIZONTAL, 
-                         command=player.set_volume, length=150, showvalue=0)
-volume_slider.set(100)  # Default to 100%
-volume_slider.pack(side=tk.LEFT)
-
-# Volume percentage label
-volume_label = tk.Label(volume_frame, text="100%", width=5)
-volume_label.pack(side=tk.LEFT, padx=(5, 0))
-
-# Run the application
-root.mainloop()
+            new_position = (click_position / bar_width) * audio_length
+            new_position = max(0, min(new_position, audio_length))
+
+            # Seek to new position (the bar updates immediately)
+            self.post('seek', new_position)
+
+def main():
+    # Set Windows AppUserModelID before creating window
+    set_windows_appid()
+
+    # Create the main window
+    root = tk.Tk()
+    root.title(WINDOW_TITLE)
+    root.geometry("800x600")
+
+    # Create player instance (its Tk callbacks keep it alive)
+    MediaPlayer(root)
+
+    # Run the application
+    root.mainloop()
+
+if __name__ == '__main__':
+    # Loudness analysis runs in worker processes, which frozen builds must support
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        # landplayer <command> ...: daemon and remote control, no window
+        from daemon import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    main()
@@ -0,0 +1,260 @@
+"""Persistent library index so reopening a known folder skips the stat storm.
+
+Each scanned folder is stored with its own mtime. A folder's mtime only
+changes when entries are added, removed or renamed, so if it still matches
+the listing comes straight from the database and costs one stat call.
+"""
+import os
+import json
+import sqlite3
+import threading
+
+from appdata import data_path, file_identity
+from instrument import log
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.aac', '.ogg')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    title TEXT,
+    artist TEXT,
+    album TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_folder ON files (folder, path);
+CREATE TABLE IF NOT EXISTS loudness (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    gain REAL NOT NULL,
+    peak REAL,
+    loudness REAL,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seek_tables (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    times BLOB,
+    offsets BLOB,
+    header_start INTEGER NOT NULL,
+    header_end INTEGER NOT NULL
+);
+"""
+
+METADATA_FIELDS = ('duration', 'title', 'artist', 'album')
+
+
+def is_audio_file(name):
+    """Check if a file name has one of the supported audio extensions"""
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+class Library:
+    """SQLite-backed index of scanned folders, file stats and probed metadata"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or data_path('library.db')
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def scan_folder(self, folder_path):
+        """Return (audio files, subfolders) of a folder, both sorted.
+
+        Served from the index when the folder's mtime is unchanged; otherwise
+        the folder is rescanned and the index updated.
+        """
+        folder_path = os.path.abspath(folder_path)
+        try:
+            mtime_ns = os.stat(folder_path).st_mtime_ns
+        except OSError:
+            return [], []
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, subdirs FROM folders WHERE path = ?", (folder_path,)
+            ).fetchone()
+            if row is not None and row[0] == mtime_ns:
+                files = [r[0] for r in self.conn.execute(
+                    "SELECT path FROM files WHERE folder = ? ORDER BY path", (folder_path,))]
+                return files, json.loads(row[1])
+
+        return self._rescan(folder_path, mtime_ns)
+
+    def list_folder(self, folder_path):
+        """Return the sorted audio files directly inside a folder"""
+        return self.scan_folder(folder_path)[0]
+
+    def _rescan(self, folder_path, mtime_ns):
+        found = {}
+        subdirs = []
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.path)
+                        elif entry.is_file() and is_audio_file(entry.name):
+                            st = entry.stat()
+                            found[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            log.warning(f"Could not scan folder {folder_path}: {e}")
+            return [], []
+        subdirs.sort()
+
+        with self.lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self.conn.execute(
+                    "SELECT path, size, mtime_ns FROM files WHERE folder = ?", (folder_path,))
+            }
+
+            removed = [(path,) for path in known if path not in found]
+            # New or modified files get fresh rows (dropping stale metadata)
+            changed = [
+                (path, folder_path, size, mtime)
+                for path, (size, mtime) in found.items()
+                if known.get(path) != (size, mtime)
+            ]
+
+            with self.conn:
+                if removed:
+                    self.conn.executemany("DELETE FROM files WHERE path = ?", removed)
+                if changed:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO files (path, folder, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                        changed)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO folders (path, mtime_ns, subdirs) VALUES (?, ?, ?)",
+                    (folder_path, mtime_ns, json.dumps(subdirs)))
+
+        return sorted(found), subdirs
+
+    def get_metadata(self, file_path, identity=None):
+        """Return stored metadata for a file as a dict, or None if unknown/stale"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, duration, title, artist, album FROM files WHERE path = ?",
+                (file_path,)
+            ).fetchone()
+        # Files are indexed by scans before they are probed
+        if row is None or row[2] is None:
+            return None
+        if identity is None:
+            identity = file_identity(file_path)
+        if identity != (row[0], row[1]):
+            return None
+        return dict(zip(METADATA_FIELDS, row[2:]))
+
+    def store_metadata(self, file_path, identity, metadata):
+        """Store probed metadata (duration, title, artist, album) for a file"""
+        values = [metadata.get(field) for field in METADATA_FIELDS]
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO files (path, folder, size, mtime_ns, duration, title, artist, album) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "duration = excluded.duration, title = excluded.title, "
+                "artist = excluded.artist, album = excluded.album",
+                (file_path, os.path.dirname(file_path), identity[0], identity[1], *values))
+
+    def cached_metadata(self, file_paths):
+        """Stored metadata for many files at once, without checking they are current"""
+        file_paths = list(file_paths)
+        found = {}
+        with self.lock:
+            for start in range(0, len(file_paths), 500):
+                chunk = file_paths[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in self.conn.execute(
+                        f"SELECT path, duration, title, artist, album FROM files "
+                        f"WHERE path IN ({placeholders}) AND duration IS NOT NULL", chunk):
+                    found[row[0]] = dict(zip(METADATA_FIELDS, row[1:]))
+        return found
+
+    def get_loudness(self, file_path, identity=None):
+        """Stored (gain dB, peak) for a file, or None if unknown/stale"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, gain, peak FROM loudness WHERE path = ?", (file_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        if identity is None:
+            identity = file_identity(file_path)
+        if identity != (row[0], row[1]):
+            return None
+        return row[2], row[3]
+
+    def store_loudness(self, file_path, identity, result):
+        """Store an analysis result (gain, peak, loudness, source) for a file"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO loudness (path, size, mtime_ns, gain, peak, loudness, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, identity[0], identity[1], result['gain'], result['peak'],
+                 result['loudness'], result['source']))
+
+    def get_seek_table(self, file_path, identity):
+        """Stored (times, offsets, header) blobs for a file, or None if unknown/stale.
+
+        Null blobs mean the file is known to have no seek table.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, times, offsets, header_start, header_end "
+                "FROM seek_tables WHERE path = ?", (file_path,)
+            ).fetchone()
+        if row is None or identity != (row[0], row[1]):
+            return None
+        return row[2], row[3], (row[4], row[5])
+
+    def store_seek_table(self, file_path, identity, times, offsets, header):
+        """Store a file's seek table as packed arrays (None for a file without one)"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO seek_tables "
+                "(path, size, mtime_ns, times, offsets, header_start, header_end) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, identity[0], identity[1], times, offsets, header[0], header[1]))
+
+    def files_without_loudness(self):
+        """Indexed files that have no current loudness result"""
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT files.path FROM files LEFT JOIN loudness ON loudness.path = files.path "
+                "WHERE loudness.path IS NULL OR loudness.size != files.size "
+                "OR loudness.mtime_ns != files.mtime_ns")]
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library():
+    """Get the shared Library instance, opening the database on first use"""
+    global _library
+    # First use may come from a worker thread and the Tk thread at once
+    with _library_lock:
+        if _library is None:
+            _library = Library()
+    return _library
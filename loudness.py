@@ -0,0 +1,240 @@
+"""Loudness analysis for per-track volume normalization.
+
+Tracks are decoded to PCM and measured with NumPy following ITU-R BS.1770
+(the basis of EBU R128 and ReplayGain 2.0): K-weighted power in 400 ms
+blocks with 75% overlap, then the absolute (-70 LUFS) and relative (-10 LU)
+gates. The K-weighting is applied to the spectrum of each 100 ms segment
+(Parseval), so a whole track is a handful of FFT calls and no
+sample-by-sample filter loop. Existing ReplayGain tags are used instead of
+decoding when a file has them.
+
+Analysis runs in a process pool, results are stored in the library index
+and playback only ever looks them up. NumPy is optional: without it only
+tagged files get a gain.
+"""
+import os
+import math
+import queue
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from pcm import read_pcm
+from instrument import log
+
+REFERENCE_LOUDNESS = -18.0  # LUFS a track is normalized to (ReplayGain 2.0)
+SEGMENT_SECONDS = 0.1       # Gating blocks are made of 4 of these (400 ms, 75% overlap)
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+_GAIN_TAG = 'replaygain_track_gain'
+_PEAK_TAG = 'replaygain_track_peak'
+
+
+def gain_factor(gain_db, peak):
+    """Mixer volume factor for a track gain, kept from clipping the track's peak"""
+    if peak and peak > 0:
+        gain_db = min(gain_db, -20 * math.log10(peak))
+    # The mixer can only attenuate
+    return min(1.0, 10 ** (gain_db / 20))
+
+
+def _k_weighting(rate, size):
+    """Squared K-weighting response at the rfft bins of a segment of `size` samples"""
+    import numpy as np
+
+    # High shelf (head effects) and high pass of BS.1770, for any sample rate
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    z = np.exp(-1j * 2 * np.pi * np.fft.rfftfreq(size))
+    response = np.ones(len(z))
+    for b, a in (shelf, high_pass):
+        h = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+        response *= np.abs(h) ** 2
+
+    # rfft holds each bin except DC (and Nyquist) once for two
+    response[1:] *= 2
+    if size % 2 == 0:
+        response[-1] /= 2
+    return response / (size * size)
+
+
+class LoudnessMeter:
+    """Integrated loudness and sample peak of PCM fed in pieces"""
+
+    def __init__(self, rate):
+        import numpy as np
+        self.np = np
+        self.segment = int(rate * SEGMENT_SECONDS)
+        self.weights = _k_weighting(rate, self.segment)
+        self.leftover = None
+        self.powers = []  # K-weighted power of each segment, summed over channels
+        self.peak = 0.0
+
+    def add(self, samples):
+        """Feed float samples in [-1, 1], shaped (frames, channels)"""
+        np = self.np
+        if self.leftover is not None:
+            samples = np.concatenate((self.leftover, samples))
+        if len(samples):
+            self.peak = max(self.peak, float(np.abs(samples).max()))
+        whole = len(samples) // self.segment * self.segment
+        self.leftover = samples[whole:]
+        if not whole:
+            return
+        # (segments, segment length, channels) -> spectrum along the segment axis
+        segments = samples[:whole].reshape(-1, self.segment, samples.shape[1])
+        spectrum = np.abs(np.fft.rfft(segments, axis=1)) ** 2
+        self.powers.append(np.einsum('sfc,f->s', spectrum, self.weights))
+
+    def loudness(self):
+        """Integrated loudness in LUFS, or None for silence or very short input"""
+        np = self.np
+        if not self.powers:
+            return None
+        powers = np.concatenate(self.powers)
+        if len(powers) < 4:
+            return None
+        # 400 ms blocks every 100 ms
+        blocks = np.convolve(powers, np.full(4, 0.25), mode='valid')
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[block_loudness > ABSOLUTE_GATE]
+        if not len(gated):
+            return None
+        threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+        gated = blocks[(block_loudness > ABSOLUTE_GATE) & (block_loudness > threshold)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def _parse_number(value):
+    """'-6.54 dB' -> -6.54"""
+    try:
+        return float(str(value).strip().split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def read_replaygain(file_path):
+    """(gain dB, peak) from a file's ReplayGain tags, or None"""
+    try:
+        import mutagen
+        audio = mutagen.File(file_path)
+    except Exception:
+        return None
+    if audio is None or audio.tags is None:
+        return None
+
+    found = {}
+    try:
+        items = list(audio.tags.items())
+    except (AttributeError, TypeError):
+        return None
+    for key, value in items:
+        # ID3 'TXXX:REPLAYGAIN_TRACK_GAIN', MP4 '----:com.apple.iTunes:replaygain_track_gain'
+        name = str(key).rsplit(':', 1)[-1].lower()
+        if name not in (_GAIN_TAG, _PEAK_TAG):
+            continue
+        value = getattr(value, 'text', value)
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        number = _parse_number(value)
+        if number is not None:
+            found[name] = number
+    if _GAIN_TAG not in found:
+        return None
+    return found[_GAIN_TAG], found.get(_PEAK_TAG)
+
+
+def analyze_file(file_path, ffmpeg=None, measure=True):
+    """Loudness result for one file (runs in a worker process).
+
+    Returns {gain, peak, loudness, source} where source is 'tags' or
+    'analysis', or None if the file has no tags and measure is False or
+    nothing could be measured (silence).
+    """
+    tags = read_replaygain(file_path)
+    if tags is not None:
+        return {'gain': tags[0], 'peak': tags[1], 'loudness': None, 'source': 'tags'}
+    if not measure:
+        return None
+
+    meter = None
+    for rate, samples in read_pcm(file_path, ffmpeg):
+        if meter is None:
+            meter = LoudnessMeter(rate)
+        meter.add(samples)
+    loudness = meter.loudness() if meter else None
+    if loudness is None:
+        return None
+    return {'gain': REFERENCE_LOUDNESS - loudness, 'peak': meter.peak,
+            'loudness': loudness, 'source': 'analysis'}
+
+
+def numpy_available():
+    # Found without importing it; the workers import it themselves
+    return importlib.util.find_spec('numpy') is not None
+
+
+class LoudnessScan:
+    """Analyze files on a process pool; finished results are collected with poll()"""
+
+    def __init__(self, ffmpeg=None, workers=None):
+        self.ffmpeg = ffmpeg
+        self.measure = numpy_available()
+        if workers is None:
+            # Leave a core for playback and the window
+            workers = max(1, (os.cpu_count() or 2) - 1)
+        # Fresh interpreters: forking would copy the parent's audio threads and SDL state
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.results = queue.Queue()
+        self.outstanding = 0
+        self.total = 0
+        self.done = 0
+
+    def add(self, file_paths):
+        for file_path in file_paths:
+            future = self.pool.submit(analyze_file, file_path, self.ffmpeg, self.measure)
+            # Called on the pool's thread; the queue hands it over
+            future.add_done_callback(lambda f, path=file_path: self.results.put((path, f)))
+            self.outstanding += 1
+            self.total += 1
+
+    def poll(self):
+        """[(file_path, result or None)] finished since the last call"""
+        finished = []
+        while True:
+            try:
+                file_path, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            self.done += 1
+            if future.cancelled():
+                continue
+            try:
+                finished.append((file_path, future.result()))
+            except Exception as e:
+                log.warning(f"Could not analyze {os.path.basename(file_path)}: {e}")
+                finished.append((file_path, None))
+        return finished
+
+    @property
+    def finished(self):
+        return self.outstanding == 0
+
+    def close(self):
+        """Stop the workers, dropping files not started yet"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
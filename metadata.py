@@ -0,0 +1,248 @@
+"""One metadata pipeline for tags, duration and album art.
+
+read_metadata opens a file once: the header prober reads the duration and
+mutagen reads tags and embedded pictures from the same handle. Tags and
+duration are cached in the library index, and durations also in probe's
+DurationCache, so a file whose length is already known is not probed again.
+Art bytes are handed to whoever asked for them (normally the album-art
+cache) so the file is never reopened just for its picture.
+"""
+import os
+import base64
+import threading
+
+from appdata import file_identity
+from library import METADATA_FIELDS, get_library
+from probe import get_duration_cache, probe_fileobj
+from instrument import log, span, increment
+
+# Folder images used when a file has no embedded art, in order of preference
+SIDECAR_NAMES = ('cover.jpg', 'cover.png', 'folder.jpg', 'folder.png',
+                 'front.jpg', 'front.png', 'album.jpg', 'album.png')
+
+# ID3 picture type for the front cover
+_FRONT_COVER = 3
+
+_TAG_KEYS = {
+    'title': ('TIT2', 'title', '\xa9nam'),
+    'artist': ('TPE1', 'artist', '\xa9ART'),
+    'album': ('TALB', 'album', '\xa9alb'),
+}
+
+
+def _first_text(tags, keys):
+    for key in keys:
+        try:
+            value = tags[key]
+        except (KeyError, ValueError, TypeError):
+            continue
+        # ID3 frames keep their values in .text, Vorbis/MP4 tags are lists
+        value = getattr(value, 'text', value)
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else None
+        if value:
+            return str(value)
+    return None
+
+
+def _pick_picture(pictures):
+    """Return the data of the front cover if there is one, else the first picture"""
+    best = None
+    for picture_type, data in pictures:
+        if not data:
+            continue
+        if picture_type == _FRONT_COVER:
+            return data
+        if best is None:
+            best = data
+    return best
+
+
+def _embedded_artwork(audio):
+    """Extract embedded picture bytes from a mutagen file object"""
+    pictures = []
+
+    # FLAC PICTURE blocks
+    for picture in getattr(audio, 'pictures', None) or []:
+        pictures.append((picture.type, picture.data))
+
+    tags = audio.tags
+    if tags is not None:
+        # ID3 APIC frames (MP3, also WAV/AIFF with ID3 chunks)
+        if hasattr(tags, 'getall'):
+            for frame in tags.getall('APIC'):
+                pictures.append((frame.type, frame.data))
+        else:
+            # Vorbis comments (Ogg Vorbis/Opus, FLAC)
+            try:
+                blocks = tags.get('metadata_block_picture') or []
+            except (KeyError, ValueError, TypeError):
+                blocks = []
+            if blocks:
+                from mutagen.flac import Picture
+                for block in blocks:
+                    try:
+                        picture = Picture(base64.b64decode(block))
+                        pictures.append((picture.type, picture.data))
+                    except Exception:
+                        continue
+
+            # MP4 cover atoms
+            try:
+                covers = tags.get('covr') or []
+            except (KeyError, ValueError, TypeError):
+                covers = []
+            for cover in covers:
+                pictures.append((_FRONT_COVER, bytes(cover)))
+
+    return _pick_picture(pictures)
+
+
+class SidecarFinder:
+    """Find cover.jpg/folder.png style images, listing each folder only once"""
+
+    def __init__(self):
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    def find(self, folder_path):
+        try:
+            mtime_ns = os.stat(folder_path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            cached = self.folders.get(folder_path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+
+        found = None
+        try:
+            names = {name.lower(): name for name in os.listdir(folder_path)}
+            for candidate in SIDECAR_NAMES:
+                if candidate in names:
+                    found = os.path.join(folder_path, names[candidate])
+                    break
+        except OSError:
+            pass
+
+        with self.lock:
+            self.folders[folder_path] = (mtime_ns, found)
+        return found
+
+
+_sidecars = SidecarFinder()
+
+
+def read_metadata(file_path, duration=None):
+    """Read duration, tags and artwork bytes from a single open of the file.
+
+    Returns a dict with duration, title, artist, album and artwork (bytes or
+    None, falling back to a folder image). A known duration skips the probe.
+    """
+    metadata = {'duration': 0, 'title': None, 'artist': None, 'album': None, 'artwork': None}
+
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if duration is None:
+            duration = probe_fileobj(f, file_size, file_path)
+        metadata['duration'] = duration
+
+        try:
+            import mutagen
+            f.seek(0)
+            audio = mutagen.File(f)
+        except Exception:
+            audio = None
+
+        if audio is not None:
+            if not metadata['duration'] and audio.info is not None:
+                metadata['duration'] = getattr(audio.info, 'length', 0) or 0
+            if audio.tags is not None:
+                for field, keys in _TAG_KEYS.items():
+                    metadata[field] = _first_text(audio.tags, keys)
+            metadata['artwork'] = _embedded_artwork(audio)
+
+    if metadata['artwork'] is None:
+        sidecar = _sidecars.find(os.path.dirname(os.path.abspath(file_path)))
+        if sidecar:
+            try:
+                with open(sidecar, 'rb') as f:
+                    metadata['artwork'] = f.read()
+            except OSError:
+                pass
+
+    return metadata
+
+
+class MetadataPipeline:
+    """Cached front end to read_metadata shared by playback and the art cache"""
+
+    def __init__(self, library=None, durations=None):
+        self._library = library
+        self._durations = durations
+        # Called with (file_path, artwork bytes or None) whenever a file is read
+        self.artwork_sink = None
+
+    @property
+    def library(self):
+        # The database is opened on first lookup, not while the window is coming up
+        if self._library is None:
+            self._library = get_library()
+        return self._library
+
+    @property
+    def durations(self):
+        if self._durations is None:
+            self._durations = get_duration_cache()
+        return self._durations
+
+    def get(self, file_path):
+        """Return {duration, title, artist, album}, reading the file only on a cache miss"""
+        identity = file_identity(file_path)
+        if identity is not None:
+            cached = self.library.get_metadata(file_path, identity)
+            if cached is not None:
+                increment('metadata_cache_hits')
+                return cached
+        increment('metadata_cache_misses')
+        metadata = self._read(file_path, identity)
+        return {field: metadata[field] for field in METADATA_FIELDS}
+
+    def artwork(self, file_path):
+        """Read a file's artwork bytes, caching its tags and duration on the way"""
+        return self._read(file_path, file_identity(file_path), notify=False).get('artwork')
+
+    def _read(self, file_path, identity, notify=True):
+        duration = None
+        if identity is not None:
+            duration = self.durations.get(file_path, identity)
+        try:
+            with span('metadata_read'):
+                metadata = read_metadata(file_path, duration)
+        except OSError as e:
+            log.warning(f"Could not read {os.path.basename(file_path)}: {e}")
+            return {'duration': 0, 'title': None, 'artist': None, 'album': None, 'artwork': None}
+
+        if duration is None and identity is not None and metadata['duration'] > 0:
+            self.durations.put(file_path, metadata['duration'], identity)
+
+        if identity is not None:
+            try:
+                self.library.store_metadata(file_path, identity, metadata)
+            except Exception as e:
+                log.warning(f"Could not cache metadata: {e}")
+
+        if notify and self.artwork_sink is not None:
+            self.artwork_sink(file_path, metadata['artwork'])
+        return metadata
+
+
+_pipeline = None
+
+
+def get_pipeline():
+    """Get the shared MetadataPipeline"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = MetadataPipeline()
+    return _pipeline
@@ -0,0 +1,157 @@
+"""The pygame music stream behind the playback engine.
+
+pygame is only imported and the audio device opened when the first track is
+loaded, so creating an engine (and showing the window) never waits on SDL, and
+the engine can be imported without an audio device.
+
+End-of-track events are picked up by a thread blocked in pygame.event.wait,
+which calls on_end as soon as the mixer posts one, so the engine learns
+about a track ending without polling for it. Stopping, loading and playing
+keep the event switched off: only a track running out posts it.
+"""
+import os
+import threading
+
+from instrument import log
+
+
+class PygameMixer:
+    """pygame.mixer.music plus the end-of-track events gapless playback needs"""
+
+    def __init__(self, headless=False):
+        self.headless = headless
+        self.pygame = None
+        self.music = None
+        self._events_available = False
+        self.volume = 1.0
+        self.lock = threading.Lock()
+        self.end_events = 0   # Posted since the last ended()/clear_end_events()
+        # Called on the waiter thread whenever an end event arrives
+        self.on_end = None
+
+    def start(self):
+        """Import pygame and open the audio device (done on first use)"""
+        if self.pygame is not None:
+            return
+        if self.headless:
+            # The dummy video driver still provides an event queue, no window needed
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        import pygame
+
+        # Initialize pygame mixer for audio
+        pygame.mixer.init()
+        self.music = pygame.mixer.music
+        self.music.set_volume(self.volume)
+
+        # Mixer end-of-track events are only delivered once the video subsystem
+        # (and with it the event queue) is up; no pygame window is ever opened
+        self.end_event = pygame.USEREVENT + 1
+        try:
+            pygame.display.init()
+            self.music.set_endevent(self.end_event)
+            self._events_available = True
+        except pygame.error as e:
+            log.warning(f"Mixer end events unavailable, gapless playback disabled: {e}")
+        self.pygame = pygame
+        if self._events_available:
+            threading.Thread(target=self._wait_for_end_events, name="mixer-events", daemon=True).start()
+
+    def _wait_for_end_events(self):
+        """Waiter thread: count each end event and hand it to on_end right away"""
+        while True:
+            try:
+                event = self.pygame.event.wait()
+            except self.pygame.error:
+                # The event queue was shut down
+                return
+            if event.type != self.end_event:
+                continue
+            with self.lock:
+                self.end_events += 1
+            on_end = self.on_end
+            if on_end is not None:
+                on_end()
+
+    def _quietly(self, action, *args):
+        """Run a mixer call that halts the music without it posting an end event"""
+        if self._events_available:
+            self.music.set_endevent()
+        try:
+            action(*args)
+        finally:
+            if self._events_available:
+                self.music.set_endevent(self.end_event)
+
+    @property
+    def started(self):
+        return self.pygame is not None
+
+    @property
+    def error(self):
+        self.start()
+        return self.pygame.error
+
+    @property
+    def events_available(self):
+        self.start()
+        return self._events_available
+
+    def load(self, source, namehint=None):
+        self.start()
+        if namehint:
+            self._quietly(self.music.load, source, namehint)
+        else:
+            self._quietly(self.music.load, source)
+
+    def play(self, start=0.0):
+        self.start()
+        if start:
+            self._quietly(lambda: self.music.play(start=start))
+        else:
+            self._quietly(self.music.play)
+
+    def queue(self, file_path):
+        self.start()
+        self.music.queue(file_path)
+
+    # Nothing can be playing before the first load, so these don't start pygame
+
+    def stop(self):
+        if self.started:
+            self._quietly(self.music.stop)
+
+    def pause(self):
+        if self.started:
+            self.music.pause()
+
+    def unpause(self):
+        if self.started:
+            self.music.unpause()
+
+    def set_volume(self, fraction):
+        # Applied when the mixer starts if it hasn't yet
+        self.volume = fraction
+        if self.started:
+            self.music.set_volume(fraction)
+
+    def set_pos(self, seconds):
+        self.start()
+        self.music.set_pos(seconds)
+
+    def get_busy(self):
+        return self.started and self.music.get_busy()
+
+    def get_pos(self):
+        """Milliseconds played since the stream was started (-1 if not playing)"""
+        return self.music.get_pos() if self.started else -1
+
+    def ended(self):
+        """Whether a track ended since the last check"""
+        with self.lock:
+            ended = self.end_events > 0
+            self.end_events = 0
+        return ended
+
+    def clear_end_events(self):
+        with self.lock:
+            self.end_events = 0
@@ -0,0 +1,94 @@
+"""Decode audio files to float PCM in pieces, for analysis with NumPy.
+
+WAV files are read with the wave module. Other formats go through ffmpeg
+when it is available (decoded to 48 kHz stereo) and through pygame's mixer
+otherwise, which holds the whole track in memory at once.
+"""
+import os
+import wave
+import subprocess
+
+DECODE_RATE = 48000        # Sample rate ffmpeg decodes to
+DECODE_CHUNK_SECONDS = 10  # PCM held in memory at a time while decoding
+
+
+def _read_wav(file_path):
+    import numpy as np
+    with wave.open(file_path, 'rb') as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        chunk = rate * DECODE_CHUNK_SECONDS
+        while True:
+            raw = w.readframes(chunk)
+            if not raw:
+                break
+            if width == 1:
+                samples = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+            elif width == 3:
+                # Widen 24-bit samples to 32 bits
+                packed = np.frombuffer(raw, np.uint8).reshape(-1, 3)
+                widened = np.zeros((len(packed), 4), np.uint8)
+                widened[:, 1:] = packed
+                samples = widened.view('<i4').ravel().astype(np.float32) / 2 ** 31
+            else:
+                dtype = {2: '<i2', 4: '<i4'}[width]
+                samples = np.frombuffer(raw, dtype).astype(np.float32) / 2 ** (8 * width - 1)
+            yield rate, samples.reshape(-1, channels)
+
+
+def _read_ffmpeg(file_path, ffmpeg):
+    import numpy as np
+    command = [ffmpeg, '-nostdin', '-v', 'error', '-i', file_path, '-map', '0:a:0',
+               '-ac', '2', '-ar', str(DECODE_RATE), '-f', 'f32le', '-']
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    chunk = DECODE_RATE * DECODE_CHUNK_SECONDS * 2 * 4
+    try:
+        with process.stdout:
+            while True:
+                raw = process.stdout.read(chunk)
+                if not raw:
+                    break
+                raw = raw[:len(raw) // 8 * 8]
+                yield DECODE_RATE, np.frombuffer(raw, '<f4').reshape(-1, 2)
+    except BaseException:
+        # The reader stopped early; don't leave ffmpeg running
+        process.kill()
+        process.wait()
+        raise
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg could not decode {os.path.basename(file_path)}")
+
+
+def _read_pygame(file_path, start_mixer):
+    import numpy as np
+    import pygame
+    if not pygame.mixer.get_init():
+        if not start_mixer:
+            raise RuntimeError("no decoder for this format until the mixer is running")
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.mixer.init()
+    rate, size, _ = pygame.mixer.get_init()
+    sound = pygame.mixer.Sound(file_path)
+    samples = pygame.sndarray.array(sound)
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    if np.issubdtype(samples.dtype, np.integer):
+        scale = float(2 ** (abs(size) - 1))
+        if size > 0:
+            # Unsigned samples are centred on half the range
+            samples = samples.astype(np.float32) - scale
+        samples = samples.astype(np.float32) / scale
+    yield rate, samples.astype(np.float32)
+
+
+def read_pcm(file_path, ffmpeg=None, start_mixer=True):
+    """Yield (sample rate, float32 samples in [-1, 1] shaped (frames, channels)).
+
+    Without ffmpeg, formats other than WAV are decoded by pygame's mixer; with
+    start_mixer False that only works once something else started the mixer.
+    """
+    if os.path.splitext(file_path)[1].lower() == '.wav':
+        return _read_wav(file_path)
+    if ffmpeg:
+        return _read_ffmpeg(file_path, ffmpeg)
+    return _read_pygame(file_path, start_mixer)
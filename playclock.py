@@ -0,0 +1,62 @@
+"""Playback position clock driven by the mixer rather than the wall clock.
+
+The mixer reports how much audio it has actually played since the track was
+started (pygame.mixer.music.get_pos counts mixed samples), which neither
+drifts under load nor jumps when the system clock is changed. When that
+counter isn't available the clock falls back to time.monotonic().
+"""
+import time
+
+
+class PlaybackClock:
+    """Track position in seconds, rebased on every start, seek and resume"""
+
+    def __init__(self, mixer_pos=None, monotonic=time.monotonic):
+        # mixer_pos: callable returning milliseconds played, negative if unknown
+        self.mixer_pos = mixer_pos
+        self.monotonic = monotonic
+        self.origin = 0.0        # Track position at the last rebase
+        self.mixer_base = None   # mixer_pos() at the last rebase
+        self.wall_base = 0.0     # monotonic() at the last rebase
+        self.paused = False
+
+    def _read_mixer(self):
+        if self.mixer_pos is None:
+            return None
+        try:
+            ms = self.mixer_pos()
+        except Exception:
+            return None
+        return ms if ms is not None and ms >= 0 else None
+
+    def _rebase(self, position):
+        self.origin = position
+        self.mixer_base = self._read_mixer()
+        self.wall_base = self.monotonic()
+
+    def start(self, position=0.0):
+        """The mixer (re)started playing at a track position"""
+        self.paused = False
+        self._rebase(position)
+
+    def pause(self):
+        """Freeze the clock at the current position"""
+        if not self.paused:
+            self.origin = self.position()
+            self.paused = True
+
+    def resume(self):
+        """Continue from the frozen position"""
+        if self.paused:
+            self.start(self.origin)
+
+    def position(self):
+        """Seconds into the track"""
+        if self.paused:
+            return self.origin
+        if self.mixer_base is not None:
+            ms = self._read_mixer()
+            # A counter that went backwards was reset under us; use the fallback
+            if ms is not None and ms >= self.mixer_base:
+                return self.origin + (ms - self.mixer_base) / 1000.0
+        return self.origin + (self.monotonic() - self.wall_base)
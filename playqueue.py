@@ -0,0 +1,551 @@
+"""Play queue with stable entry IDs and logarithmic position lookups.
+
+Entries live in blocks of a few hundred IDs; a Fenwick tree over the block
+sizes maps positions to blocks (and back) in O(log n), and the work inside a
+block is bounded by the block size. Every entry gets an ID when it is added,
+so the same file can appear several times and the current entry is tracked
+by identity rather than by path or a hand-maintained index.
+
+Entry IDs are track IDs in a TrackTable, and blocks hold them in typed
+arrays, so a queue entry costs a few dozen bytes rather than a path string,
+a boxed int and two dict slots.
+"""
+import random
+from array import array
+from collections import deque
+from itertools import islice
+
+from tracks import TrackTable
+
+BLOCK_SIZE = 512
+JOURNAL_LENGTH = 100  # Edits kept for changes_since(); older copies get the whole order
+
+
+class _Fenwick:
+    """Prefix sums over block sizes"""
+
+    def __init__(self, sizes):
+        self.tree = [0] * (len(sizes) + 1)
+        for i, size in enumerate(sizes, 1):
+            self.tree[i] += size
+            parent = i + (i & -i)
+            if parent <= len(sizes):
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index):
+        """Sum of the sizes of blocks [0, index)"""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, position):
+        """Return (block index, offset in block) holding a position"""
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            probe = index + step
+            if probe < len(self.tree) and self.tree[probe] <= position:
+                index = probe
+                position -= self.tree[probe]
+            step >>= 1
+        return index, position
+
+
+class _Block:
+    __slots__ = ('ids', 'index')
+
+    # ids is an array('q') of entry IDs
+
+    def __init__(self, ids, index):
+        self.ids = ids
+        self.index = index
+
+
+class EntryOrder:
+    """Entry IDs in order, in blocks indexed by a Fenwick tree over their sizes.
+
+    PlayQueue builds on it; the queue window keeps one as its copy of the
+    queue's order and replays the queue's edits on it.
+    """
+
+    def __init__(self, entry_ids=()):
+        self.block_of = {}   # entry ID -> _Block
+        self.blocks = []
+        self.sizes = None
+        self.size = 0
+        self.version = 0     # Goes up with every change to the order
+        if entry_ids:
+            self.extend_ids(list(entry_ids))
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __contains__(self, entry_id):
+        return entry_id in self.block_of
+
+    def ids(self):
+        """Iterate over entry IDs in order"""
+        for block in self.blocks:
+            yield from block.ids
+
+    def ids_array(self):
+        """All entry IDs in order, copied block by block into one array"""
+        order = array('q')
+        for block in self.blocks:
+            order += block.ids
+        return order
+
+    def entry_id(self, position):
+        """ID of the entry at a position (negative positions count from the end)"""
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError("queue index out of range")
+        block_index, offset = self.sizes.find(position)
+        return self.blocks[block_index].ids[offset]
+
+    def position_of(self, entry_id):
+        """Current position of an entry"""
+        block = self._block(entry_id)
+        return self.sizes.prefix(block.index) + block.ids.index(entry_id)
+
+    # ---- ID -> block links ----
+
+    def _block(self, entry_id):
+        return self.block_of[entry_id]
+
+    def _link(self, entry_id, block):
+        self.block_of[entry_id] = block
+
+    def _unlink(self, entry_id):
+        del self.block_of[entry_id]
+
+    def _assign(self, block):
+        """Point every ID of a block back at it"""
+        for entry_id in block.ids:
+            self._link(entry_id, block)
+
+    # ---- block maintenance ----
+
+    def _rebuild(self):
+        """Renumber blocks and rebuild the prefix sums after blocks were added/removed"""
+        for index, block in enumerate(self.blocks):
+            block.index = index
+        self.sizes = _Fenwick([len(block.ids) for block in self.blocks])
+        self.version += 1
+
+    def _split(self, block):
+        half = len(block.ids) // 2
+        new_block = _Block(block.ids[half:], block.index + 1)
+        del block.ids[half:]
+        self._assign(new_block)
+        self.blocks.insert(block.index + 1, new_block)
+        self._rebuild()
+
+    def _place(self, position, entry_id):
+        """Put a detached ID at a position"""
+        if not self.blocks:
+            self.blocks.append(_Block(array('q'), 0))
+            self._rebuild()
+        if position >= self.size:
+            block = self.blocks[-1]
+            block.ids.append(entry_id)
+        else:
+            block_index, offset = self.sizes.find(position)
+            block = self.blocks[block_index]
+            block.ids.insert(offset, entry_id)
+        self._link(entry_id, block)
+        self.sizes.add(block.index, 1)
+        self.size += 1
+        self.version += 1
+        if len(block.ids) > 2 * BLOCK_SIZE:
+            self._split(block)
+
+    def _take(self, position):
+        """Detach the ID at a position"""
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError("queue index out of range")
+        block_index, offset = self.sizes.find(position)
+        block = self.blocks[block_index]
+        entry_id = block.ids.pop(offset)
+        self._unlink(entry_id)
+        self.size -= 1
+        self.version += 1
+        if block.ids:
+            self.sizes.add(block_index, -1)
+        else:
+            del self.blocks[block_index]
+            self._rebuild()
+        return entry_id
+
+    def _is_small_batch(self, count):
+        # Editing entry by entry costs about a block per entry; rebuilding, the whole queue
+        return count * BLOCK_SIZE < self.size
+
+    def _set_order(self, order):
+        """Lay the entries out anew in this order of known IDs, in one pass"""
+        self.blocks = []
+        self.size = 0
+        self._rebuild()
+        self.extend_ids(order)
+
+    # ---- editing the order ----
+
+    def extend_ids(self, entry_ids):
+        """Add IDs at the end (for a queue: already registered ones, when reordering)"""
+        for start in range(0, len(entry_ids), BLOCK_SIZE):
+            block = _Block(array('q', entry_ids[start:start + BLOCK_SIZE]), len(self.blocks))
+            self._assign(block)
+            self.blocks.append(block)
+        self.size += len(entry_ids)
+        self._rebuild()
+
+    def insert_ids(self, position, entry_ids):
+        """Put detached IDs, in order, at a position"""
+        if self._is_small_batch(len(entry_ids)):
+            for offset, entry_id in enumerate(entry_ids):
+                self._place(position + offset, entry_id)
+            return
+        order = list(self.ids())
+        self._set_order(order[:position] + list(entry_ids) + order[position:])
+
+    def remove_ids(self, entry_ids):
+        """Take entries out of the order, return the IDs that were in it"""
+        doomed = [entry_id for entry_id in dict.fromkeys(entry_ids) if entry_id in self]
+        if self._is_small_batch(len(doomed)):
+            for entry_id in doomed:
+                self._take(self.position_of(entry_id))
+            return doomed
+        # One pass over the queue instead of a block edit per entry
+        gone = set(doomed)
+        self._set_order([entry_id for entry_id in self.ids() if entry_id not in gone])
+        for entry_id in doomed:
+            self._unlink(entry_id)
+        return doomed
+
+    def move(self, source, destination):
+        """Move an entry so it ends up at destination (like pop + insert), keeping its ID"""
+        entry_id = self._take(source)
+        self._place(min(destination, self.size), entry_id)
+        return entry_id
+
+    def move_ids(self, entry_ids, destination):
+        """Move entries together, in the given order, so the first ends up at destination
+
+        Returns the IDs that were moved.
+        """
+        moving = [entry_id for entry_id in dict.fromkeys(entry_ids) if entry_id in self]
+        if self._is_small_batch(len(moving)):
+            for entry_id in moving:
+                self._take(self.position_of(entry_id))
+            self.insert_ids(min(destination, self.size), moving)
+            return moving
+        moved = set(moving)
+        rest = [entry_id for entry_id in self.ids() if entry_id not in moved]
+        destination = min(destination, len(rest))
+        self._set_order(rest[:destination] + moving + rest[destination:])
+        return moving
+
+    def move_before(self, entry_ids, before_id):
+        """Move entries together, in this order, in front of before_id (None or unknown: to the end)"""
+        moving = [entry_id for entry_id in dict.fromkeys(entry_ids) if entry_id in self]
+        if before_id in moving:
+            return moving
+        if before_id is None or before_id not in self:
+            destination = self.size
+        else:
+            position = self.position_of(before_id)
+            destination = position - sum(1 for entry_id in moving if self.position_of(entry_id) < position)
+        return self.move_ids(moving, destination)
+
+    def id_after(self, entry_id):
+        """ID of the entry following one, None if it is the last"""
+        position = self.position_of(entry_id) + 1
+        return self.entry_id(position) if position < self.size else None
+
+
+class PlayQueue(EntryOrder):
+    """Ordered queue of file paths with stable per-entry IDs
+
+    The queue keeps a short journal of its edits in terms of entry IDs, so
+    a copy of its order can be brought up to date with changes_since()
+    instead of a copy of the whole order.
+    """
+
+    def __init__(self, paths=()):
+        super().__init__()
+        self.tracks = TrackTable()
+        self.block_of = []   # track row -> _Block (None once removed)
+        self.current_id = None
+        self.journal = deque(maxlen=JOURNAL_LENGTH)  # (version before, edit)
+        if paths:
+            self.extend(paths)
+
+    # ---- list-like reading ----
+
+    def __getitem__(self, position):
+        return self.tracks.path(self.entry_id(position))
+
+    def __iter__(self):
+        path = self.tracks.path
+        for block in self.blocks:
+            for entry_id in block.ids:
+                yield path(entry_id)
+
+    def __contains__(self, entry_id):
+        return entry_id in self.tracks
+
+    def name(self, position):
+        """File name of the entry at a position"""
+        return self.tracks.name(self.entry_id(position))
+
+    @property
+    def names(self):
+        """Sequence view of the entries' file names (what the queue window shows)"""
+        return _NameView(self)
+
+    def split_paths(self):
+        """Iterate over (folder prefix, file name) pairs in queue order"""
+        split = self.tracks.split
+        for block in self.blocks:
+            for entry_id in block.ids:
+                yield split(entry_id)
+
+    def names_from(self, first_id):
+        """{entry ID: file name} for the entries whose IDs are first_id or later"""
+        return self.tracks.names_from(first_id)
+
+    def path_of(self, entry_id):
+        return self.tracks.path(entry_id)
+
+    # ---- ID -> block links, by track row ----
+
+    def _block(self, entry_id):
+        return self.block_of[self.tracks.row(entry_id)]
+
+    def _link(self, entry_id, block):
+        self.block_of[entry_id - self.tracks.base] = block
+
+    def _unlink(self, entry_id):
+        self.block_of[entry_id - self.tracks.base] = None
+
+    def _assign(self, block):
+        base = self.tracks.base
+        block_of = self.block_of
+        for entry_id in block.ids:
+            block_of[entry_id - base] = block
+
+    # ---- edit journal ----
+
+    def _record(self, version, edit):
+        """Note an edit made to the order as it was at version"""
+        if self.version != version:
+            self.journal.append((version, edit))
+
+    def changes_since(self, version):
+        """The edits made since a version, oldest first, or None if they aren't all known.
+
+        Each edit is ('insert', entry IDs, before ID), ('remove', entry IDs)
+        or ('move', entry IDs, before ID); a before ID of None means the end.
+        """
+        if version == self.version:
+            return []
+        for at, (before, _) in enumerate(self.journal):
+            if before == version:
+                return [edit for _, edit in islice(self.journal, at, None)]
+        return None
+
+    def _before_id(self, position):
+        return self.entry_id(position) if 0 <= position < self.size else None
+
+    # ---- cached metadata ----
+
+    def set_metadata(self, entry_id, metadata):
+        """Remember an entry's duration and tags"""
+        self.tracks.set_metadata(entry_id, metadata)
+
+    def metadata_of(self, entry_id):
+        """Known {duration, title, artist, album} of an entry (None for unknown values)"""
+        return self.tracks.metadata(entry_id)
+
+    def known_metadata(self):
+        """Map path -> metadata for the entries whose metadata has been recorded"""
+        known = {}
+        for entry_id in self.ids():
+            if self.tracks.has_metadata(entry_id):
+                known[self.tracks.path(entry_id)] = self.tracks.metadata(entry_id)
+        return known
+
+    # ---- current entry ----
+
+    @property
+    def current_index(self):
+        """Position of the current entry, -1 if there is none"""
+        if self.current_id is None:
+            return -1
+        return self.position_of(self.current_id)
+
+    def set_current(self, position):
+        """Make the entry at a position current (-1 or out of range clears it)"""
+        if 0 <= position < self.size:
+            self.current_id = self.entry_id(position)
+        else:
+            self.current_id = None
+
+    # ---- editing ----
+
+    def _new_ids(self, paths):
+        new_ids = self.tracks.extend(paths)
+        self.block_of.extend([None] * len(new_ids))
+        return new_ids
+
+    def append(self, path):
+        """Add a path at the end, return its entry ID"""
+        version = self.version
+        entry_id = self._new_ids((path,))[0]
+        self._place(self.size, entry_id)
+        self._record(version, ('insert', (entry_id,), None))
+        return entry_id
+
+    def extend(self, paths):
+        """Add many paths at the end in one pass, return their entry IDs"""
+        version = self.version
+        new_ids = self._new_ids(paths)
+        if not new_ids:
+            return new_ids
+
+        remaining = array('q', new_ids)
+        # Top up the last block, then add whole new blocks
+        if self.blocks and len(self.blocks[-1].ids) < BLOCK_SIZE:
+            last = self.blocks[-1]
+            room = BLOCK_SIZE - len(last.ids)
+            last.ids.extend(remaining[:room])
+            self._assign(last)
+            remaining = remaining[room:]
+        for start in range(0, len(remaining), BLOCK_SIZE):
+            block = _Block(remaining[start:start + BLOCK_SIZE], len(self.blocks))
+            self._assign(block)
+            self.blocks.append(block)
+
+        self.size += len(new_ids)
+        self._rebuild()
+        self._record(version, ('insert', new_ids, None))
+        return new_ids
+
+    def insert(self, position, path):
+        """Insert a path before a position, return its entry ID"""
+        if position < 0:
+            position = max(0, position + self.size)
+        return self.insert_paths(position, (path,))[0]
+
+    def insert_paths(self, position, paths):
+        """Insert paths before a position in one go, return their entry IDs"""
+        version = self.version
+        position = min(max(position, 0), self.size)
+        before_id = self._before_id(position)
+        new_ids = self._new_ids(paths)
+        self.insert_ids(position, list(new_ids))
+        self._record(version, ('insert', new_ids, before_id))
+        return new_ids
+
+    def pop(self, position=-1):
+        """Remove the entry at a position and return its path"""
+        version = self.version
+        entry_id = self._take(position)
+        if entry_id == self.current_id:
+            self.current_id = None
+        self._record(version, ('remove', (entry_id,)))
+        return self.tracks.discard(entry_id)
+
+    def remove_id(self, entry_id):
+        """Remove an entry by ID and return its path"""
+        return self.pop(self.position_of(entry_id))
+
+    def remove_ids(self, entry_ids):
+        """Remove many entries at once, return their paths"""
+        version = self.version
+        doomed = super().remove_ids(entry_ids)
+        if self.current_id is not None and self.current_id in set(doomed):
+            self.current_id = None
+        self._record(version, ('remove', doomed))
+        return [self.tracks.discard(entry_id) for entry_id in doomed]
+
+    def move(self, source, destination):
+        """Move an entry so it ends up at destination (like pop + insert), keeping its ID"""
+        version = self.version
+        entry_id = super().move(source, destination)
+        self._record(version, ('move', (entry_id,), self.id_after(entry_id)))
+        return entry_id
+
+    def move_ids(self, entry_ids, destination):
+        """Move entries together, in the given order, so the first ends up at destination"""
+        version = self.version
+        moving = super().move_ids(entry_ids, destination)
+        if moving:
+            self._record(version, ('move', moving, self.id_after(moving[-1])))
+        return moving
+
+    def clear(self):
+        self.tracks.clear()
+        self.block_of = []
+        self.blocks = []
+        self.size = 0
+        self.current_id = None
+        self._rebuild()
+        # Copies made before this can't catch up edit by edit
+        self.journal.clear()
+
+    def replace(self, paths, hints=None):
+        """Replace the whole queue (there is no current entry afterwards).
+
+        hints optionally carries cached durations and tags of the paths, as
+        read from a queue file (queuefile.MetadataHints).
+        """
+        self.clear()
+        new_ids = self.extend(paths)
+        if hints is not None and new_ids:
+            self.tracks.set_metadata_columns(new_ids[0], hints.durations, hints.tag_strings, hints.tag_ids)
+
+    def shuffle(self, rng=random):
+        """Shuffle the order; entry IDs (and so the current entry) are kept"""
+        order = list(self.ids())
+        rng.shuffle(order)
+        self._set_order(order)
+        self.journal.clear()
+
+
+class _NameView:
+    """Read-only sequence of a queue's file names"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __getitem__(self, position):
+        return self.queue.name(position)
+
+    def __iter__(self):
+        name = self.queue.tracks.name
+        for entry_id in self.queue.ids():
+            yield name(entry_id)
+
+    def entry_id(self, position):
+        return self.queue.entry_id(position)
+
+    def index_of(self, entry_id):
+        return self.queue.position_of(entry_id) if entry_id in self.queue else None
@@ -0,0 +1,490 @@
+"""Header-only duration probing for the audio formats LandPlayer plays.
+
+Every prober reads just the container/stream headers it needs (a few KB at
+most, except ADTS which has no global header and is walked frame by frame),
+so asking for a track's length never decodes audio.
+"""
+import os
+import json
+import struct
+import threading
+
+from appdata import data_path, file_identity
+from instrument import log
+
+# MPEG audio lookup tables, indexed by [version][layer]
+# version: 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5; layer: 3 = I, 2 = II, 1 = III
+_MP3_BITRATES = {
+    (3, 3): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 3): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 1): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+_ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000,
+                      22050, 16000, 12000, 11025, 8000, 7350]
+
+
+def _skip_id3v2(f):
+    """Seek past a leading ID3v2 tag (if any) and return the audio start offset"""
+    f.seek(0)
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b'ID3':
+        size = ((header[6] & 0x7F) << 21) | ((header[7] & 0x7F) << 14) | \
+               ((header[8] & 0x7F) << 7) | (header[9] & 0x7F)
+        offset = 10 + size
+        if header[5] & 0x10:
+            # Footer present
+            offset += 10
+        f.seek(offset)
+        return offset
+    f.seek(0)
+    return 0
+
+
+def parse_mp3_frame_header(data, pos=0):
+    """Parse an MPEG audio frame header, return a dict or None if not a frame"""
+    if len(data) < pos + 4:
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+
+    if layer == 3:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 3:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "mono": mono,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+
+def read_mp3_info(f, file_size):
+    """Locate the first MPEG frame and its Xing/VBRI header.
+
+    Returns a dict with duration, audio_start, audio_bytes, the first frame
+    header and the raw Xing/VBRI table of contents (if present), or None.
+    """
+    audio_start = _skip_id3v2(f)
+    data = f.read(64 * 1024)
+
+    # Find the first frame whose successor is also a valid frame
+    pos = 0
+    header = None
+    while True:
+        pos = data.find(b'\xFF', pos)
+        if pos < 0 or pos + 4 > len(data):
+            return None
+        header = parse_mp3_frame_header(data, pos)
+        if header:
+            follow = pos + header["frame_length"]
+            if follow + 4 > len(data) or parse_mp3_frame_header(data, follow):
+                break
+        pos += 1
+
+    audio_start += pos
+    frame = data[pos:]
+    audio_bytes = file_size - audio_start
+
+    # ID3v1 tag at the end is not audio
+    f.seek(max(0, file_size - 128))
+    if f.read(3) == b'TAG':
+        audio_bytes -= 128
+
+    info = {
+        "header": header,
+        "audio_start": audio_start,
+        "audio_bytes": audio_bytes,
+        "toc": None,
+        "toc_kind": None,
+        "duration": 0,
+    }
+
+    # Xing/Info header sits after the side information
+    if header["version"] == 3:
+        xing_offset = 21 if header["mono"] else 36
+    else:
+        xing_offset = 13 if header["mono"] else 21
+
+    frames = None
+    tag = frame[xing_offset:xing_offset + 4]
+    if tag in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', frame[xing_offset + 4:xing_offset + 8])[0]
+        cursor = xing_offset + 8
+        if flags & 0x01:
+            frames = struct.unpack('>I', frame[cursor:cursor + 4])[0]
+            cursor += 4
+        if flags & 0x02:
+            info["audio_bytes"] = struct.unpack('>I', frame[cursor:cursor + 4])[0]
+            cursor += 4
+        if flags & 0x04:
+            info["toc"] = list(frame[cursor:cursor + 100])
+            info["toc_kind"] = "xing"
+    elif frame[36:40] == b'VBRI':
+        vbri = frame[36:]
+        info["audio_bytes"], frames = struct.unpack('>II', vbri[10:18])
+        entries, scale, entry_size, frames_per_entry = struct.unpack('>HHHH', vbri[18:26])
+        toc = []
+        cursor = 26
+        for _ in range(entries):
+            raw = vbri[cursor:cursor + entry_size]
+            if len(raw) < entry_size:
+                break
+            toc.append(int.from_bytes(raw, 'big') * scale)
+            cursor += entry_size
+        info["toc"] = toc
+        info["toc_kind"] = "vbri"
+        info["vbri_frames_per_entry"] = frames_per_entry
+
+    if frames:
+        info["duration"] = frames * header["samples_per_frame"] / header["sample_rate"]
+    elif header["bitrate"]:
+        # No VBR header, assume constant bitrate
+        info["duration"] = info["audio_bytes"] * 8 / header["bitrate"]
+    return info
+
+
+def _probe_mp3(f, file_size):
+    info = read_mp3_info(f, file_size)
+    if info and info["duration"]:
+        return info["duration"]
+
+    # Unusual stream layout, let mutagen have a go
+    try:
+        from mutagen.mp3 import MP3
+        f.seek(0)
+        return MP3(f).info.length
+    except Exception:
+        return 0
+
+
+def _parse_streaminfo(block):
+    """Return (sample_rate, total_samples) from a FLAC STREAMINFO block"""
+    packed = int.from_bytes(block[10:18], 'big')
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    return sample_rate, total_samples
+
+
+def _probe_flac(f, file_size):
+    _skip_id3v2(f)
+    if f.read(4) != b'fLaC':
+        return 0
+    block_header = f.read(4)
+    if len(block_header) < 4 or (block_header[0] & 0x7F) != 0:
+        return 0
+    sample_rate, total_samples = _parse_streaminfo(f.read(34))
+    if sample_rate and total_samples:
+        return total_samples / sample_rate
+    return 0
+
+
+def _ogg_first_packet(f):
+    """Return (serial, first packet bytes) of the first Ogg page"""
+    header = f.read(27)
+    if len(header) < 27 or header[:4] != b'OggS':
+        return None, b''
+    serial = struct.unpack('<I', header[14:18])[0]
+    segments = f.read(header[26])
+    return serial, f.read(sum(segments))
+
+
+def _ogg_last_granule(f, file_size, serial):
+    """Scan backwards from the end of the file for the last granule of a stream"""
+    chunk = 64 * 1024
+    end = file_size
+    while end > 0:
+        start = max(0, end - chunk)
+        f.seek(start)
+        # Overlap by one page header so split headers are not missed
+        data = f.read(end - start + 27)
+        pos = data.rfind(b'OggS')
+        while pos >= 0:
+            if pos + 27 <= len(data):
+                granule, page_serial = struct.unpack('<qI', data[pos + 6:pos + 18])
+                if page_serial == serial and granule >= 0:
+                    return granule
+            pos = data.rfind(b'OggS', 0, pos)
+        end = start
+    return 0
+
+
+def _probe_ogg(f, file_size):
+    serial, packet = _ogg_first_packet(f)
+    if serial is None:
+        return 0
+
+    pre_skip = 0
+    if packet[:7] == b'\x01vorbis':
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+    elif packet[:8] == b'OpusHead':
+        # Opus granules always run at 48 kHz
+        sample_rate = 48000
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+    elif packet[:5] == b'\x7fFLAC':
+        sample_rate, _ = _parse_streaminfo(packet[17:51])
+    else:
+        return 0
+
+    if not sample_rate:
+        return 0
+    granule = _ogg_last_granule(f, file_size, serial)
+    return max(0, granule - pre_skip) / sample_rate
+
+
+def _probe_wav(f, file_size):
+    header = f.read(12)
+    if len(header) < 12 or header[8:12] != b'WAVE' or header[:4] not in (b'RIFF', b'RF64'):
+        return 0
+
+    byte_rate = 0
+    data_size = None
+    ds64_data_size = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id = chunk_header[:4]
+        chunk_size = struct.unpack('<I', chunk_header[4:])[0]
+        if chunk_id == b'fmt ':
+            fmt = f.read(min(chunk_size, 16))
+            byte_rate = struct.unpack('<I', fmt[8:12])[0]
+            f.seek(chunk_size - len(fmt) + (chunk_size & 1), 1)
+        elif chunk_id == b'ds64':
+            ds64 = f.read(min(chunk_size, 24))
+            ds64_data_size = struct.unpack('<Q', ds64[8:16])[0]
+            f.seek(chunk_size - len(ds64) + (chunk_size & 1), 1)
+        elif chunk_id == b'data':
+            data_start = f.tell()
+            if chunk_size == 0xFFFFFFFF and ds64_data_size is not None:
+                chunk_size = ds64_data_size
+            # Streamed/truncated files often carry a bogus data size
+            data_size = min(chunk_size, file_size - data_start) if chunk_size else file_size - data_start
+            break
+        else:
+            f.seek(chunk_size + (chunk_size & 1), 1)
+
+    if byte_rate and data_size:
+        return data_size / byte_rate
+    return 0
+
+
+def iter_adts_frames(f):
+    """Yield (file offset, sample rate, samples) for each ADTS frame from the current position"""
+    sample_rate = 0
+    buffer = b''
+    pos = 0
+    base = f.tell()  # File offset of buffer[0]
+
+    while True:
+        # Refill so at least one full header is available
+        if pos + 7 > len(buffer):
+            if pos > len(buffer):
+                # The last frame runs past the buffer: skip the rest of it in the file
+                f.seek(pos - len(buffer), os.SEEK_CUR)
+                base += pos
+                buffer, pos = b'', 0
+            more = f.read(256 * 1024)
+            if not more:
+                break
+            base += pos
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        if buffer[pos] != 0xFF or (buffer[pos + 1] & 0xF6) != 0xF0:
+            # Lost sync, hunt for the next frame
+            next_pos = buffer.find(b'\xFF', pos + 1)
+            pos = next_pos if next_pos >= 0 else len(buffer)
+            continue
+
+        frame_length = ((buffer[pos + 3] & 0x03) << 11) | (buffer[pos + 4] << 3) | (buffer[pos + 5] >> 5)
+        if frame_length < 7:
+            pos += 1
+            continue
+        if not sample_rate:
+            index = (buffer[pos + 2] >> 2) & 0x0F
+            if index >= len(_ADTS_SAMPLE_RATES):
+                pos += 1
+                continue
+            sample_rate = _ADTS_SAMPLE_RATES[index]
+        yield base + pos, sample_rate, ((buffer[pos + 6] & 0x03) + 1) * 1024
+        pos += frame_length
+
+
+def _probe_adts(f, file_size):
+    _skip_id3v2(f)
+    total_samples = 0
+    sample_rate = 0
+    for _, sample_rate, samples in iter_adts_frames(f):
+        total_samples += samples
+
+    if sample_rate:
+        return total_samples / sample_rate
+    return 0
+
+
+_PROBERS = {
+    '.mp3': _probe_mp3,
+    '.flac': _probe_flac,
+    '.ogg': _probe_ogg,
+    '.oga': _probe_ogg,
+    '.opus': _probe_ogg,
+    '.wav': _probe_wav,
+    '.aac': _probe_adts,
+}
+
+
+def probe_fileobj(f, file_size, file_path):
+    """Read the duration from an already open file (0 if unknown)"""
+    prober = _PROBERS.get(os.path.splitext(file_path)[1].lower())
+    if prober is None:
+        return 0
+    try:
+        f.seek(0)
+        return float(prober(f, file_size))
+    except (OSError, struct.error, IndexError, ValueError, ZeroDivisionError):
+        return 0
+
+
+def probe_duration(file_path):
+    """Read the duration of an audio file from its headers (0 if unknown)"""
+    if os.path.splitext(file_path)[1].lower() not in _PROBERS:
+        return 0
+    try:
+        file_size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            return probe_fileobj(f, file_size, file_path)
+    except OSError:
+        return 0
+
+
+class DurationCache:
+    """On-disk duration cache keyed by path, size and mtime.
+
+    Stored as an append-only JSON lines file so adding an entry is a single
+    small write; the file is compacted once it is mostly stale entries.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or data_path('durations.jsonl')
+        self.entries = None
+        self.line_count = 0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        self.entries = {}
+        self.line_count = 0
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        path, size, mtime_ns, duration = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[path] = (size, mtime_ns, duration)
+                    self.line_count += 1
+        except OSError:
+            pass
+
+    def get(self, file_path, identity=None):
+        """Return the cached duration, or None if missing or stale"""
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            entry = self.entries.get(file_path)
+        if entry is None:
+            return None
+        if identity is None:
+            identity = file_identity(file_path)
+        if identity is None or identity != entry[:2]:
+            return None
+        return entry[2]
+
+    def put(self, file_path, duration, identity=None):
+        """Store a duration for the file's current size/mtime"""
+        if identity is None:
+            identity = file_identity(file_path)
+        if identity is None:
+            return
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            self.entries[file_path] = (identity[0], identity[1], duration)
+            try:
+                with open(self.cache_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps([file_path, identity[0], identity[1], duration]) + '\n')
+                self.line_count += 1
+            except OSError as e:
+                log.warning(f"Could not write duration cache: {e}")
+                return
+            if self.line_count > 2 * len(self.entries) + 1000:
+                self._compact()
+
+    def _compact(self):
+        temp_path = self.cache_path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for path, (size, mtime_ns, duration) in self.entries.items():
+                    f.write(json.dumps([path, size, mtime_ns, duration]) + '\n')
+            os.replace(temp_path, self.cache_path)
+            self.line_count = len(self.entries)
+        except OSError as e:
+            log.warning(f"Could not compact duration cache: {e}")
+
+
+_duration_cache = None
+
+
+def get_duration_cache():
+    """Get the shared DurationCache"""
+    global _duration_cache
+    if _duration_cache is None:
+        _duration_cache = DurationCache()
+    return _duration_cache
+
+
+def get_duration(file_path):
+    """Get a track's duration, from the cache if possible, probing otherwise"""
+    durations = get_duration_cache()
+    identity = file_identity(file_path)
+    if identity is not None:
+        cached = durations.get(file_path, identity)
+        if cached is not None:
+            return cached
+
+    duration = probe_duration(file_path)
+    if duration > 0 and identity is not None:
+        durations.put(file_path, duration, identity)
+    return duration
@@ -0,0 +1,363 @@
+"""Reading and writing .lukyland queue files, and checking their entries.
+
+Two formats share the extension: the original indented JSON, and a compact
+binary variant (see write_compact_queue_file) that stores each folder once
+and keeps its columns sliceable, so entries can be read without parsing the
+whole file.
+read_queue_file accepts either, and hands back the compact format's cached
+durations and tags as MetadataHints for the queue to keep.
+
+Loading a queue never waits on the file system for more than the entry that
+is about to play: the rest is checked for existence in batches on a thread
+pool while playback is already running, and missing entries are reported
+back so they can be dropped from the queue.
+"""
+import os
+import json
+import mmap
+import sys
+import math
+import queue
+import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from tracks import split_path
+
+
+# Compact format layout: a fixed header followed by column sections.
+#   header      magic, version, flags, entry count, dir count, current index,
+#               then (offset, size) of every section below
+#   dir_offsets dir_count + 1 uint32 offsets into dirs
+#   dirs        NUL-separated UTF-8 folder prefixes (trailing separator kept)
+#   dir_ids     entry_count uint32, the folder of each entry
+#   name_offs   entry_count + 1 uint32 offsets into names
+#   names       NUL-separated UTF-8 basenames, in queue order
+#   durations   entry_count float32, NaN when unknown (FLAG_DURATIONS)
+#   tag_offs    uint32 offsets into tag_strings (FLAG_TAGS)
+#   tag_strings NUL-separated distinct title/artist/album strings
+#   tag_ids     entry_count x 3 uint32 (title, artist, album), NO_TAG if unset
+# Integers and floats are little endian. Every section can be sliced
+# directly, so one entry is readable without touching the others.
+COMPACT_MAGIC = b'LKYQ'
+COMPACT_VERSION = 1
+FLAG_DURATIONS = 0x01
+FLAG_TAGS = 0x02
+NO_TAG = 0xFFFFFFFF
+_SECTIONS = ('dir_offsets', 'dirs', 'dir_ids', 'name_offsets', 'names',
+             'durations', 'tag_offsets', 'tag_strings', 'tag_ids')
+_HEADER = struct.Struct('<4sHHIIi' + 'QQ' * len(_SECTIONS))
+_TAG_FIELDS = ('title', 'artist', 'album')
+
+
+def _le_bytes(values):
+    """Serialize an array little endian"""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _le_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _string_block(strings):
+    """Encode strings as a NUL-separated blob plus its offset table"""
+    offsets = array('I', [0])
+    encoded = []
+    position = 0
+    for text in strings:
+        data = text.encode('utf-8', 'surrogatepass')
+        encoded.append(data)
+        position += len(data) + 1
+        offsets.append(position)
+    return b'\0'.join(encoded) + (b'\0' if encoded else b''), offsets
+
+
+def write_compact_queue_file(file_path, paths, current_index, metadata=None):
+    """Save a queue in the compact binary format.
+
+    paths may be a PlayQueue, whose entries are already split into folder
+    and name. metadata optionally maps path -> {duration, title, artist,
+    album}; those fields are stored as cached hints alongside the paths.
+    """
+    if hasattr(paths, 'split_paths'):
+        pairs = paths.split_paths()
+    else:
+        pairs = map(split_path, paths)
+
+    dir_ids_by_prefix = {}
+    dirs = []
+    dir_ids = array('I')
+    names = []
+    for folder, name in pairs:
+        dir_id = dir_ids_by_prefix.get(folder)
+        if dir_id is None:
+            dir_id = dir_ids_by_prefix[folder] = len(dirs)
+            dirs.append(folder)
+        dir_ids.append(dir_id)
+        names.append(name)
+
+    sections = dict.fromkeys(_SECTIONS, b'')
+    sections['dirs'], dir_offsets = _string_block(dirs)
+    sections['dir_offsets'] = _le_bytes(dir_offsets)
+    sections['dir_ids'] = _le_bytes(dir_ids)
+    sections['names'], name_offsets = _string_block(names)
+    sections['name_offsets'] = _le_bytes(name_offsets)
+
+    flags = 0
+    if metadata:
+        rows = [metadata.get(dirs[dir_id] + name) or {} for dir_id, name in zip(dir_ids, names)]
+        durations = array('f', [float(row.get('duration') or math.nan) for row in rows])
+        sections['durations'] = _le_bytes(durations)
+        flags |= FLAG_DURATIONS
+
+        if any(row.get(field) for row in rows for field in _TAG_FIELDS):
+            tag_index = {}
+            tag_ids = array('I')
+            for row in rows:
+                for field in _TAG_FIELDS:
+                    text = row.get(field)
+                    tag_ids.append(tag_index.setdefault(text, len(tag_index)) if text else NO_TAG)
+            sections['tag_strings'], tag_offsets = _string_block(tag_index)
+            sections['tag_offsets'] = _le_bytes(tag_offsets)
+            sections['tag_ids'] = _le_bytes(tag_ids)
+            flags |= FLAG_TAGS
+
+    layout = []
+    position = _HEADER.size
+    for name in _SECTIONS:
+        layout += [position, len(sections[name])]
+        position += len(sections[name])
+    header = _HEADER.pack(COMPACT_MAGIC, COMPACT_VERSION, flags,
+                          len(names), len(dirs), current_index, *layout)
+
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        for name in _SECTIONS:
+            f.write(sections[name])
+    os.replace(temp_path, file_path)
+
+
+class MetadataHints:
+    """Cached durations and tags of a queue file's entries, as columns in queue order"""
+
+    def __init__(self, durations, tag_strings=(), tag_ids=None):
+        self.durations = durations      # array('f'), NaN when unknown
+        self.tag_strings = tag_strings  # Distinct title/artist/album strings
+        self.tag_ids = tag_ids          # array('I'), 3 per entry, NO_TAG if unset (None: no tags)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def select(self, indices):
+        """Hints for a subset of the entries, in the order given"""
+        durations = array('f', [self.durations[index] for index in indices])
+        tag_ids = None
+        if self.tag_ids is not None:
+            width = len(_TAG_FIELDS)
+            tag_ids = array('I', [self.tag_ids[index * width + i] for index in indices for i in range(width)])
+        return MetadataHints(durations, self.tag_strings, tag_ids)
+
+
+class CompactQueueReader:
+    """Random-access reader for compact queue files (memory-mapped)"""
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Not a compact queue file")
+        if len(self.data) < _HEADER.size or self.data[:4] != COMPACT_MAGIC:
+            self.close()
+            raise ValueError("Not a compact queue file")
+
+        fields = _HEADER.unpack_from(self.data)
+        version, self.flags, self.count, self.dir_count, self.current_index = fields[1:6]
+        if version > COMPACT_VERSION:
+            self.close()
+            raise ValueError(f"Queue file version {version} is newer than this player supports")
+        self.sections = {
+            name: (fields[6 + 2 * i], fields[7 + 2 * i]) for i, name in enumerate(_SECTIONS)
+        }
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _section(self, name):
+        offset, size = self.sections[name]
+        return self.data[offset:offset + size]
+
+    def _uint(self, section, index):
+        offset, size = self.sections[section]
+        if index * 4 + 4 > size:
+            raise IndexError("queue file section out of range")
+        return struct.unpack_from('<I', self.data, offset + index * 4)[0]
+
+    def _string(self, offsets, blob, index):
+        start = self._uint(offsets, index)
+        end = self._uint(offsets, index + 1) - 1
+        base = self.sections[blob][0]
+        return self.data[base + start:base + end].decode('utf-8', 'surrogatepass')
+
+    def path(self, index):
+        """Path of a single entry, reading only the bytes it needs"""
+        if not 0 <= index < self.count:
+            raise IndexError("queue index out of range")
+        folder = self._string('dir_offsets', 'dirs', self._uint('dir_ids', index))
+        return folder + self._string('name_offsets', 'names', index)
+
+    def duration(self, index):
+        """Cached duration of an entry, or None if it wasn't stored"""
+        if not self.flags & FLAG_DURATIONS:
+            return None
+        offset = self.sections['durations'][0]
+        duration = struct.unpack_from('<f', self.data, offset + index * 4)[0]
+        return None if math.isnan(duration) else duration
+
+    def tags(self, index):
+        """Cached title/artist/album of an entry (None values if not stored)"""
+        tags = dict.fromkeys(_TAG_FIELDS)
+        if self.flags & FLAG_TAGS:
+            for i, field in enumerate(_TAG_FIELDS):
+                tag_id = self._uint('tag_ids', index * 3 + i)
+                if tag_id != NO_TAG:
+                    tags[field] = self._string('tag_offsets', 'tag_strings', tag_id)
+        return tags
+
+    def hints(self):
+        """Cached durations and tags of all entries in bulk, None if none were stored"""
+        if not self.flags & FLAG_DURATIONS or not self.count:
+            return None
+        durations = _le_array('f', self._section('durations'))
+        if len(durations) != self.count:
+            return None
+        if not self.flags & FLAG_TAGS:
+            return MetadataHints(durations)
+        strings = self._section('tag_strings').decode('utf-8', 'surrogatepass').split('\0')[:-1]
+        tag_ids = _le_array('I', self._section('tag_ids'))
+        if len(tag_ids) != self.count * len(_TAG_FIELDS):
+            return MetadataHints(durations)
+        return MetadataHints(durations, strings, tag_ids)
+
+    def paths(self):
+        """All paths in queue order, decoded in bulk"""
+        if not self.count:
+            return []
+        dirs = self._section('dirs').decode('utf-8', 'surrogatepass').split('\0')
+        names = self._section('names').decode('utf-8', 'surrogatepass').split('\0')
+        dir_ids = _le_array('I', self._section('dir_ids'))
+        return [dirs[dir_id] + name for dir_id, name in zip(dir_ids, names)]
+
+    def __iter__(self):
+        return iter(self.paths())
+
+
+def is_compact_queue_file(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(4) == COMPACT_MAGIC
+
+
+def read_queue_file(file_path):
+    """Return (paths, saved current index, MetadataHints or None) from a .lukyland file (JSON or compact)"""
+    if is_compact_queue_file(file_path):
+        with CompactQueueReader(file_path) as reader:
+            paths = reader.paths()
+            current_index = reader.current_index
+            hints = reader.hints()
+        if not 0 <= current_index < len(paths):
+            current_index = 0
+        return paths, current_index, hints
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        queue_data = json.load(f)
+    paths = queue_data.get("queue", [])
+    current_index = queue_data.get("current_index", 0)
+    if not isinstance(current_index, int) or not 0 <= current_index < len(paths):
+        current_index = 0
+    return paths, current_index, None
+
+
+def write_queue_file(file_path, paths, current_index):
+    """Save a queue as a .lukyland file"""
+    queue_data = {
+        "queue": list(paths),
+        "current_index": current_index
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(queue_data, f, indent=2)
+
+
+class ExistenceChecker:
+    """Check queue entries for existence concurrently, reporting the missing ones"""
+
+    def __init__(self, entries, batch_size=256, max_workers=16):
+        # entries: (entry_id, path) pairs, checked roughly in the given order
+        self.entries = list(entries)
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.missing = queue.Queue()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.checked = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Start checking in the background"""
+        self.thread = threading.Thread(target=self._run, name="queue-check", daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_running(self):
+        return self.thread is not None and not self.finished.is_set()
+
+    def poll(self):
+        """Return the (entry_id, path) pairs found missing since the last poll"""
+        found = []
+        while True:
+            try:
+                found.append(self.missing.get_nowait())
+            except queue.Empty:
+                return found
+
+    def _check_batch(self, batch):
+        if self.cancelled.is_set():
+            return
+        for entry_id, path in batch:
+            if not os.path.exists(path):
+                self.missing.put((entry_id, path))
+        with self.lock:
+            self.checked += len(batch)
+
+    def _run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="exists") as pool:
+                for start in range(0, len(self.entries), self.batch_size):
+                    if self.cancelled.is_set():
+                        break
+                    pool.submit(self._check_batch, self.entries[start:start + self.batch_size])
+        finally:
+            self.finished.set()
@@ -0,0 +1,276 @@
+"""Virtualized queue list for the queue window.
+
+Only the rows that fit in the window exist as canvas items; they are reused
+as the list scrolls, and each refresh only touches rows whose text or colour
+actually changed. Updating the view costs the same for 10 or 100k entries.
+Any number of rows can be selected; the selection (like the current entry)
+is kept as entry IDs, so it stays on the same tracks when the queue changes
+under it. A line marks where dragged rows would go.
+
+QueueRows is the window's copy of the queue that the view reads: the entry
+IDs in order and the names sent for them. It is an indexed EntryOrder like
+the queue's own, kept up to date by replaying the queue's edits, so an edit
+costs the window the same for any queue length, as do position lookups.
+"""
+import os
+import tkinter as tk
+from tkinter import font as tkfont
+
+from instrument import span
+from playqueue import EntryOrder
+
+ROW_BG = 'white'
+CURRENT_BG = 'lightblue'
+SELECTED_BG = '#3399ff'
+SELECTED_FG = 'white'
+TEXT_FG = 'black'
+DROP_FG = '#003c80'
+NAME_SLACK = 1000  # Names of removed entries kept before QueueRows drops them
+
+
+class QueueRows:
+    """The window's copy of the queue: entry IDs in queue order and their names"""
+
+    def __init__(self):
+        self.order = EntryOrder()
+        self.names = {}
+
+    def update(self, ids, names):
+        """Take a queue snapshot: the whole order, and the names not sent before"""
+        self.order = EntryOrder(ids)
+        self.add_names(names)
+
+    def apply(self, changes, names):
+        """Replay the queue's edits since the last snapshot (see PlayQueue.changes_since)"""
+        order = self.order
+        for change in changes:
+            if change[0] == 'insert':
+                _, entry_ids, before_id = change
+                position = order.position_of(before_id) if before_id in order else len(order)
+                order.insert_ids(position, list(entry_ids))
+            elif change[0] == 'remove':
+                order.remove_ids(change[1])
+            else:
+                order.move_before(change[1], change[2])
+        self.add_names(names)
+
+    def add_names(self, names):
+        self.names.update(names)
+        # Names of removed entries pile up; keep only the queue's once they outnumber it
+        if len(self.names) > 2 * len(self.order) + NAME_SLACK:
+            self.names = {entry_id: self.names[entry_id] for entry_id in self.order.ids()
+                          if entry_id in self.names}
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        return self.names.get(self.order.entry_id(index), '')
+
+    def entry_id(self, index):
+        return self.order.entry_id(index)
+
+    def index_of(self, entry_id):
+        """Position of an entry, None if it isn't in the queue"""
+        if entry_id is None or entry_id not in self.order:
+            return None
+        return self.order.position_of(entry_id)
+
+    def move(self, entry_ids, before_id):
+        """Show entries moved, in this order, in front of before_id (None: to the end)"""
+        self.order.move_before(entry_ids, before_id)
+
+    def remove(self, entry_ids):
+        """Show entries removed"""
+        self.order.remove_ids(entry_ids)
+
+
+class QueueView(tk.Frame):
+    """Listbox-like view over the player's queue that only draws visible rows"""
+
+    def __init__(self, master, items, current, label=os.path.basename, font=("Arial", 10), **kwargs):
+        super().__init__(master, **kwargs)
+        # Callables so the view always reads the live queue state: the items
+        # (a sequence of names that also has entry_id(index) and index_of(entry_id))
+        # and the current entry's ID
+        self.items = items
+        self.current = current
+        self.label = label
+
+        self.font = tkfont.Font(font=font)
+        self.row_height = self.font.metrics('linespace') + 4
+        self.top = 0
+        self.selected = set()  # Entry IDs
+        self.anchor = None     # Entry where a Shift-click range starts
+        self.rows = []       # Canvas item ids per visible slot: (background, text)
+        self.row_state = []  # Last drawn (text, bg, fg) per slot
+
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self, bg=ROW_BG, highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.drop_marker = self.canvas.create_line(0, 0, 0, 0, fill=DROP_FG, width=2, state='hidden')
+
+        self.canvas.bind('<Configure>', self._on_resize)
+        self.canvas.bind('<MouseWheel>', self._on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.canvas.bind('<Button-5>', lambda e: self.scroll(3))
+        # Older Tk on Windows sends wheel events to the focused widget
+        self.canvas.bind('<Enter>', lambda e: self.canvas.focus_set())
+
+    def visible_rows(self):
+        """Number of rows that fit in the window"""
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def _on_resize(self, event):
+        needed = event.height // self.row_height + 1
+        width = event.width
+
+        # Create or drop row slots to match the new height
+        while len(self.rows) < needed:
+            y = len(self.rows) * self.row_height
+            background = self.canvas.create_rectangle(0, y, width, y + self.row_height, width=0, fill=ROW_BG)
+            text = self.canvas.create_text(4, y + self.row_height // 2, anchor='w', font=self.font, text='')
+            self.rows.append((background, text))
+            self.row_state.append(None)
+        while len(self.rows) > needed:
+            background, text = self.rows.pop()
+            self.row_state.pop()
+            self.canvas.delete(background, text)
+
+        # Stretch the row backgrounds to the new width
+        for slot, (background, _) in enumerate(self.rows):
+            y = slot * self.row_height
+            self.canvas.coords(background, 0, y, width, y + self.row_height)
+        self.canvas.tag_raise(self.drop_marker)
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self.scroll(step * 3)
+
+    def scroll(self, rows):
+        """Scroll by a number of rows"""
+        self.top += rows
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar callback (moveto/scroll), same protocol as Listbox.yview"""
+        count = len(self.items())
+        if not args or not count:
+            return
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * count)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            self.top += amount
+        self.refresh()
+
+    def see(self, index):
+        """Scroll so that the given index is visible"""
+        visible = self.visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + visible:
+            self.top = index - visible + 1
+        self.refresh()
+
+    def nearest(self, y):
+        """Index of the entry nearest to a y coordinate, -1 if the queue is empty"""
+        count = len(self.items())
+        if not count:
+            return -1
+        index = self.top + int(y // self.row_height)
+        return max(0, min(index, count - 1))
+
+    def _ids_between(self, first, last):
+        items = self.items()
+        if last is None:
+            last = first
+        return (items.entry_id(index) for index in range(min(first, last), max(first, last) + 1))
+
+    def selection_set(self, first, last=None):
+        self.selected.update(self._ids_between(first, last))
+        self.refresh()
+
+    def selection_clear(self, first=None, last=None):
+        if first is None:
+            self.selected.clear()
+        else:
+            self.selected.difference_update(self._ids_between(first, last))
+        self.refresh()
+
+    def selection_includes(self, index):
+        return self.items().entry_id(index) in self.selected
+
+    def curselection(self):
+        """Positions of the selected entries that are still in the queue, in queue order"""
+        return tuple(sorted(position for position, _ in self._selected_positions()))
+
+    def selected_ids(self):
+        """IDs of the selected entries that are still in the queue, in queue order"""
+        return [entry_id for _, entry_id in sorted(self._selected_positions())]
+
+    def _selected_positions(self):
+        index_of = self.items().index_of
+        for entry_id in self.selected:
+            position = index_of(entry_id)
+            if position is not None:
+                yield position, entry_id
+
+    def anchor_index(self):
+        """Position of the Shift-click anchor, None if there is none (any more)"""
+        return self.items().index_of(self.anchor) if self.anchor is not None else None
+
+    def show_drop(self, index):
+        """Mark the gap above an entry as where dragged rows would land (None hides it)"""
+        if index is None:
+            self.canvas.itemconfigure(self.drop_marker, state='hidden')
+            return
+        y = (index - self.top) * self.row_height
+        self.canvas.coords(self.drop_marker, 0, y, self.canvas.winfo_width(), y)
+        self.canvas.itemconfigure(self.drop_marker, state='normal')
+
+    def refresh(self):
+        """Redraw the visible rows, touching only the ones that changed"""
+        with span('queue_refresh'):
+            self._refresh()
+
+    def _refresh(self):
+        items = self.items()
+        count = len(items)
+        current = self.current()
+        selected = self.selected
+        visible = self.visible_rows()
+
+        # Keep the scroll position within the list
+        self.top = max(0, min(self.top, count - visible))
+
+        for slot, (background, text_item) in enumerate(self.rows):
+            index = self.top + slot
+            if index < count:
+                name = self.label(items[index])
+                entry_id = items.entry_id(index)
+                if entry_id == current:
+                    # Mark currently playing track
+                    state = (f"► {name}", CURRENT_BG, TEXT_FG)
+                else:
+                    state = (name, ROW_BG, TEXT_FG)
+                if entry_id in selected:
+                    state = (state[0], SELECTED_BG, SELECTED_FG)
+            else:
+                state = ('', ROW_BG, TEXT_FG)
+
+            if state != self.row_state[slot]:
+                self.canvas.itemconfigure(text_item, text=state[0], fill=state[2])
+                self.canvas.itemconfigure(background, fill=state[1])
+                self.row_state[slot] = state
+
+        # Update the scrollbar
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + visible) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,145 @@
+"""Recursive folder scanner that walks sibling folders concurrently.
+
+Folders are listed on a thread pool (through the library index, so unchanged
+folders cost one stat). Results are handed out in a stable depth-first order,
+files of a folder before its subfolders and everything sorted, in batches
+the Tk side picks up with poll().
+"""
+import os
+import time
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from library import get_library
+from instrument import log
+
+
+class FolderScanner:
+    """Scan a folder tree in the background and stream batches of audio files"""
+
+    def __init__(self, folder_path, batch_size=500, batch_interval=0.05, max_workers=8, library=None):
+        self.folder_path = os.path.abspath(folder_path)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_workers = max_workers
+        self.library = library or get_library()
+
+        self.results = {}
+        self.results_ready = threading.Condition()
+        self.seen_dirs = set()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.batches = queue.Queue()
+        self.pool = None
+        self.thread = None
+
+        # Progress counters
+        self.dirs_scanned = 0
+        self.dirs_queued = 0
+        self.files_found = 0
+
+    def start(self):
+        """Start scanning in the background"""
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scan")
+        self.thread = threading.Thread(target=self._run, name="scan-coordinator", daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """Stop scanning; batches already handed out stay valid"""
+        self.cancelled.set()
+        with self.results_ready:
+            self.results_ready.notify_all()
+
+    def is_running(self):
+        return self.thread is not None and not self.finished.is_set()
+
+    def progress(self):
+        """Return (folders scanned, folders found, files found)"""
+        return self.dirs_scanned, self.dirs_queued, self.files_found
+
+    def poll(self):
+        """Return all batches produced since the last poll (non-blocking)"""
+        batches = []
+        while True:
+            try:
+                batches.append(self.batches.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def _submit(self, folder_path):
+        # Guard against symlink loops
+        try:
+            real_path = os.path.realpath(folder_path)
+        except OSError:
+            real_path = folder_path
+        with self.results_ready:
+            if real_path in self.seen_dirs:
+                self.results[folder_path] = ([], [])
+                self.results_ready.notify_all()
+                return
+            self.seen_dirs.add(real_path)
+            self.dirs_queued += 1
+        self.pool.submit(self._scan_one, folder_path)
+
+    def _scan_one(self, folder_path):
+        if self.cancelled.is_set():
+            return
+        try:
+            files, subdirs = self.library.scan_folder(folder_path)
+        except Exception as e:
+            log.warning(f"Error scanning {folder_path}: {e}")
+            files, subdirs = [], []
+
+        # Kick off the children right away so siblings are walked concurrently
+        for subdir in subdirs:
+            if self.cancelled.is_set():
+                break
+            self._submit(subdir)
+
+        with self.results_ready:
+            self.results[folder_path] = (files, subdirs)
+            self.dirs_scanned += 1
+            self.results_ready.notify_all()
+
+    def _wait_for(self, folder_path):
+        with self.results_ready:
+            while folder_path not in self.results and not self.cancelled.is_set():
+                self.results_ready.wait()
+            return self.results.pop(folder_path, None)
+
+    def _run(self):
+        batch = []
+        # The first files found are handed out immediately
+        last_flush = 0.0
+        try:
+            self._submit(self.folder_path)
+            # Consume results in depth-first order while workers run ahead
+            stack = [self.folder_path]
+            while stack and not self.cancelled.is_set():
+                result = self._wait_for(stack.pop())
+                if result is None:
+                    break
+                files, subdirs = result
+                stack.extend(reversed(subdirs))
+
+                for file_path in files:
+                    batch.append(file_path)
+                    self.files_found += 1
+                    if len(batch) >= self.batch_size:
+                        self.batches.put(batch)
+                        batch = []
+                        last_flush = time.monotonic()
+
+                # Hand out small batches promptly so playback can start early
+                if batch and time.monotonic() - last_flush >= self.batch_interval:
+                    self.batches.put(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+
+            if batch and not self.cancelled.is_set():
+                self.batches.put(batch)
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.finished.set()
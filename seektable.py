@@ -0,0 +1,257 @@
+"""Per-file seek tables: where in the file playback can restart for a given time.
+
+Seek points come from what the format already provides: the Xing/VBRI table
+of contents of VBR MP3s (or the bitrate of CBR ones), and for ADTS AAC the
+frame positions from one pass over the frame headers. Tables are kept in a
+small LRU in memory and in the library database, keyed on file identity,
+so a track is only ever indexed once until it changes.
+
+open_at() uses a table to hand the decoder a stream that starts at the seek
+point (after the headers it needs), so a decoder that cannot seek by itself
+does not have to decode everything before the target.
+"""
+import io
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+from appdata import file_identity
+from probe import _skip_id3v2, iter_adts_frames, read_mp3_info
+
+# Spacing of the seek points made up from frame positions (CBR MP3, ADTS)
+POINT_SPACING = 1.0
+
+
+class SeekTable:
+    """Sorted (time, byte offset) seek points plus the header a decoder needs first"""
+
+    def __init__(self, times, offsets, header=(0, 0)):
+        self.times = array('d', times)
+        self.offsets = array('Q', offsets)
+        # Byte range that must precede any seek point (codec setup headers)
+        self.header = header
+
+    def __len__(self):
+        return len(self.times)
+
+    def find(self, seconds):
+        """Return (time, offset) of the last seek point at or before a time"""
+        index = max(0, bisect_right(self.times, seconds) - 1)
+        return self.times[index], self.offsets[index]
+
+
+def _mp3_table(f, file_size):
+    info = read_mp3_info(f, file_size)
+    if not info or not info["duration"]:
+        return None
+    duration = info["duration"]
+    start = info["audio_start"]
+    audio_bytes = info["audio_bytes"]
+    toc = info["toc"]
+
+    times = []
+    offsets = []
+    if info["toc_kind"] == "xing":
+        # Entry i: byte position (in 1/256ths of the stream) at i percent of the time
+        for i, position in enumerate(toc):
+            times.append(duration * i / 100)
+            offsets.append(start + position * audio_bytes // 256)
+    elif info["toc_kind"] == "vbri":
+        header = info["header"]
+        entry_time = info["vbri_frames_per_entry"] * header["samples_per_frame"] / header["sample_rate"]
+        offset = start
+        times.append(0.0)
+        offsets.append(offset)
+        for i, entry_bytes in enumerate(toc[:-1], 1):
+            offset += entry_bytes
+            times.append(i * entry_time)
+            offsets.append(offset)
+    elif info["header"]["bitrate"]:
+        byte_rate = info["header"]["bitrate"] / 8
+        t = 0.0
+        while t < duration:
+            times.append(t)
+            offsets.append(start + int(t * byte_rate))
+            t += POINT_SPACING
+    else:
+        return None
+    return SeekTable(times, offsets)
+
+
+def _adts_table(f, file_size):
+    _skip_id3v2(f)
+    times = []
+    offsets = []
+    samples_before = 0
+    next_time = 0.0
+    for offset, sample_rate, samples in iter_adts_frames(f):
+        time = samples_before / sample_rate
+        if time >= next_time:
+            times.append(time)
+            offsets.append(offset)
+            next_time = time + POINT_SPACING
+        samples_before += samples
+    if not times:
+        return None
+    return SeekTable(times, offsets)
+
+
+# Only formats whose every frame carries its own header: a stream spliced in
+# at a seek point plays from that point's time. FLAC and Ogg decoders seek by
+# themselves (set_pos, or play's start), so they need no table.
+_BUILDERS = {
+    '.mp3': _mp3_table,
+    '.aac': _adts_table,
+}
+
+
+def has_seek_table_format(file_path):
+    """Whether seek tables are built for a file's format"""
+    return os.path.splitext(file_path)[1].lower() in _BUILDERS
+
+
+def build_seek_table(file_path):
+    """Read a file's seek table, or None if the format has none"""
+    builder = _BUILDERS.get(os.path.splitext(file_path)[1].lower())
+    if builder is None:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            return builder(f, os.fstat(f.fileno()).st_size)
+    except (OSError, struct.error, IndexError, ValueError, ZeroDivisionError):
+        return None
+
+
+class SeekTableCache:
+    """LRU of seek tables in front of the library's copies, rebuilt only when a file changes"""
+
+    def __init__(self, capacity=32, library=None):
+        self.capacity = capacity
+        self.tables = OrderedDict()   # path -> (identity, table or None)
+        self.lock = threading.Lock()
+        self._library = library
+
+    @property
+    def library(self):
+        if self._library is None:
+            from library import get_library
+            self._library = get_library()
+        return self._library
+
+    def get(self, file_path):
+        if not has_seek_table_format(file_path):
+            return None
+        identity = file_identity(file_path)
+        with self.lock:
+            cached = self.tables.get(file_path)
+            if cached is not None and cached[0] == identity:
+                self.tables.move_to_end(file_path)
+                return cached[1]
+
+        table = self._load(file_path, identity)
+        with self.lock:
+            self.tables[file_path] = (identity, table)
+            self.tables.move_to_end(file_path)
+            while len(self.tables) > self.capacity:
+                self.tables.popitem(last=False)
+        return table
+
+    def _load(self, file_path, identity):
+        """The stored table if it is current, else a freshly built (and stored) one"""
+        if identity is None:
+            return build_seek_table(file_path)
+        stored = self.library.get_seek_table(file_path, identity)
+        if stored is not None:
+            times_blob, offsets_blob, header = stored
+            if times_blob is None:
+                # Known to have no usable table
+                return None
+            times = array('d')
+            times.frombytes(times_blob)
+            offsets = array('Q')
+            offsets.frombytes(offsets_blob)
+            return SeekTable(times, offsets, header)
+
+        table = build_seek_table(file_path)
+        if table is None:
+            self.library.store_seek_table(file_path, identity, None, None, (0, 0))
+        else:
+            self.library.store_seek_table(file_path, identity, table.times.tobytes(),
+                                          table.offsets.tobytes(), table.header)
+        return table
+
+
+class SplicedFile(io.RawIOBase):
+    """Read-only file made of byte ranges of another file, back to back"""
+
+    def __init__(self, file_path, ranges):
+        super().__init__()
+        self.f = open(file_path, 'rb')
+        self.ranges = [(start, end) for start, end in ranges if end > start]
+        self.size = sum(end - start for start, end in self.ranges)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        wanted = len(buffer)
+        filled = 0
+        skip = self.position
+        for start, end in self.ranges:
+            length = end - start
+            if skip >= length:
+                skip -= length
+                continue
+            self.f.seek(start + skip)
+            data = self.f.read(min(length - skip, wanted - filled))
+            buffer[filled:filled + len(data)] = data
+            filled += len(data)
+            skip = 0
+            if filled == wanted or not data:
+                break
+        self.position += filled
+        return filled
+
+    def close(self):
+        if not self.closed:
+            self.f.close()
+        super().close()
+
+
+def open_at(file_path, table, seconds):
+    """Open a stream that starts playing at the seek point for a time.
+
+    Returns (file object, time the stream starts at).
+    """
+    point_time, offset = table.find(seconds)
+    file_size = os.path.getsize(file_path)
+    return SplicedFile(file_path, [table.header, (offset, file_size)]), point_time
+
+
+_tables = None
+
+
+def get_seek_tables():
+    """Get the shared SeekTableCache"""
+    global _tables
+    if _tables is None:
+        _tables = SeekTableCache()
+    return _tables
@@ -0,0 +1,206 @@
+"""Shuffled play order drawn lazily over a queue that keeps its own order.
+
+The queue is never reordered. Its entries are rows of the queue's
+TrackTable, and a shuffle round is a Fisher-Yates shuffle of those rows
+done one step at a time: slots [0, drawn) hold the rows already played this
+round and a draw swaps a random slot from the rest to the front. Only slots
+that differ from the identity are stored, so a step is O(1) and a round
+costs memory in proportion to the tracks played, not the queue's length.
+Entries added later join the undrawn part; removed ones are dropped when a
+draw lands on them.
+
+Drawn entries wait in `upcoming` (so the next track stays the same until it
+plays), and the entries played before the current one are kept in `history`
+for Back, which puts the current entry back at the front of `upcoming`.
+With `spread` set to 'folder' or 'artist' a draw is retried a few times when
+it lands on the same folder (or artist) as the tracks just before it.
+Artists are compared where both tracks' tags are known, looked up in the
+library cache (`lookup_metadata`) for entries that haven't played yet;
+otherwise the folders are.
+"""
+import random
+from collections import deque
+from itertools import islice
+
+HISTORY_LIMIT = 1000   # Entries remembered for Back
+SPREAD_TRIES = 8       # Redraws allowed to get away from the recent folders/artists
+SPREAD_RECENT = 2      # How many preceding tracks a draw should differ from
+
+
+class ShuffleOrder:
+    """Lazily drawn random order over a PlayQueue, with a history for Back"""
+
+    def __init__(self, queue, rng=random):
+        self.queue = queue
+        self.rng = rng
+        self.spread = None   # None, 'folder' or 'artist'
+        self.lookup_metadata = None   # paths -> {path: metadata} for the tags of unplayed entries
+        self.history = deque(maxlen=HISTORY_LIMIT)
+        self.upcoming = deque()
+        self.new_round()
+
+    # ---- rounds ----
+
+    def new_round(self):
+        """Make every entry undrawn again (the history stays)"""
+        self.base = self.queue.tracks.base
+        self.drawn = 0
+        self.slots = {}    # slot -> row, where it isn't the identity
+        self.rows = {}     # row -> slot, the inverse of slots
+        self.upcoming.clear()
+
+    def start(self):
+        """Begin shuffling from the current entry, which counts as played"""
+        self.history.clear()
+        self.new_round()
+        self.played(self.queue.current_id)
+
+    def _check_queue(self):
+        # clear()/replace() hand out a new range of IDs; nothing old is valid
+        if self.queue.tracks.base != self.base:
+            self.history.clear()
+            self.new_round()
+
+    # ---- the permutation ----
+
+    def _take(self, slot):
+        """Swap the row at an undrawn slot to the front of the undrawn part"""
+        first = self.drawn
+        row = self.slots.pop(slot, slot)
+        self.rows.pop(row, None)
+        if slot != first:
+            first_row = self.slots.pop(first, first)
+            self.slots[slot] = first_row
+            self.rows[first_row] = slot
+        self.drawn += 1
+
+    def _slot_of(self, entry_id):
+        """Undrawn slot holding an entry, None if it was drawn this round"""
+        row = entry_id - self.base
+        slot = self.rows.get(row, row)
+        if self.drawn <= slot < self.queue.tracks.next_id - self.base and self.slots.get(slot, slot) == row:
+            return slot
+        return None
+
+    def _draw(self):
+        """Take a random undrawn entry, None when the round is over"""
+        queue = self.queue
+        recent = self._recent_groups() if self.spread else ()
+        tries = 0
+        while True:
+            size = queue.tracks.next_id - self.base
+            if self.drawn >= size:
+                return None
+            slot = self.rng.randrange(self.drawn, size)
+            entry_id = self.slots.get(slot, slot) + self.base
+            if entry_id not in queue:
+                # Removed from the queue: it leaves the round for good
+                self._take(slot)
+                continue
+            if tries < SPREAD_TRIES and recent and self._clashes(self.group(entry_id), recent):
+                tries += 1
+                continue
+            self._take(slot)
+            return entry_id
+
+    # ---- spreading ----
+
+    def group(self, entry_id):
+        """What spreading keeps apart: (folder, artist), the artist None unless spreading by artist and known"""
+        folder = self.queue.tracks.split(entry_id)[0]
+        if self.spread == 'artist':
+            return folder, self.artist_of(entry_id)
+        return folder, None
+
+    def artist_of(self, entry_id):
+        """An entry's artist from its recorded tags or the library cache, None if unknown"""
+        queue = self.queue
+        if not queue.tracks.has_metadata(entry_id) and self.lookup_metadata is not None:
+            path = queue.path_of(entry_id)
+            metadata = self.lookup_metadata([path]).get(path)
+            if metadata is not None:
+                queue.set_metadata(entry_id, metadata)
+        return queue.metadata_of(entry_id)['artist'] or None
+
+    def _recent_groups(self):
+        recent = list(islice(reversed(self.upcoming), SPREAD_RECENT))
+        if len(recent) < SPREAD_RECENT and self._live(self.queue.current_id):
+            recent.append(self.queue.current_id)
+        recent += islice(reversed(self.history), SPREAD_RECENT - len(recent))
+        return [self.group(entry_id) for entry_id in recent if self._live(entry_id)]
+
+    @staticmethod
+    def _clashes(group, recent):
+        """Whether a draw's group matches a recent one: by artist where both are known, else by folder"""
+        folder, artist = group
+        for recent_folder, recent_artist in recent:
+            if artist and recent_artist:
+                if artist == recent_artist:
+                    return True
+            elif folder == recent_folder:
+                return True
+        return False
+
+    def _live(self, entry_id):
+        return entry_id is not None and entry_id in self.queue
+
+    # ---- moving through the order ----
+
+    def peek(self, count=1):
+        """The next `count` entry IDs (fewer at the end of the round), drawn as needed"""
+        self._check_queue()
+        queue = self.queue
+        if any(entry_id not in queue for entry_id in self.upcoming):
+            self.upcoming = deque(entry_id for entry_id in self.upcoming if entry_id in queue)
+        while len(self.upcoming) < count:
+            entry_id = self._draw()
+            if entry_id is None:
+                break
+            self.upcoming.append(entry_id)
+        return list(islice(self.upcoming, count))
+
+    def advance(self):
+        """Move on: the current entry goes on the history, return the next one (or None)"""
+        if not self.peek():
+            return None
+        self.push_history(self.queue.current_id)
+        return self.upcoming.popleft()
+
+    def back(self):
+        """Step back to the entry played before the current one, None if there is none"""
+        self._check_queue()
+        queue = self.queue
+        current_id = queue.current_id
+        while self.history:
+            entry_id = self.history.pop()
+            if entry_id != current_id and entry_id in queue:
+                if self._live(current_id):
+                    if current_id in self.upcoming:
+                        self.upcoming.remove(current_id)
+                    self.upcoming.appendleft(current_id)
+                return entry_id
+        return None
+
+    def play_next(self, entry_ids):
+        """Entries to play right after the current one, in this order"""
+        self._check_queue()
+        for entry_id in reversed(entry_ids):
+            self.played(entry_id)
+            self.upcoming.appendleft(entry_id)
+
+    def push_history(self, entry_id):
+        """Remember an entry that was played (and is being left)"""
+        if self._live(entry_id) and (not self.history or self.history[-1] != entry_id):
+            self.history.append(entry_id)
+
+    def played(self, entry_id):
+        """An entry started playing: it doesn't come up again this round"""
+        self._check_queue()
+        if not self._live(entry_id):
+            return
+        if entry_id in self.upcoming:
+            self.upcoming.remove(entry_id)
+            return
+        slot = self._slot_of(entry_id)
+        if slot is not None:
+            self._take(slot)
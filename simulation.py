@@ -0,0 +1,220 @@
+"""Run the playback engine on virtual time with a simulated mixer.
+
+A VirtualClock is both the engine's scheduler and its monotonic clock, and
+time only passes when the clock is advanced. SimulatedMixer plays tracks of
+known length on that clock the way pygame.mixer.music does: a track ends
+exactly when its length has played, a queued track takes over at that
+moment, end events are posted (and handed to on_end) when a track runs
+out, get_pos counts played milliseconds and load() drops the queue. Nothing touches files or an audio device, so hours
+of listening run in milliseconds and every run with the same script is the
+same. benchmarks/simulate.py drives long scripted sessions with it.
+"""
+import heapq
+
+from library import METADATA_FIELDS
+
+
+class SimulatedMixerError(Exception):
+    """Raised where pygame would raise pygame.error"""
+
+
+class VirtualClock:
+    """Scheduler (call_later/cancel) and monotonic clock on virtual time"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.timers = []  # Heap of [due, sequence, callback]
+        self.sequence = 0
+
+    def monotonic(self):
+        return self.now
+
+    def call_later(self, seconds, callback):
+        self.sequence += 1
+        timer = [self.now + max(0.0, seconds), self.sequence, callback]
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def cancel(self, handle):
+        # Cancelled timers stay in the heap and are skipped when due
+        handle[2] = None
+
+    def call_soon_threadsafe(self, callback):
+        # Everything runs on the one thread that advances the clock
+        self.call_later(0, callback)
+
+    def advance(self, seconds):
+        """Let `seconds` of virtual time pass, running the timers due in it in order"""
+        self.run_until(self.now + seconds)
+
+    def run_until(self, deadline):
+        while self.timers and self.timers[0][0] <= deadline:
+            due, _, callback = heapq.heappop(self.timers)
+            if callback is None:
+                continue
+            self.now = max(self.now, due)
+            callback()
+        self.now = max(self.now, deadline)
+
+
+class SimulatedMixer:
+    """Stands in for PygameMixer: plays tracks of known length on a VirtualClock"""
+
+    error = SimulatedMixerError
+
+    def __init__(self, clock, durations, events_available=True):
+        self.clock = clock
+        self.durations = durations  # source -> seconds; other sources can't be loaded
+        self.events_available = events_available
+        self.started = True
+        self.volume = 1.0
+        self.source = None
+        self.queued = None
+        self.playing = False   # Playing or paused, until stopped or the track ran out
+        self.paused = False
+        self.position = 0.0    # Seconds into the current track
+        self.played = 0.0      # Seconds played since play(), what get_pos reports
+        self.synced = clock.now
+        self.end_events = 0
+        self.end_job = None
+        # Called as (finished source, source that took over or None, virtual time) when a track ends
+        self.on_track_end = None
+        # Called when an end event is posted, as PygameMixer's waiter thread does
+        self.on_end = None
+
+    def start(self):
+        pass
+
+    def _sync(self):
+        """Move the play position up to the clock"""
+        now = self.clock.now
+        if self.playing and not self.paused:
+            elapsed = now - self.synced
+            self.position += elapsed
+            self.played += elapsed
+        self.synced = now
+
+    def _schedule_end(self):
+        if self.end_job is not None:
+            self.clock.cancel(self.end_job)
+            self.end_job = None
+        if self.playing and not self.paused:
+            remaining = self.durations[self.source] - self.position
+            self.end_job = self.clock.call_later(remaining, self._track_end)
+
+    def _track_end(self):
+        self.end_job = None
+        self._sync()
+        finished = self.source
+        if self.queued is not None:
+            self.source, self.queued = self.queued, None
+            self.position = 0.0
+        else:
+            self.position = self.durations[finished]
+            self.playing = False
+        self._schedule_end()
+        if self.on_track_end is not None:
+            self.on_track_end(finished, self.source if self.playing else None, self.clock.now)
+        if self.events_available:
+            self.end_events += 1
+            if self.on_end is not None:
+                self.on_end()
+
+    def _check_source(self, source):
+        if not isinstance(source, str) or source not in self.durations:
+            raise SimulatedMixerError(f"Unable to open {source!r}")
+
+    def load(self, source, namehint=None):
+        self._check_source(source)
+        self._sync()
+        self.source = source
+        self.queued = None
+        self.playing = False
+        self.paused = False
+        self.position = 0.0
+        self._schedule_end()
+
+    def play(self, start=0.0):
+        if self.source is None:
+            raise SimulatedMixerError("music not loaded")
+        self._sync()
+        self.playing = True
+        self.paused = False
+        self.position = min(max(start, 0.0), self.durations[self.source])
+        self.played = 0.0
+        self._schedule_end()
+
+    def queue(self, source):
+        self._check_source(source)
+        self.queued = source
+
+    def stop(self):
+        # Like PygameMixer, stopping doesn't post an end event
+        self._sync()
+        self.playing = False
+        self.paused = False
+        self.queued = None
+        self._schedule_end()
+
+    def pause(self):
+        self._sync()
+        if self.playing:
+            self.paused = True
+        self._schedule_end()
+
+    def unpause(self):
+        self._sync()
+        self.paused = False
+        self._schedule_end()
+
+    def set_volume(self, fraction):
+        self.volume = fraction
+
+    def set_pos(self, seconds):
+        self._sync()
+        if not self.playing:
+            raise SimulatedMixerError("music is not playing")
+        self.position = min(max(seconds, 0.0), self.durations[self.source])
+        self._schedule_end()
+
+    def get_busy(self):
+        self._sync()
+        return self.playing and not self.paused
+
+    def get_pos(self):
+        self._sync()
+        return int(self.played * 1000) if self.playing else -1
+
+    def ended(self):
+        ended = self.end_events > 0
+        self.end_events = 0
+        return ended
+
+    def clear_end_events(self):
+        self.end_events = 0
+
+
+class SimulatedMetadata:
+    """Metadata pipeline answering from the known durations, without reading files"""
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.artwork_sink = None
+        self.library = None
+
+    def get(self, file_path):
+        metadata = dict.fromkeys(METADATA_FIELDS)
+        metadata['duration'] = self.durations.get(file_path, 0)
+        return metadata
+
+
+def simulated_engine(durations, events_available=True):
+    """A PlayerEngine on virtual time: returns (engine, clock, mixer)"""
+    from engine import PlayerEngine
+    clock = VirtualClock()
+    mixer = SimulatedMixer(clock, durations, events_available)
+    engine = PlayerEngine(clock, mixer=mixer, metadata=SimulatedMetadata(durations),
+                          transcoder=False, monotonic=clock.monotonic)
+    # Loudness analysis would start worker processes
+    engine.normalize = False
+    return engine, clock, mixer
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Keep the player's caches away from the user's; set before its modules load
+os.environ['LANDPLAYER_HOME'] = tempfile.mkdtemp(prefix='landplayer-test-')
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+import os
+
+from artcache import ArtCache, MIN_FILE_BYTES
+
+
+class CountingLoader:
+    """Artwork loader for files without art, counting the reads"""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __call__(self, file_path):
+        self.reads += 1
+        return None
+
+
+def make_cache(loader, **options):
+    cache = ArtCache(workers=1, artwork_loader=loader, **options)
+    # Let the startup trim finish
+    cache.pool.submit(lambda: None).result()
+    return cache
+
+
+def test_no_art_marker_is_rechecked_once_the_folder_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv('LANDPLAYER_HOME', str(tmp_path / "home"))
+    album = tmp_path / "album"
+    album.mkdir()
+    track = album / "track.mp3"
+    track.write_bytes(b'\0' * 1000)
+    loader = CountingLoader()
+
+    assert make_cache(loader).fetch(str(track)) is None
+    assert loader.reads == 1
+    # A new session finds the marker and doesn't read the file
+    assert make_cache(loader).fetch(str(track)) is None
+    assert loader.reads == 1
+
+    (album / "cover.jpg").write_bytes(b'jpeg')
+    os.utime(album, ns=(1, os.stat(album).st_mtime_ns + 1_000_000_000))
+    assert make_cache(loader).fetch(str(track)) is None
+    assert loader.reads == 2
+    # The rewritten marker holds again
+    assert make_cache(loader).fetch(str(track)) is None
+    assert loader.reads == 2
+
+
+def test_disk_cache_is_trimmed_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setenv('LANDPLAYER_HOME', str(tmp_path / "home"))
+    art_dir = tmp_path / "home" / "art"
+    art_dir.mkdir(parents=True)
+    for i in range(10):
+        path = art_dir / f"{i:02d}.png"
+        path.write_bytes(b'\0' * MIN_FILE_BYTES)
+        os.utime(path, ns=(i * 1_000_000_000, i * 1_000_000_000))
+    # Used recently, so it outlives newer files
+    os.utime(art_dir / "00.png", ns=(100_000_000_000, 100_000_000_000))
+
+    cache = make_cache(CountingLoader(), disk_limit=6 * MIN_FILE_BYTES)
+    left = sorted(os.listdir(art_dir))
+    assert left == ["00.png", "07.png", "08.png", "09.png"]
+    assert cache.disk_used == 4 * MIN_FILE_BYTES
+
+    # Storing past the limit trims again
+    album = tmp_path / "album"
+    album.mkdir()
+    for i in range(3):
+        track = album / f"track{i}.mp3"
+        track.write_bytes(bytes([i]) * 1000)
+        cache.fetch(str(track))
+    assert cache.disk_used <= 6 * MIN_FILE_BYTES
+    assert len(os.listdir(art_dir)) <= 6
+    assert "07.png" not in os.listdir(art_dir)
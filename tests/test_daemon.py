@@ -0,0 +1,65 @@
+import socket
+import asyncio
+import threading
+
+import pytest
+
+from daemon import AsyncioScheduler, ControlServer, send_command
+from engine import PlayerEngine
+from simulation import SimulatedMetadata, SimulatedMixer, VirtualClock
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix domain sockets")
+
+
+def start_daemon(socket_path, durations):
+    """Run an engine and control server on an event loop thread, as run_daemon does"""
+    loop = asyncio.new_event_loop()
+    # The simulated mixer's own clock never moves, so tracks just stay playing
+    mixer = SimulatedMixer(VirtualClock(), durations)
+    engine = PlayerEngine(AsyncioScheduler(loop), mixer=mixer, metadata=SimulatedMetadata(durations),
+                          transcoder=False)
+    # Loudness analysis would start worker processes
+    engine.normalize = False
+    server = ControlServer(engine, socket_path)
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True)
+    thread.start()
+    return engine, thread
+
+
+def wait_for_socket(socket_path):
+    for _ in range(200):
+        try:
+            return send_command('status', path=socket_path)
+        except OSError:
+            threading.Event().wait(0.01)
+    raise AssertionError("daemon didn't start")
+
+
+def test_commands_round_trip_over_the_socket(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.mp3"
+        path.write_bytes(b'\0')
+        files.append(str(path))
+    socket_path = str(tmp_path / "player.sock")
+    engine, thread = start_daemon(socket_path, {path: 120.0 for path in files})
+
+    response = wait_for_socket(socket_path)
+    assert response['ok'] and response['status']['state'] == "stopped"
+
+    response = send_command('enqueue', files, path=socket_path)
+    assert response['ok'] and response['result'] == 3
+    status = response['status']
+    assert (status['state'], status['file'], status['queue_length']) == ("playing", files[0], 3)
+    assert status['duration'] == 120.0
+
+    status = send_command('next', path=socket_path)['status']
+    assert (status['index'], status['file']) == (1, files[1])
+    assert send_command('loop', ['queue'], path=socket_path)['status']['loop'] == "queue"
+
+    response = send_command('frobnicate', path=socket_path)
+    assert not response['ok'] and "Unknown command" in response['error']
+
+    assert send_command('quit', path=socket_path)['ok']
+    thread.join(5)
+    assert not thread.is_alive()
@@ -0,0 +1,26 @@
+from engine import PlayerEngine
+from enginethread import EngineThread
+from simulation import SimulatedMetadata, SimulatedMixer, VirtualClock
+
+DURATIONS = {"/sim/a.mp3": 200.0, "/sim/b.mp3": 100.0}
+
+
+def simulated_factory(scheduler):
+    # The simulated mixer's own clock never moves, so tracks just stay playing
+    engine = PlayerEngine(scheduler, mixer=SimulatedMixer(VirtualClock(), DURATIONS),
+                          metadata=SimulatedMetadata(DURATIONS), transcoder=False)
+    engine.normalize = False
+    return engine
+
+
+def test_a_failing_command_is_logged_with_its_traceback_and_the_thread_goes_on(capsys):
+    worker = EngineThread(simulated_factory).start()
+    worker.post('add_files', list(DURATIONS))
+    worker.post('play_index')  # Missing its argument
+    worker.post('next_track')
+    worker.stop()
+    assert not worker.thread.is_alive()
+    assert worker.engine.current_file == "/sim/b.mp3"
+    out = capsys.readouterr().out
+    assert "Error in playback engine:\nTraceback (most recent call last):" in out
+    assert "TypeError" in out
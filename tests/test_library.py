@@ -0,0 +1,71 @@
+import os
+
+from appdata import file_identity
+from library import Library
+
+
+def touch(path, data=b'\0'):
+    path.write_bytes(data)
+    return str(path)
+
+
+def set_folder_mtime(folder, seconds):
+    os.utime(folder, ns=(seconds * 1_000_000_000, seconds * 1_000_000_000))
+
+
+def test_rescan_picks_up_added_and_removed_files(tmp_path):
+    library = Library(str(tmp_path / "library.db"))
+    album = tmp_path / "album"
+    (album / "disc2").mkdir(parents=True)
+    first = touch(album / "01.mp3")
+    second = touch(album / "02.flac")
+    touch(album / "notes.txt")
+    set_folder_mtime(album, 1000)
+
+    files, subdirs = library.scan_folder(str(album))
+    assert files == [first, second]
+    assert subdirs == [str(album / "disc2")]
+
+    os.remove(first)
+    third = touch(album / "03.ogg")
+    set_folder_mtime(album, 2000)
+    assert library.scan_folder(str(album)) == ([second, third], [str(album / "disc2")])
+    # A fresh connection reads the same index
+    library.close()
+    assert Library(str(tmp_path / "library.db")).list_folder(str(album)) == [second, third]
+
+
+def test_unchanged_folder_is_served_from_the_index(tmp_path):
+    library = Library(str(tmp_path / "library.db"))
+    album = tmp_path / "album"
+    album.mkdir()
+    first = touch(album / "01.mp3")
+    set_folder_mtime(album, 1000)
+    assert library.list_folder(str(album)) == [first]
+
+    # A file slipped in without the folder's mtime changing isn't listed until it does
+    second = touch(album / "02.mp3")
+    set_folder_mtime(album, 1000)
+    assert library.list_folder(str(album)) == [first]
+    set_folder_mtime(album, 1001)
+    assert library.list_folder(str(album)) == [first, second]
+
+
+def test_rescan_keeps_metadata_of_unchanged_files_only(tmp_path):
+    library = Library(str(tmp_path / "library.db"))
+    album = tmp_path / "album"
+    album.mkdir()
+    kept = touch(album / "01.mp3")
+    edited = touch(album / "02.mp3")
+    set_folder_mtime(album, 1000)
+    library.scan_folder(str(album))
+    library.store_metadata(kept, file_identity(kept), {'duration': 180.0, 'title': "Kept"})
+    library.store_metadata(edited, file_identity(edited), {'duration': 200.0, 'title': "Edited"})
+
+    touch(album / "02.mp3", b'\0' * 10)
+    touch(album / "03.mp3")
+    set_folder_mtime(album, 2000)
+    library.scan_folder(str(album))
+    assert library.get_metadata(kept)['title'] == "Kept"
+    # The edited file has to be read again
+    assert library.get_metadata(edited) is None
@@ -0,0 +1,54 @@
+import math
+import wave
+from array import array
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from loudness import REFERENCE_LOUDNESS, analyze_file, gain_factor, numpy_available
+
+RATE = 48000
+
+
+def write_sine(path, peak_dbfs, seconds=5.0, frequency=1000.0):
+    """A stereo sine with the same peak level in both channels"""
+    amplitude = 10 ** (peak_dbfs / 20) * 32767
+    samples = array('h')
+    for n in range(int(RATE * seconds)):
+        value = round(amplitude * math.sin(2 * math.pi * frequency * n / RATE))
+        samples.extend((value, value))
+    with wave.open(str(path), 'wb') as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(RATE)
+        out.writeframes(samples.tobytes())
+    return str(path)
+
+
+def test_numpy_is_found():
+    assert numpy_available()
+
+
+@pytest.mark.parametrize('peak_dbfs', [-23.0, -10.0])
+def test_sine_measures_at_its_level(tmp_path, peak_dbfs):
+    # A 1 kHz sine in both channels reads its peak level in LUFS (EBU Tech 3341, case 1)
+    result = analyze_file(write_sine(tmp_path / "sine.wav", peak_dbfs))
+    assert result['source'] == 'analysis'
+    assert result['loudness'] == pytest.approx(peak_dbfs, abs=0.1)
+    assert result['gain'] == pytest.approx(REFERENCE_LOUDNESS - peak_dbfs, abs=0.1)
+    assert result['peak'] == pytest.approx(10 ** (peak_dbfs / 20), rel=0.01)
+
+
+def test_silence_has_no_loudness(tmp_path):
+    assert analyze_file(write_sine(tmp_path / "silence.wav", -200.0, seconds=2.0)) is None
+
+
+def test_gain_factor():
+    # -8 dB quieter
+    assert gain_factor(-8.0, 0.3) == pytest.approx(0.398, abs=0.001)
+    # The mixer can't make a track louder
+    assert gain_factor(5.0, 0.07) == 1.0
+    # A peak above full scale lowers the gain so it doesn't clip
+    assert gain_factor(-3.0, 2.0) == pytest.approx(0.5, abs=0.001)
+    assert gain_factor(-3.0, None) == pytest.approx(0.708, abs=0.001)
@@ -0,0 +1,124 @@
+import struct
+
+import pytest
+
+from library import Library
+import metadata
+from metadata import MetadataPipeline, read_metadata
+from probe import DurationCache
+
+SAMPLE_RATE = 44100
+SECONDS = 10
+
+
+def flac_block(block_type, data, last=False):
+    return bytes([block_type | (0x80 if last else 0)]) + len(data).to_bytes(3, 'big') + data
+
+
+def streaminfo():
+    """A STREAMINFO block body for SECONDS of 16-bit stereo"""
+    packed = (SAMPLE_RATE << 44) | (1 << 41) | (15 << 36) | (SAMPLE_RATE * SECONDS)
+    return struct.pack('>HH', 4096, 4096) + bytes(6) + packed.to_bytes(8, 'big') + bytes(16)
+
+
+def picture(picture_type, data):
+    from mutagen.flac import Picture
+    pic = Picture()
+    pic.type = picture_type
+    pic.mime = 'image/jpeg'
+    pic.data = data
+    return pic
+
+
+def write_flac(path, pictures=()):
+    blocks = [flac_block(0, streaminfo(), last=not pictures)]
+    for i, pic in enumerate(pictures):
+        blocks.append(flac_block(6, pic.write(), last=i == len(pictures) - 1))
+    path.write_bytes(b'fLaC' + b''.join(blocks))
+    return str(path)
+
+
+def write_ogg_vorbis(path, comments):
+    from mutagen.ogg import OggPage
+    from mutagen._vorbis import VComment
+    ident = (b'\x01vorbis' + struct.pack('<IBIiiiB', 0, 2, SAMPLE_RATE, 0, 128000, 0, 0xb8) + b'\x01')
+    comment = VComment()
+    comment.vendor = 'test'
+    for key, value in comments:
+        comment.append((key, value))
+    pages = []
+    for sequence, (packets, position) in enumerate((([ident], 0),
+                                                    ([b'\x03vorbis' + comment.write(), b'\x05vorbis'], 0),
+                                                    ([b'\0' * 16], SAMPLE_RATE * SECONDS))):
+        page = OggPage()
+        page.serial = 1
+        page.sequence = sequence
+        page.packets = packets
+        page.position = position
+        page.first = sequence == 0
+        page.last = sequence == 2
+        pages.append(page.write())
+    path.write_bytes(b''.join(pages))
+    return str(path)
+
+
+def test_flac_front_cover_wins_over_other_pictures(tmp_path):
+    pytest.importorskip('mutagen')
+    path = write_flac(tmp_path / "track.flac", [picture(4, b'back'), picture(3, b'front')])
+    metadata = read_metadata(path)
+    assert metadata['artwork'] == b'front'
+    assert metadata['duration'] == pytest.approx(SECONDS)
+
+
+def test_ogg_vorbis_picture_block_and_tags(tmp_path):
+    pytest.importorskip('mutagen')
+    import base64
+    block = base64.b64encode(picture(3, b'cover').write()).decode('ascii')
+    path = write_ogg_vorbis(tmp_path / "track.ogg", [('TITLE', 'Song'), ('ARTIST', 'Band'),
+                                                     ('METADATA_BLOCK_PICTURE', block)])
+    metadata = read_metadata(path)
+    assert metadata['artwork'] == b'cover'
+    assert (metadata['title'], metadata['artist']) == ("Song", "Band")
+    assert metadata['duration'] == pytest.approx(SECONDS)
+
+
+def test_folder_image_when_nothing_is_embedded(tmp_path):
+    path = write_flac(tmp_path / "track.flac")
+    assert read_metadata(path)['artwork'] is None
+    (tmp_path / "Folder.png").write_bytes(b'folder')
+    (tmp_path / "cover.jpg").write_bytes(b'cover')
+    metadata = read_metadata(path)
+    # cover.jpg comes first, and names match whatever their case
+    assert metadata['artwork'] == b'cover'
+    assert metadata['duration'] == pytest.approx(SECONDS)
+
+
+def test_pipeline_caches_tags_and_hands_art_to_the_sink(tmp_path):
+    path = write_flac(tmp_path / "track.flac")
+    (tmp_path / "cover.jpg").write_bytes(b'cover')
+    pipeline = MetadataPipeline(library=Library(str(tmp_path / "library.db")),
+                                durations=DurationCache(str(tmp_path / "durations.jsonl")))
+    offered = []
+    pipeline.artwork_sink = lambda file_path, artwork: offered.append((file_path, artwork))
+    assert pipeline.get(path)['duration'] == pytest.approx(SECONDS)
+    assert offered == [(path, b'cover')]
+    # Served from the index now, without opening the file
+    assert pipeline.get(path)['duration'] == pytest.approx(SECONDS)
+    assert len(offered) == 1
+
+
+def test_pipeline_probes_only_durations_it_does_not_know(tmp_path, monkeypatch):
+    known = write_flac(tmp_path / "known.flac")
+    fresh = write_flac(tmp_path / "fresh.flac")
+    durations = DurationCache(str(tmp_path / "durations.jsonl"))
+    durations.put(known, 123.0)
+    probed = []
+    probe = metadata.probe_fileobj
+    monkeypatch.setattr(metadata, 'probe_fileobj', lambda f, size, path: probed.append(path) or probe(f, size, path))
+    pipeline = MetadataPipeline(library=Library(str(tmp_path / "library.db")), durations=durations)
+
+    assert pipeline.get(known)['duration'] == 123.0
+    assert pipeline.get(fresh)['duration'] == pytest.approx(SECONDS)
+    assert probed == [fresh]
+    # What was probed is in the cache file for the next run
+    assert DurationCache(str(tmp_path / "durations.jsonl")).get(fresh) == pytest.approx(SECONDS)
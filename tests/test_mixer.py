@@ -0,0 +1,65 @@
+"""PygameMixer's end events, on SDL's dummy audio and video drivers"""
+import threading
+import time
+import wave
+
+import pytest
+
+pygame = pytest.importorskip('pygame')
+
+from mixer import PygameMixer
+
+RATE = 22050
+
+
+def write_silence(path, seconds):
+    with wave.open(str(path), 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(RATE)
+        out.writeframes(b'\0\0' * int(RATE * seconds))
+    return str(path)
+
+
+@pytest.fixture
+def mixer(monkeypatch):
+    monkeypatch.setenv('SDL_AUDIODRIVER', 'dummy')
+    mixer = PygameMixer(headless=True)
+    try:
+        mixer.start()
+    except pygame.error as e:
+        pytest.skip(f"no SDL audio: {e}")
+    if not mixer.events_available:
+        pytest.skip("no mixer end events")
+    yield mixer
+    mixer.stop()
+
+
+def test_end_event_wakes_on_end_and_stopping_posts_none(mixer, tmp_path):
+    first = write_silence(tmp_path / "first.wav", 0.3)
+    second = write_silence(tmp_path / "second.wav", 0.3)
+    woken = threading.Semaphore(0)
+    mixer.on_end = woken.release
+
+    # Stopping, reloading and playing again halt the music without an end event
+    mixer.load(first)
+    mixer.play()
+    mixer.stop()
+    mixer.load(first)
+    mixer.play()
+    mixer.load(second)
+    assert not woken.acquire(timeout=0.5)
+    assert not mixer.ended()
+
+    # A queued track taking over and the last one running out each post one
+    mixer.play()
+    mixer.queue(first)
+    started = time.monotonic()
+    assert woken.acquire(timeout=5)
+    assert mixer.get_busy()
+    assert mixer.ended()
+    assert woken.acquire(timeout=5)
+    assert not mixer.get_busy()
+    assert time.monotonic() - started >= 0.5
+    assert mixer.ended()
+    assert not mixer.ended()
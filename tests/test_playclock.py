@@ -0,0 +1,129 @@
+"""The automated counterpart of benchmarks/clock_drift.py, on virtual time"""
+import random
+
+from playclock import PlaybackClock
+
+LENGTH = 600.0
+# get_pos counts whole milliseconds, so the clock may trail by just under one
+DRIFT_BOUND = 0.002
+
+
+class FakeTime:
+    """Time that only passes when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ToneMixer:
+    """Plays one synthetic track of known length on FakeTime, reporting get_pos like pygame"""
+
+    def __init__(self, time, length):
+        self.time = time
+        self.length = length
+        self.position = 0.0   # Seconds into the track
+        self.played = 0.0     # Seconds played since play()
+        self.playing = False
+        self.paused = False
+        self.synced = time.now
+
+    def _sync(self):
+        if self.playing and not self.paused:
+            elapsed = min(self.time.now - self.synced, self.length - self.position)
+            self.position += elapsed
+            self.played += elapsed
+            if self.position >= self.length:
+                self.playing = False
+        self.synced = self.time.now
+
+    def play(self, start=0.0):
+        self._sync()
+        self.position, self.played = start, 0.0
+        self.playing, self.paused = True, False
+
+    def pause(self):
+        self._sync()
+        self.paused = True
+
+    def unpause(self):
+        self._sync()
+        self.paused = False
+
+    def set_pos(self, seconds):
+        self._sync()
+        self.position = seconds
+
+    def get_busy(self):
+        self._sync()
+        return self.playing and not self.paused
+
+    def get_pos(self):
+        self._sync()
+        return int(self.played * 1000) if self.playing else -1
+
+
+class SkewedWallClock:
+    """A monotonic clock running fast, as a wall clock under load can appear to"""
+
+    def __init__(self, time, rate):
+        self.time = time
+        self.rate = rate
+
+    def __call__(self):
+        return self.time.now * self.rate
+
+
+def play_through(time, mixer, clock, rng, pause_for=30.0, seek_to=None):
+    """Poll the clock at uneven intervals through the track with a pause in the middle
+
+    Returns the largest difference seen between the clock and the mixer's play position.
+    """
+    mixer.play()
+    clock.start(0)
+    worst = 0.0
+    paused = sought = False
+    while mixer.get_busy():
+        if not paused and mixer.position >= LENGTH / 2:
+            mixer.pause()
+            clock.pause()
+            frozen = clock.position()
+            time.advance(pause_for)
+            assert clock.position() == frozen
+            mixer.unpause()
+            clock.resume()
+            paused = True
+        if seek_to is not None and not sought and mixer.position >= LENGTH / 4:
+            mixer.set_pos(seek_to)
+            clock.start(seek_to)
+            sought = True
+        worst = max(worst, abs(clock.position() - mixer.position))
+        # Polls arrive late and irregularly, as they would from a busy thread
+        time.advance(min(rng.uniform(0.001, 0.25), LENGTH - mixer.position))
+    return worst
+
+
+def test_clock_follows_the_mixer_rather_than_the_wall_clock():
+    time = FakeTime()
+    mixer = ToneMixer(time, LENGTH)
+    clock = PlaybackClock(mixer.get_pos, SkewedWallClock(time, 1.02))
+    assert play_through(time, mixer, clock, random.Random(14)) < DRIFT_BOUND
+    # The track ran to its end, and the pause didn't count as play
+    assert mixer.position == LENGTH
+    assert time.now >= LENGTH + 30.0
+
+
+def test_clock_stays_on_the_mixer_across_a_seek():
+    time = FakeTime()
+    mixer = ToneMixer(time, LENGTH)
+    clock = PlaybackClock(mixer.get_pos, SkewedWallClock(time, 0.97))
+    assert play_through(time, mixer, clock, random.Random(15), seek_to=400.0) < DRIFT_BOUND
+
+
+def test_wall_clock_fallback_when_the_mixer_counter_is_unknown():
+    time = FakeTime()
+    mixer = ToneMixer(time, LENGTH)
+    clock = PlaybackClock(lambda: -1, lambda: time.now)
+    assert play_through(time, mixer, clock, random.Random(16)) < DRIFT_BOUND
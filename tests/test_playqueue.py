@@ -0,0 +1,198 @@
+import random
+
+import pytest
+
+from playqueue import PlayQueue, BLOCK_SIZE
+
+
+class Reference:
+    """The same queue as a plain list of entry IDs"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.ids = list(queue.ids())
+        self.paths = {entry_id: queue.path_of(entry_id) for entry_id in self.ids}
+        self.current_id = queue.current_id
+
+    def check(self, rng):
+        queue = self.queue
+        assert len(queue) == len(self.ids)
+        assert list(queue.ids()) == self.ids
+        assert list(queue) == [self.paths[entry_id] for entry_id in self.ids]
+        assert queue.current_id == self.current_id
+        if self.current_id is None:
+            assert queue.current_index == -1
+        else:
+            assert queue.current_index == self.ids.index(self.current_id)
+        for position in rng.sample(range(len(self.ids)), min(20, len(self.ids))):
+            entry_id = self.ids[position]
+            assert queue.entry_id(position) == entry_id
+            assert queue.position_of(entry_id) == position
+            assert queue[position] == self.paths[entry_id]
+            assert queue.names[position] == self.paths[entry_id].rsplit('/', 1)[1]
+
+
+def random_paths(rng, count, pool=50):
+    # A small pool, so the same file shows up many times
+    return [f"/music/album{n % 7}/track{n}.mp3" for n in (rng.randrange(pool) for _ in range(count))]
+
+
+def apply_random_edit(queue, reference, rng):
+    ids = reference.ids
+    size = len(ids)
+    kind = rng.choice(('append', 'extend', 'insert', 'insert_paths', 'pop', 'remove_id', 'remove_ids',
+                       'move', 'move_ids', 'set_current', 'shuffle'))
+    if kind == 'append':
+        path = random_paths(rng, 1)[0]
+        entry_id = queue.append(path)
+        ids.append(entry_id)
+        reference.paths[entry_id] = path
+    elif kind == 'extend':
+        paths = random_paths(rng, rng.choice((1, 10, BLOCK_SIZE + 3)))
+        new_ids = queue.extend(paths)
+        ids.extend(new_ids)
+        reference.paths.update(zip(new_ids, paths))
+    elif kind == 'insert':
+        position = rng.randint(-size - 2, size + 2)
+        path = random_paths(rng, 1)[0]
+        entry_id = queue.insert(position, path)
+        ids.insert(position, entry_id)
+        reference.paths[entry_id] = path
+    elif kind == 'insert_paths':
+        position = rng.randint(0, size)
+        paths = random_paths(rng, rng.choice((1, 5, 2 * BLOCK_SIZE)))
+        new_ids = queue.insert_paths(position, paths)
+        ids[position:position] = new_ids
+        reference.paths.update(zip(new_ids, paths))
+    elif not size:
+        return
+    elif kind == 'pop':
+        position = rng.randrange(-size, size)
+        entry_id = ids.pop(position)
+        assert queue.pop(position) == reference.paths.pop(entry_id)
+        if entry_id == reference.current_id:
+            reference.current_id = None
+    elif kind == 'remove_id':
+        entry_id = rng.choice(ids)
+        ids.remove(entry_id)
+        assert queue.remove_id(entry_id) == reference.paths.pop(entry_id)
+        if entry_id == reference.current_id:
+            reference.current_id = None
+    elif kind == 'remove_ids':
+        doomed = set(rng.sample(ids, min(rng.choice((1, 3, size // 2 + 1, size)), size)))
+        removed = queue.remove_ids(doomed)
+        assert sorted(removed) == sorted(reference.paths.pop(entry_id) for entry_id in doomed)
+        ids[:] = [entry_id for entry_id in ids if entry_id not in doomed]
+        if reference.current_id in doomed:
+            reference.current_id = None
+    elif kind == 'move':
+        source, destination = rng.randrange(size), rng.randrange(size + 3)
+        entry_id = ids.pop(source)
+        ids.insert(min(destination, len(ids)), entry_id)
+        assert queue.move(source, destination) == entry_id
+    elif kind == 'move_ids':
+        moving = rng.sample(ids, min(rng.choice((1, 4, size // 2 + 1)), size))
+        destination = rng.randint(0, size)
+        moved = set(moving)
+        rest = [entry_id for entry_id in ids if entry_id not in moved]
+        destination_in_rest = min(destination, len(rest))
+        ids[:] = rest[:destination_in_rest] + moving + rest[destination_in_rest:]
+        queue.move_ids(moving, destination)
+    elif kind == 'set_current':
+        position = rng.randint(-1, size)
+        queue.set_current(position)
+        reference.current_id = ids[position] if 0 <= position < size else None
+    elif kind == 'shuffle':
+        before = sorted(ids)
+        queue.shuffle(rng)
+        ids[:] = list(queue.ids())
+        # Same entries, same current entry, by identity
+        assert sorted(ids) == before
+
+
+@pytest.mark.parametrize('size, edits', [(0, 300), (5, 300), (3 * BLOCK_SIZE, 300), (20_000, 60)])
+def test_random_edits_match_a_plain_list(size, edits):
+    rng = random.Random(size)
+    queue = PlayQueue(random_paths(rng, size))
+    if size:
+        queue.set_current(size // 2)
+    reference = Reference(queue)
+    for _ in range(edits):
+        apply_random_edit(queue, reference, rng)
+        reference.check(rng)
+
+
+def test_duplicates_are_separate_entries():
+    queue = PlayQueue(["/a/x.mp3", "/a/y.mp3", "/a/x.mp3", "/a/x.mp3"])
+    queue.set_current(2)
+    current_id = queue.current_id
+    queue.pop(0)
+    queue.move(0, 2)
+    assert list(queue) == ["/a/x.mp3", "/a/x.mp3", "/a/y.mp3"]
+    # Still the same copy of x.mp3, now first
+    assert queue.current_id == current_id
+    assert queue.current_index == 0
+
+
+def test_current_entry_is_tracked_through_its_own_moves_and_removal():
+    queue = PlayQueue([f"/a/{n}.mp3" for n in range(3 * BLOCK_SIZE)])
+    queue.set_current(10)
+    current_id = queue.current_id
+    # Into another block, then to the front, with edits around it
+    queue.move(10, 2 * BLOCK_SIZE)
+    assert queue.current_index == 2 * BLOCK_SIZE
+    queue.insert(0, "/b/new.mp3")
+    queue.pop(-1)
+    assert queue.current_index == 2 * BLOCK_SIZE + 1
+    queue.move(queue.current_index, 0)
+    assert queue.current_id == current_id and queue.current_index == 0
+    assert queue[0] == "/a/10.mp3"
+    # Removing it leaves no current entry, even with the same file still queued
+    queue.append("/a/10.mp3")
+    queue.remove_id(current_id)
+    assert queue.current_id is None
+    assert queue.current_index == -1
+    assert queue[-1] == "/a/10.mp3"
+
+
+def test_clear_and_replace_never_reuse_ids():
+    queue = PlayQueue(["/a/1.mp3", "/a/2.mp3"])
+    old_ids = list(queue.ids())
+    queue.set_current(1)
+    queue.replace(["/b/1.mp3"])
+    assert queue.current_id is None
+    assert not set(old_ids) & set(queue.ids())
+    assert all(entry_id not in queue for entry_id in old_ids)
+    queue.clear()
+    assert len(queue) == 0 and list(queue) == []
+    with pytest.raises(IndexError):
+        queue.entry_id(0)
+
+
+def test_100k_entries():
+    rng = random.Random(100)
+    size = 100_000
+    queue = PlayQueue(random_paths(rng, size, pool=5000))
+    queue.set_current(size - 1)
+    reference = Reference(queue)
+    for _ in range(300):
+        source, destination = rng.randrange(size), rng.randrange(size)
+        reference.ids.insert(destination, reference.ids.pop(source))
+        queue.move(source, destination)
+    reference.check(rng)
+    # Big batches take the one-pass path
+    doomed = set(rng.sample(reference.ids, size // 3))
+    queue.remove_ids(doomed)
+    reference.ids = [entry_id for entry_id in reference.ids if entry_id not in doomed]
+    if reference.current_id in doomed:
+        reference.current_id = None
+    reference.check(rng)
+    moving = rng.sample(reference.ids, 10_000)
+    queue.move_ids(moving, 10)
+    moved = set(moving)
+    rest = [entry_id for entry_id in reference.ids if entry_id not in moved]
+    reference.ids = rest[:10] + moving + rest[10:]
+    reference.check(rng)
+    queue.insert(50_000, "/new.mp3")
+    assert queue[50_000] == "/new.mp3"
+    assert queue.names[50_000] == "new.mp3"
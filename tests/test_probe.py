@@ -0,0 +1,29 @@
+import io
+
+from probe import probe_fileobj
+
+SAMPLE_RATE_INDEX = 4   # 44100 Hz
+# A header-like pattern (0xFFF sync, frame length 7) that the payload is full of
+FAKE_HEADER = bytes([0xFF, 0xF1, 0x50, 0x80, 0x00, 0xE0, 0x00])
+
+
+def adts_frame(length):
+    """An ADTS frame of `length` bytes holding one block of 1024 samples"""
+    header = bytes([
+        0xFF, 0xF1,
+        (1 << 6) | (SAMPLE_RATE_INDEX << 2),
+        0x80 | ((length >> 11) & 0x03),
+        (length >> 3) & 0xFF,
+        ((length & 0x07) << 5) | 0x1F,
+        0xFC,
+    ])
+    payload = (FAKE_HEADER * (length // len(FAKE_HEADER) + 1))[:length - len(header)]
+    return header + payload
+
+
+def test_adts_frames_across_read_boundaries_are_skipped_whole():
+    # Long frames, so many of them straddle the prober's 256 KiB reads
+    frames = 200
+    data = b''.join(adts_frame(6001 + i % 7) for i in range(frames))
+    duration = probe_fileobj(io.BytesIO(data), len(data), "track.aac")
+    assert abs(duration - frames * 1024 / 44100) < 1e-9
@@ -0,0 +1,179 @@
+import pytest
+
+from queuefile import write_queue_file
+from simulation import simulated_engine
+
+
+def engine_with(count):
+    durations = {f"/sim/album{i // 10}/track{i:03d}.mp3": 200.0 for i in range(count)}
+    engine, clock, mixer = simulated_engine(durations)
+    engine.add_files(list(durations))
+    return engine, list(durations)
+
+
+def test_move_entries_keeps_the_selection_together_in_order():
+    engine, paths = engine_with(20)
+    engine.move_entries([12, 3, 4], 8)
+    order = list(engine.queue)
+    assert order[8:11] == [paths[3], paths[4], paths[12]]
+    assert sorted(order) == paths
+
+
+def test_removing_the_current_entry_plays_the_next_survivor():
+    engine, paths = engine_with(10)
+    engine.play_index(4)
+    engine.remove_entries([4, 5, 6])
+    assert engine.is_playing
+    assert engine.current_file == paths[7]
+    assert engine.current_queue_index == 4
+
+
+def test_removing_the_current_last_entry_stops_or_wraps_when_looping():
+    engine, paths = engine_with(10)
+    engine.play_index(9)
+    engine.remove_entries([8, 9])
+    assert not engine.is_playing
+    assert engine.queue.current_id is None
+
+    engine, paths = engine_with(10)
+    engine.set_loop_mode("queue")
+    engine.play_index(9)
+    engine.remove_entries([0, 9])
+    assert engine.is_playing
+    assert engine.current_file == paths[1]
+    assert engine.current_queue_index == 0
+
+
+def test_dedupe_keeps_the_first_copy_or_the_playing_one():
+    engine, paths = engine_with(5)
+    engine.add_files([paths[1], paths[3], paths[1]])
+    # The second copy of track 3 is playing, so that one stays
+    engine.play_index(6)
+    playing_id = engine.queue.current_id
+    assert engine.dedupe_queue() == 3
+    assert list(engine.queue) == [paths[0], paths[1], paths[2], paths[4], paths[3]]
+    assert engine.queue.current_id == playing_id
+    assert engine.is_playing
+
+
+def test_remove_missing_drops_files_that_are_gone(tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"track{i}.mp3"
+        path.write_bytes(b'\0')
+        paths.append(str(path))
+    engine, clock, mixer = simulated_engine({path: 100.0 for path in paths})
+    engine.add_files(paths)
+    engine.play_index(2)
+    reported = []
+    engine.listeners.append(lambda event, *args: reported.extend(args[0]) if event == 'missing_files' else None)
+    # The playing file is never dropped, even if it's gone too
+    for i in (0, 2, 5):
+        (tmp_path / f"track{i}.mp3").unlink()
+
+    engine.remove_missing()
+    while engine.queue_checker is not None:
+        engine.queue_checker.finished.wait(5)
+        clock.advance(0.2)
+    assert list(engine.queue) == [paths[1], paths[2], paths[3], paths[4]]
+    assert sorted(reported) == [paths[0], paths[5]]
+    assert engine.current_file == paths[2]
+
+
+def test_move_ids_lands_on_the_same_entries_after_the_queue_shifted():
+    engine, paths = engine_with(30)
+    queue = engine.queue
+    # What the window saw and selected
+    moving = [queue.entry_id(position) for position in (3, 4, 10)]
+    before_id = queue.entry_id(20)
+    # A background change shifts every position before the command runs
+    engine.remove_entries([0, 1])
+    engine.insert_next(["/sim/album0/track000.mp3"])
+    engine.move_ids(moving, before_id)
+    order = list(queue.ids())
+    at = order.index(before_id)
+    assert order[at - 3:at] == moving
+    assert sorted(queue) == sorted(paths[2:] + paths[:1])
+
+
+def test_remove_ids_ignores_entries_already_gone():
+    engine, paths = engine_with(10)
+    queue = engine.queue
+    doomed = [queue.entry_id(2), queue.entry_id(5)]
+    engine.remove_ids(doomed[:1])
+    engine.remove_ids(doomed)
+    assert list(queue) == [path for i, path in enumerate(paths) if i not in (2, 5)]
+
+
+def test_play_ids_next_follows_the_current_entry():
+    engine, paths = engine_with(10)
+    engine.play_index(2)
+    queue = engine.queue
+    current_id = queue.current_id
+    chosen = [queue.entry_id(8), queue.entry_id(0)]
+    engine.play_ids_next(chosen)
+    order = list(queue.ids())
+    at = order.index(current_id)
+    assert order[at + 1:at + 3] == chosen
+    assert engine.next_queue_index() == at + 1
+
+
+def saved_queue(tmp_path, count, missing, saved_index):
+    """A saved queue of `count` tracks, of which those at `missing` don't exist"""
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"track{i}.mp3"
+        if i not in missing:
+            path.write_bytes(b'\0')
+        paths.append(str(path))
+    queue_path = str(tmp_path / "saved.lukyland")
+    write_queue_file(queue_path, paths, saved_index)
+    return queue_path, paths
+
+
+def load_and_check(engine, clock, queue_path):
+    """Load a queue and let the background check finish; returns the reported missing files"""
+    reported = []
+    engine.listeners.append(lambda event, *args: reported.extend(args[0]) if event == 'missing_files' else None)
+    engine.load_queue(queue_path)
+    while engine.queue_checker is not None:
+        engine.queue_checker.finished.wait(5)
+        clock.advance(0.2)
+    return reported
+
+
+def test_load_queue_resumes_at_the_first_existing_track_from_the_saved_one(tmp_path):
+    queue_path, paths = saved_queue(tmp_path, 8, missing={0, 3, 4, 6}, saved_index=3)
+    engine, clock, mixer = simulated_engine({path: 100.0 for path in paths})
+    reported = load_and_check(engine, clock, queue_path)
+    assert engine.is_playing
+    assert engine.current_file == paths[5]
+    assert list(engine.queue) == [paths[1], paths[2], paths[5], paths[7]]
+    assert engine.current_queue_index == 2
+    # Each missing file is reported once, whether skipped at the start or found by the check
+    assert sorted(reported) == [paths[0], paths[3], paths[4], paths[6]]
+
+
+def test_load_queue_starts_over_when_nothing_after_the_saved_track_exists(tmp_path):
+    queue_path, paths = saved_queue(tmp_path, 5, missing={2, 3, 4}, saved_index=3)
+    engine, clock, mixer = simulated_engine({path: 100.0 for path in paths})
+    reported = load_and_check(engine, clock, queue_path)
+    assert engine.current_file == paths[0]
+    assert list(engine.queue) == [paths[0], paths[1]]
+    assert sorted(reported) == [paths[2], paths[3], paths[4]]
+
+
+@pytest.mark.parametrize('selection', [[0], [9], [0, 9], [3, 4], [5, 6], [4, 6], [0, 1, 2, 3, 4, 6, 7, 8, 9]])
+def test_play_ids_next_at_the_selection_boundaries(selection):
+    engine, paths = engine_with(10)
+    engine.play_index(5)
+    queue = engine.queue
+    engine.play_ids_next([queue.entry_id(position) for position in selection])
+    order = list(queue)
+    at = engine.current_queue_index
+    # The current entry itself stays where it is
+    expected = [paths[position] for position in selection if position != 5]
+    assert order[at] == paths[5]
+    assert order[at + 1:at + 1 + len(expected)] == expected
+    assert sorted(order) == paths
+
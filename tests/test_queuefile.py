@@ -0,0 +1,85 @@
+import os
+
+from playqueue import PlayQueue
+from queuefile import ExistenceChecker, read_queue_file, write_compact_queue_file, write_queue_file
+from simulation import simulated_engine
+
+PATHS = ["/music/a/1.mp3", "/music/a/2.mp3", "/music/b/ü.flac", "/music/a/1.mp3"]
+METADATA = {
+    "/music/a/1.mp3": {'duration': 181.5, 'title': "One", 'artist': "A", 'album': "First"},
+    "/music/b/ü.flac": {'duration': 240.0, 'title': None, 'artist': "B", 'album': None},
+}
+
+
+def test_json_round_trip(tmp_path):
+    path = str(tmp_path / "q.lukyland")
+    write_queue_file(path, PATHS, 2)
+    assert read_queue_file(path) == (PATHS, 2, None)
+
+
+def test_out_of_range_saved_index_starts_at_the_top(tmp_path):
+    path = str(tmp_path / "q.lukyland")
+    write_queue_file(path, PATHS, 4)
+    assert read_queue_file(path) == (PATHS, 0, None)
+
+
+def test_existence_checker_reports_each_missing_entry(tmp_path):
+    entries = []
+    missing = []
+    for i in range(1000):
+        path = tmp_path / f"{i}.mp3"
+        if i % 7:
+            path.write_bytes(b'\0')
+        else:
+            missing.append((i, str(path)))
+        entries.append((i, str(path)))
+    checker = ExistenceChecker(entries, batch_size=64, max_workers=4).start()
+    assert checker.finished.wait(10)
+    assert sorted(checker.poll()) == missing
+    assert checker.checked == len(entries)
+    assert checker.poll() == []
+
+
+def test_compact_round_trip_keeps_durations_and_tags(tmp_path):
+    path = str(tmp_path / "q.lukyland")
+    write_compact_queue_file(path, PlayQueue(PATHS), 1, METADATA)
+    paths, current_index, hints = read_queue_file(path)
+    assert (paths, current_index) == (PATHS, 1)
+
+    queue = PlayQueue()
+    queue.replace(paths, hints)
+    ids = list(queue.ids())
+    assert queue.metadata_of(ids[0]) == METADATA["/music/a/1.mp3"]
+    assert queue.metadata_of(ids[3]) == METADATA["/music/a/1.mp3"]
+    assert queue.metadata_of(ids[2]) == METADATA["/music/b/ü.flac"]
+    assert not queue.tracks.has_metadata(ids[1])
+    assert queue.metadata_of(ids[1])['artist'] is None
+
+
+def test_compact_without_metadata_has_no_hints(tmp_path):
+    path = str(tmp_path / "q.lukyland")
+    write_compact_queue_file(path, PATHS, 0)
+    assert read_queue_file(path) == (PATHS, 0, None)
+
+
+def test_loading_a_queue_keeps_the_saved_tags(tmp_path):
+    files = []
+    for name in ("1.mp3", "clip.mp4", "2.mp3", "3.mp3"):
+        file_path = str(tmp_path / name)
+        open(file_path, 'wb').close()
+        files.append(file_path)
+    metadata = {file_path: {'duration': 100.0 + i, 'title': None, 'artist': f"artist{i}", 'album': None}
+                for i, file_path in enumerate(files)}
+    queue_path = str(tmp_path / "q.lukyland")
+    write_compact_queue_file(queue_path, files, 2, metadata)
+
+    engine, clock, mixer = simulated_engine({file_path: 200.0 for file_path in files})
+    engine.load_queue(queue_path)
+    queue = engine.queue
+    # The video is skipped and the hints stay with their files
+    assert list(queue) == [files[0], files[2], files[3]]
+    assert os.path.basename(engine.current_file) == "2.mp3"
+    # (The playing entry's tags were read afresh)
+    for entry_id in queue.ids():
+        if entry_id != queue.current_id:
+            assert queue.metadata_of(entry_id)['artist'] == metadata[queue.path_of(entry_id)]['artist']
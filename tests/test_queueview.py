@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+pytest.importorskip('tkinter')
+
+from playqueue import PlayQueue, BLOCK_SIZE, JOURNAL_LENGTH
+from queueview import QueueRows
+
+
+def random_edit(queue, rng):
+    size = len(queue)
+    kind = rng.choice(('extend', 'insert_paths', 'remove_ids', 'move_ids', 'move', 'pop')) if size else 'extend'
+    if kind == 'extend':
+        queue.extend([f"/music/{rng.randrange(10**6)}.mp3" for _ in range(rng.choice((1, 5, BLOCK_SIZE + 3)))])
+    elif kind == 'insert_paths':
+        queue.insert_paths(rng.randrange(size + 1), [f"/music/{rng.randrange(10**6)}.mp3" for _ in range(3)])
+    elif kind == 'remove_ids':
+        queue.remove_ids(rng.sample(list(queue.ids()), min(size, rng.choice((1, 4, 40)))))
+    elif kind == 'move_ids':
+        queue.move_ids(rng.sample(list(queue.ids()), min(size, rng.choice((1, 4, 40)))), rng.randrange(size))
+    elif kind == 'move':
+        queue.move(rng.randrange(size), rng.randrange(size))
+    else:
+        queue.pop(rng.randrange(size))
+
+
+def sync(queue, rows, sent):
+    """What the engine thread sends the window, applied; returns the version sent"""
+    changes = queue.changes_since(sent)
+    if changes is None:
+        rows.update(queue.ids_array(), queue.names_from(0))
+    else:
+        rows.apply(changes, queue.names_from(0))
+    return queue.version
+
+
+def test_replayed_edits_keep_the_window_copy_in_step():
+    rng = random.Random(8)
+    queue = PlayQueue([f"/music/start{i}.mp3" for i in range(2000)])
+    rows = QueueRows()
+    sent = sync(queue, rows, None)
+    for step in range(300):
+        for _ in range(rng.randint(1, 4)):
+            random_edit(queue, rng)
+        sent = sync(queue, rows, sent)
+        assert list(rows.order.ids()) == list(queue.ids())
+        for position in rng.sample(range(len(queue)), min(10, len(queue))):
+            entry_id = queue.entry_id(position)
+            assert rows.index_of(entry_id) == position
+            assert rows[position] == queue.name(position)
+
+
+def test_edits_come_as_changes_until_the_journal_runs_out():
+    queue = PlayQueue([f"/music/{i}.mp3" for i in range(100)])
+    sent = queue.version
+    queue.move(0, 50)
+    queue.remove_ids([queue.entry_id(3)])
+    changes = queue.changes_since(sent)
+    assert [change[0] for change in changes] == ['move', 'remove']
+    assert queue.changes_since(queue.version) == []
+
+    # Reordering everything, clearing or falling too far behind needs the whole order
+    queue.shuffle()
+    assert queue.changes_since(sent) is None
+    sent = queue.version
+    for _ in range(JOURNAL_LENGTH + 1):
+        queue.move(0, 99)
+    assert queue.changes_since(sent) is None
+    sent = queue.version
+    queue.clear()
+    assert queue.changes_since(sent) is None
+
+
+def test_an_edit_costs_the_window_the_same_for_any_queue_length(monkeypatch):
+    for size in (10_000, 100_000):
+        queue = PlayQueue([f"/music/{i}.mp3" for i in range(size)])
+        rows = QueueRows()
+        sent = sync(queue, rows, None)
+        # No edit may lay the window's whole order out again
+        monkeypatch.setattr(rows.order, '_set_order', None)
+        queue.move_ids([queue.entry_id(size // 2), queue.entry_id(1)], 10)
+        queue.insert_paths(size // 3, ["/music/new.mp3"])
+        queue.remove_ids([queue.entry_id(size - 1)])
+        rows.apply(queue.changes_since(sent), {})
+        assert list(rows.order.ids()) == list(queue.ids())
+
+
+def test_local_edits_line_up_with_the_engine_confirming_them():
+    queue = PlayQueue([f"/music/{i}.mp3" for i in range(50)])
+    rows = QueueRows()
+    sent = sync(queue, rows, None)
+    moving = [queue.entry_id(40), queue.entry_id(2)]
+    before_id = queue.entry_id(10)
+    doomed = [queue.entry_id(20)]
+    # Shown right away, then replayed when the engine's edits arrive
+    rows.move(moving, before_id)
+    rows.remove(doomed)
+    queue.move_ids(moving, queue.position_of(before_id) - 1)
+    queue.remove_ids(doomed)
+    sync(queue, rows, sent)
+    assert list(rows.order.ids()) == list(queue.ids())
+    assert rows.index_of(doomed[0]) is None
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from library import Library
+from scanner import FolderScanner
+
+
+def make_tree(root):
+    """A small tree; returns its audio files in the order a scan hands them out"""
+    expected = []
+    for folder in ("", "a", "a/x", "a/y", "b", "c"):
+        path = root / folder
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ("2.mp3", "1.flac", "cover.jpg"):
+            (path / name).write_bytes(b'\0')
+        expected += [str(path / "1.flac"), str(path / "2.mp3")]
+    return [os.path.normpath(path) for path in expected]
+
+
+class GatedLibrary(Library):
+    """Holds the scan of one folder until the test lets it go"""
+
+    def __init__(self, db_path, gated_folder):
+        super().__init__(db_path)
+        self.gated_folder = gated_folder
+        self.reached = threading.Event()
+        self.gate = threading.Event()
+
+    def scan_folder(self, folder_path):
+        if folder_path == self.gated_folder:
+            self.reached.set()
+            self.gate.wait(5)
+        return super().scan_folder(folder_path)
+
+
+def collect(scanner):
+    assert scanner.finished.wait(5)
+    return [path for batch in scanner.poll() for path in batch]
+
+
+def test_batches_stream_in_depth_first_sorted_order(tmp_path):
+    expected = make_tree(tmp_path / "music")
+    library = Library(str(tmp_path / "library.db"))
+    for batch_size in (1, 3, 1000):
+        scanner = FolderScanner(str(tmp_path / "music"), batch_size=batch_size, library=library).start()
+        batches = []
+        while not scanner.finished.wait(0.01):
+            batches += scanner.poll()
+        batches += scanner.poll()
+        assert all(len(batch) <= batch_size for batch in batches)
+        assert [path for batch in batches for path in batch] == expected
+        assert scanner.progress() == (6, 6, len(expected))
+
+
+def test_cancel_mid_scan_stops_handing_out_files(tmp_path):
+    expected = make_tree(tmp_path / "music")
+    library = GatedLibrary(str(tmp_path / "library.db"), str(tmp_path / "music" / "b"))
+    scanner = FolderScanner(str(tmp_path / "music"), batch_size=1, library=library).start()
+    assert library.reached.wait(5)
+    scanner.cancel()
+    library.gate.set()
+    found = collect(scanner)
+    assert not scanner.is_running()
+    # What was handed out before the cancel is a prefix of the full order, without b or c
+    assert found == expected[:len(found)]
+    assert not any(os.sep + "b" + os.sep in path or os.sep + "c" + os.sep in path for path in found)
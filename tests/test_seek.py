@@ -0,0 +1,83 @@
+from engine import SEEK_INTERVAL
+from seektable import SeekTable
+from simulation import SimulatedMixer, SimulatedMixerError, VirtualClock, SimulatedMetadata
+
+DURATION = 3600.0
+# A Xing-like table: one seek point per 1% of the duration
+POINT_SPACING = DURATION / 100
+
+
+class NonSeekingMixer(SimulatedMixer):
+    """Can't seek in the file itself (like a VBR MP3 without a seekable decoder), only in spliced streams"""
+
+    def _check_source(self, source):
+        if isinstance(source, str):
+            super()._check_source(source)
+        else:
+            # A stream from a seek point: long enough for the test
+            self.durations[source] = DURATION
+
+    def set_pos(self, seconds):
+        if isinstance(self.source, str):
+            raise SimulatedMixerError("can't seek in this file")
+        super().set_pos(seconds)
+
+
+class OneTable:
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, file_path):
+        return self.table
+
+
+def make_engine(tmp_path):
+    from engine import PlayerEngine
+    path = str(tmp_path / "long.mp3")
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 100_000)
+    clock = VirtualClock()
+    mixer = NonSeekingMixer(clock, {path: DURATION})
+    engine = PlayerEngine(clock, mixer=mixer, metadata=SimulatedMetadata({path: DURATION}),
+                          transcoder=False, monotonic=clock.monotonic)
+    engine.normalize = False
+    times = [i * POINT_SPACING for i in range(100)]
+    engine.seek_tables = OneTable(SeekTable(times, [1000 * i for i in range(100)]))
+    engine.add_files([path])
+    engine.play_index(0)
+    return engine, clock, mixer
+
+
+def seek(engine, clock, position):
+    engine.seek(position)
+    clock.advance(SEEK_INTERVAL)
+
+
+def test_fallback_seek_lands_on_the_target_not_the_seek_point(tmp_path):
+    engine, clock, mixer = make_engine(tmp_path)
+    seek(engine, clock, 100.0)
+    assert not isinstance(mixer.source, str)
+    point = 2 * POINT_SPACING
+    assert engine.seek_stream_start == point
+    assert abs(mixer.position - (100.0 - point)) < 1e-6
+    assert abs(engine.current_position() - 100.0) < 0.01
+
+
+def test_seek_within_a_spliced_stream_counts_from_its_start(tmp_path):
+    engine, clock, mixer = make_engine(tmp_path)
+    seek(engine, clock, 100.0)
+    stream = mixer.source
+    seek(engine, clock, 150.0)
+    # Same stream, moved relative to its start
+    assert mixer.source is stream
+    assert abs(mixer.position - (150.0 - engine.seek_stream_start)) < 1e-6
+    assert abs(engine.current_position() - 150.0) < 0.01
+
+
+def test_seek_before_a_spliced_stream_restarts_it(tmp_path):
+    engine, clock, mixer = make_engine(tmp_path)
+    seek(engine, clock, 100.0)
+    seek(engine, clock, 40.0)
+    assert engine.seek_stream_start == POINT_SPACING
+    assert abs(mixer.position - (40.0 - POINT_SPACING)) < 1e-6
+    assert abs(engine.current_position() - 40.0) < 0.01
@@ -0,0 +1,79 @@
+import os
+
+import seektable
+from library import Library
+from probe import probe_fileobj
+from seektable import SeekTableCache, open_at
+from test_probe import adts_frame
+
+FRAME_TIME = 1024 / 44100
+
+
+def write_adts(path, frames):
+    with open(path, 'wb') as f:
+        for i in range(frames):
+            f.write(adts_frame(300 + i % 5))
+    return str(path)
+
+
+def counting_builds(monkeypatch):
+    builds = []
+    build = seektable._BUILDERS['.aac']
+
+    def counted(f, file_size):
+        builds.append(f.name)
+        return build(f, file_size)
+    monkeypatch.setitem(seektable._BUILDERS, '.aac', counted)
+    return builds
+
+
+def test_adts_points_are_frame_starts_about_a_second_apart(tmp_path):
+    frames = 500
+    path = write_adts(tmp_path / "track.aac", frames)
+    table = SeekTableCache(library=Library(str(tmp_path / "library.db"))).get(path)
+    assert table.times[0] == 0.0 and table.offsets[0] == 0
+    steps = [b - a for a, b in zip(table.times, table.times[1:])]
+    assert all(1.0 <= step < 1.0 + FRAME_TIME for step in steps)
+
+    # The spliced stream starts on a frame and runs for the rest of the track
+    stream, start = open_at(path, table, 5.5)
+    assert start <= 5.5 < start + 1.0 + FRAME_TIME
+    with stream:
+        length = stream.size
+        assert stream.read(2) == b'\xff\xf1'
+        stream.seek(0)
+        remaining = probe_fileobj(stream, length, "track.aac")
+    assert abs(remaining - (frames * FRAME_TIME - start)) < 1e-9
+
+
+def test_tables_are_built_once_and_kept_in_the_library(tmp_path, monkeypatch):
+    builds = counting_builds(monkeypatch)
+    path = write_adts(tmp_path / "track.aac", 300)
+    library = Library(str(tmp_path / "library.db"))
+    first = SeekTableCache(library=library).get(path)
+    # A new cache (as after a restart) reads the stored copy
+    again = SeekTableCache(library=library).get(path)
+    assert builds == [path]
+    assert list(again.times) == list(first.times)
+    assert list(again.offsets) == list(first.offsets)
+    assert again.header == first.header
+
+
+def test_a_changed_file_gets_a_new_table(tmp_path, monkeypatch):
+    builds = counting_builds(monkeypatch)
+    path = write_adts(tmp_path / "track.aac", 300)
+    library = Library(str(tmp_path / "library.db"))
+    before = SeekTableCache(library=library).get(path)
+    write_adts(tmp_path / "track.aac", 600)
+    os.utime(path, ns=(1, 1))
+    after = SeekTableCache(library=library).get(path)
+    assert len(builds) == 2
+    assert len(after) > len(before)
+
+
+def test_formats_that_seek_themselves_have_no_table(tmp_path):
+    cache = SeekTableCache(library=Library(str(tmp_path / "library.db")))
+    for name in ("track.flac", "track.ogg", "track.opus"):
+        path = tmp_path / name
+        path.write_bytes(b'\0' * 100)
+        assert cache.get(str(path)) is None
@@ -0,0 +1,61 @@
+import random
+
+from playqueue import PlayQueue
+from shuffleorder import ShuffleOrder
+
+ARTISTS = 8
+
+
+def tagged_queue(count):
+    """Every track in its own folder; the artist only shows in the tags"""
+    paths = [f"/music/folder{i:04d}/track.mp3" for i in range(count)]
+    tags = {path: {'duration': 200.0, 'title': None, 'artist': f"artist{i % ARTISTS}", 'album': None}
+            for i, path in enumerate(paths)}
+    return PlayQueue(paths), tags
+
+
+def play_round(order, queue):
+    queue.current_id = queue.entry_id(0)
+    order.start()
+    played = [queue.current_id]
+    while True:
+        entry_id = order.advance()
+        if entry_id is None:
+            return played
+        queue.current_id = entry_id
+        order.played(entry_id)
+        played.append(entry_id)
+
+
+def artist_repeats(queue, tags, played):
+    artists = [tags[queue.path_of(entry_id)]['artist'] for entry_id in played]
+    return sum(1 for a, b in zip(artists, artists[1:]) if a == b)
+
+
+def test_artist_spread_uses_tags_of_unplayed_entries():
+    queue, tags = tagged_queue(400)
+    order = ShuffleOrder(queue, random.Random(3))
+    order.spread = 'artist'
+    order.lookup_metadata = lambda paths: {path: tags[path] for path in paths if path in tags}
+    played = play_round(order, queue)
+    assert sorted(played) == sorted(queue.ids())
+    # Unspread, about one in eight neighbours would share an artist
+    assert artist_repeats(queue, tags, played) <= 3
+
+
+def test_artist_spread_falls_back_to_folders_without_tags():
+    paths = [f"/music/album{i // 10}/track{i}.mp3" for i in range(200)]
+    queue = PlayQueue(paths)
+    order = ShuffleOrder(queue, random.Random(5))
+    order.spread = 'artist'
+    played = play_round(order, queue)
+    assert sorted(played) == sorted(queue.ids())
+    folders = [queue.tracks.split(entry_id)[0] for entry_id in played]
+    assert sum(1 for a, b in zip(folders, folders[1:]) if a == b) <= 3
+
+
+def test_unspread_order_does_repeat_artists():
+    queue, tags = tagged_queue(400)
+    order = ShuffleOrder(queue, random.Random(3))
+    played = play_round(order, queue)
+    assert artist_repeats(queue, tags, played) > 20
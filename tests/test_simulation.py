@@ -0,0 +1,187 @@
+"""Long seeded sessions on virtual time: loop modes, Next and the end of the queue"""
+import random
+
+import pytest
+
+from engine import PlayerEngine
+from mixer import PygameMixer
+from simulation import SimulatedMetadata, VirtualClock, simulated_engine
+
+# get_pos counts whole milliseconds, so the engine's position may trail by just under one
+DRIFT_BOUND = 0.002
+
+
+class Session:
+    def __init__(self, seed, count=40, gapless=True):
+        self.rng = random.Random(seed)
+        self.durations = {f"/sim/album{i // 10}/track{i:03d}.mp3": self.rng.uniform(2, 300) for i in range(count)}
+        self.paths = list(self.durations)
+        self.engine, self.clock, self.mixer = simulated_engine(self.durations)
+        self.engine.gapless = gapless
+        self.started = []
+        self.engine.listeners.append(self.on_event)
+
+    def on_event(self, event, *args):
+        if event == 'track_started':
+            self.started.append(args[0])
+
+    def play_out(self):
+        """Let the playing track run to its end (and a little past it)"""
+        # (get_busy brings the mixer's position up to the clock)
+        self.mixer.get_busy()
+        remaining = self.durations[self.mixer.source] - self.mixer.position
+        self.clock.advance(remaining + 0.05)
+
+    def expect(self, index):
+        """The track at index started last and is playing"""
+        assert self.started[-1] == self.paths[index]
+        assert self.engine.current_queue_index == index
+        assert self.engine.is_playing and self.mixer.playing
+
+
+@pytest.mark.parametrize('gapless', [True, False])
+def test_loop_queue_wraps_around(gapless):
+    session = Session(1, gapless=gapless)
+    engine = session.engine
+    engine.set_loop_mode("queue")
+    engine.add_files(session.paths)
+    session.expect(0)
+    for transition in range(1, 2000):
+        session.play_out()
+        session.expect(transition % len(session.paths))
+    assert len(session.started) == 2000
+
+
+def test_loop_media_repeats_the_track_until_next():
+    session = Session(2)
+    engine = session.engine
+    engine.add_files(session.paths)
+    engine.set_loop_mode("media")
+    for index in (0, 1, 2):
+        for _ in range(300):
+            session.play_out()
+            session.expect(index)
+        engine.next_track()
+        session.expect(index + 1)
+
+
+@pytest.mark.parametrize('gapless', [True, False])
+def test_playback_stops_at_the_end_of_the_queue(gapless):
+    session = Session(3, gapless=gapless)
+    engine = session.engine
+    engine.add_files(session.paths)
+    for index in range(1, len(session.paths)):
+        session.play_out()
+        session.expect(index)
+    session.play_out()
+    assert not engine.is_playing and not session.mixer.playing
+    assert session.started == session.paths
+    # Next at the last track does nothing without queue looping
+    engine.next_track()
+    assert not engine.is_playing
+    assert len(session.started) == len(session.paths)
+
+
+def test_seeded_session_follows_a_plain_model():
+    session = Session(4)
+    engine, rng, size = session.engine, session.rng, len(session.paths)
+    engine.add_files(session.paths)
+    index = 0
+    for _ in range(5000):
+        step = rng.random()
+        if step < 0.05:
+            engine.set_loop_mode(rng.choice(("none", "media", "queue")))
+            continue
+        if not engine.is_playing:
+            index = rng.randrange(size)
+            engine.play_index(index)
+        elif step < 0.25 and engine.loop_mode != "media":
+            engine.next_track()
+            if index < size - 1:
+                index += 1
+            elif engine.loop_mode == "queue":
+                index = 0
+        else:
+            session.play_out()
+            if engine.loop_mode == "media":
+                pass
+            elif index < size - 1:
+                index += 1
+            elif engine.loop_mode == "queue":
+                index = 0
+            else:
+                assert not engine.is_playing
+                continue
+        session.expect(index)
+
+
+def test_engine_position_stays_on_the_mixer_through_pause_and_seek():
+    durations = {"/sim/a.mp3": 600.0, "/sim/b.mp3": 600.0}
+    engine, clock, mixer = simulated_engine(durations)
+    engine.add_files(list(durations))
+    rng = random.Random(16)
+    for step in range(200):
+        clock.advance(rng.uniform(0.01, 2.0))
+        if step == 50:
+            engine.toggle_pause()
+            clock.advance(20.0)
+            engine.toggle_pause()
+        elif step == 100:
+            engine.seek(400.0)
+            clock.advance(1.0)
+        assert mixer.get_busy()
+        assert abs(engine.current_position() - mixer.position) < DRIFT_BOUND
+
+
+@pytest.mark.parametrize('events', [True, False])
+def test_track_ends_are_noticed_without_polling_when_the_mixer_posts_end_events(events):
+    durations = {"/sim/a.mp3": 200.0, "/sim/b.mp3": 100.0}
+    engine, clock, mixer = simulated_engine(durations, events_available=events)
+    engine.add_files(list(durations))
+    checks = []
+    check_track_end = engine.check_track_end
+
+    def counted():
+        checks.append(clock.now)
+        check_track_end()
+    engine.check_track_end = counted
+
+    clock.advance(150.0)
+    if events:
+        # Nothing to check until the mixer says the track is over
+        assert engine.end_job is None
+        assert checks == []
+    clock.advance(50.05)
+    assert engine.current_file == "/sim/b.mp3"
+    assert engine.current_queue_index == 1
+    if events:
+        # Woken by the end event (the new track's start looks once more)
+        assert set(checks) == {200.0}
+    else:
+        # The timed fallback looks again shortly before the end, then closely
+        assert len(checks) > 1 and 200.0 <= checks[-1] < 200.02
+    clock.advance(100.0)
+    assert not engine.is_playing
+
+
+def test_gapless_state_follows_what_the_mixer_supports():
+    durations = {"/sim/a.mp3": 200.0, "/sim/b.mp3": 100.0}
+    engine, clock, mixer = simulated_engine(durations, events_available=False)
+    assert engine.gapless
+    assert engine.status()['gapless'] is False
+    engine.toggle_gapless()
+    assert engine.status()['gapless'] is False
+
+    engine, clock, mixer = simulated_engine(durations)
+    assert engine.status()['gapless'] is True
+    engine.toggle_gapless()
+    assert engine.status()['gapless'] is False
+
+
+def test_gapless_state_does_not_start_the_mixer():
+    mixer = PygameMixer()
+    engine = PlayerEngine(VirtualClock(), mixer=mixer, metadata=SimulatedMetadata({}), transcoder=False)
+    # Not known until the first track starts the mixer; until then, what was asked for
+    assert engine.gapless_active
+    assert engine.status()['gapless'] is True
+    assert not mixer.started
@@ -0,0 +1,79 @@
+import os
+import sys
+import stat
+
+import pytest
+
+from transcode import TranscodeCache, needs_transcoding
+
+COPY_BYTES = 1000
+
+# Stands in for ffmpeg: writes COPY_BYTES to the output path (the last argument)
+FAKE_FFMPEG = f"""#!{sys.executable}
+import sys
+if 'broken' in sys.argv[sys.argv.index('-i') + 1]:
+    sys.stderr.write("Invalid data found when processing input\\n")
+    sys.exit(1)
+with open(sys.argv[-1], 'wb') as f:
+    f.write(b'\\0' * {COPY_BYTES})
+"""
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="the fake converter is a script with a shebang")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IXUSR)
+    cache = TranscodeCache(str(ffmpeg), cache_dir=str(tmp_path / "cache"), max_bytes=2 * COPY_BYTES + 500,
+                           workers=1)
+    yield cache
+    cache.pool.shutdown()
+
+
+def source(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(name.encode())
+    return str(path)
+
+
+def test_least_recently_used_copy_is_trimmed_first(tmp_path, cache):
+    first, second, third = (source(tmp_path, f"{n}.m4a") for n in ("a", "b", "c"))
+    assert needs_transcoding(first)
+    first_copy = cache.request(first).result()
+    second_copy = cache.request(second).result()
+    assert cache.lookup(first) == first_copy
+    assert os.path.getsize(first_copy) == COPY_BYTES
+
+    # Playing the first copy again makes the second the oldest
+    third_copy = cache.request(third).result()
+    assert cache.lookup(second) is None
+    assert not os.path.exists(second_copy)
+    assert cache.lookup(first) == first_copy
+    assert cache.lookup(third) == third_copy
+
+    # A new session orders the cache by the copies' mtimes
+    os.utime(first_copy, ns=(1, 1))
+    reopened = TranscodeCache(cache.ffmpeg, cache_dir=cache.cache_dir, max_bytes=cache.max_bytes, workers=1)
+    reopened.request(second).result()
+    assert reopened.lookup(first) is None
+    assert reopened.lookup(third) == third_copy
+    reopened.pool.shutdown()
+
+
+def test_failed_conversion_leaves_nothing_behind(tmp_path, cache):
+    broken = source(tmp_path, "broken.m4a")
+    with pytest.raises(RuntimeError, match="Invalid data"):
+        cache.request(broken).result()
+    assert cache.lookup(broken) is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_changed_source_is_converted_again(tmp_path, cache):
+    path = source(tmp_path, "a.m4a")
+    first_copy = cache.request(path).result()
+    with open(path, 'ab') as f:
+        f.write(b'more')
+    assert cache.lookup(path) is None
+    assert cache.request(path).result() != first_copy
@@ -0,0 +1,74 @@
+import struct
+
+from waveform import WaveformStore, _HEADER, _MAGIC, _VERSION
+
+POINTS = 100
+
+
+def make_store(path, **options):
+    options.setdefault('records', 64)
+    options.setdefault('points', POINTS)
+    return WaveformStore(str(path), **options)
+
+
+def levels(seed):
+    return bytes((seed * 7 + i) % 256 for i in range(POINTS))
+
+
+def test_put_get_round_trip_across_sessions(tmp_path):
+    store = make_store(tmp_path / "waveforms.bin")
+    identities = {f"/music/{i}.mp3": (1000 + i, 5 * i) for i in range(20)}
+    for i, (path, identity) in enumerate(identities.items()):
+        store.put(path, identity, levels(i))
+    assert store.get("/music/0.mp3", (1000, 1)) is None
+    store.close()
+
+    store = make_store(tmp_path / "waveforms.bin")
+    for i, (path, identity) in enumerate(identities.items()):
+        assert store.get(path, identity) == levels(i)
+    # Storing again replaces the levels in place
+    store.put("/music/3.mp3", identities["/music/3.mp3"], levels(99))
+    assert store.get("/music/3.mp3", identities["/music/3.mp3"]) == levels(99)
+    store.close()
+
+
+def test_full_set_drops_its_least_recently_used_record(tmp_path):
+    # One set of eight records
+    store = make_store(tmp_path / "waveforms.bin", records=8)
+    for i in range(8):
+        store.put(f"/music/{i}.mp3", (i, i), levels(i))
+    store.get("/music/0.mp3", (0, 0))
+    store.put("/music/8.mp3", (8, 8), levels(8))
+    assert store.get("/music/1.mp3", (1, 1)) is None
+    assert store.get("/music/0.mp3", (0, 0)) == levels(0)
+    assert store.get("/music/8.mp3", (8, 8)) == levels(8)
+    store.close()
+
+
+def test_file_with_a_stale_header_is_started_over(tmp_path):
+    path = tmp_path / "waveforms.bin"
+    store = make_store(path)
+    store.put("/music/a.mp3", (1, 2), levels(1))
+    store.close()
+
+    # Written by another version
+    with open(path, 'r+b') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION + 1, 64, POINTS, 0))
+    store = make_store(path)
+    assert store.get("/music/a.mp3", (1, 2)) is None
+    store.put("/music/a.mp3", (1, 2), levels(2))
+    store.close()
+    with open(path, 'rb') as f:
+        assert _HEADER.unpack(f.read(_HEADER.size))[:4] == (_MAGIC, _VERSION, 64, POINTS)
+
+    # Laid out for a different number of points
+    store = make_store(path, points=POINTS // 2)
+    assert store.get("/music/a.mp3", (1, 2)) is None
+    store.close()
+
+    # Cut short
+    with open(path, 'r+b') as f:
+        f.truncate(struct.calcsize('<4sI'))
+    store = make_store(path)
+    assert store.get("/music/a.mp3", (1, 2)) is None
+    store.close()
@@ -0,0 +1,200 @@
+"""Compact in-memory track records shared by the queue, its window and queue files.
+
+A track is a row in a few parallel arrays rather than a path string plus a
+dict per entry: the folder is an index into a table of interned folder
+prefixes, file names are UTF-8 bytes in one shared buffer, and cached
+duration and tags are a float and interned string ids. Rows are addressed
+by the track ID handed out when the track was added.
+"""
+import os
+import math
+from array import array
+
+TAG_FIELDS = ('title', 'artist', 'album')
+NO_STRING = -1
+
+
+def split_path(path):
+    """Split a path into (folder prefix, file name); folder + name == path"""
+    name = os.path.basename(path)
+    # Keep the separator with the folder so paths round-trip exactly
+    return path[:len(path) - len(name)], name
+
+
+class StringPool:
+    """Interned strings addressed by small integer ids"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class TrackTable:
+    """Column store of track records indexed by track ID"""
+
+    def __init__(self):
+        # IDs are never reused, even across clear(); base is the ID of row 0
+        self.base = 0
+        self._reset()
+
+    def _reset(self):
+        self.folders = StringPool()
+        self.tag_strings = StringPool()
+        self.folder_ids = array('i')    # NO_STRING for discarded rows
+        self.name_data = bytearray()    # UTF-8 file names, back to back
+        self.name_ends = array('Q')     # end of each row's name in name_data
+        # Metadata columns stay empty until some track has metadata
+        self.durations = array('f')     # NaN when unknown
+        self.tag_ids = array('i')       # TAG_FIELDS per row, NO_STRING if unset
+        self.live = 0
+
+    def __len__(self):
+        return self.live
+
+    @property
+    def next_id(self):
+        return self.base + len(self.folder_ids)
+
+    def row(self, track_id):
+        """Row of a live track, KeyError if the ID is unknown or discarded"""
+        row = track_id - self.base
+        if row < 0 or row >= len(self.folder_ids) or self.folder_ids[row] == NO_STRING:
+            raise KeyError(track_id)
+        return row
+
+    def __contains__(self, track_id):
+        row = track_id - self.base
+        return 0 <= row < len(self.folder_ids) and self.folder_ids[row] != NO_STRING
+
+    def add(self, path):
+        """Add a track, return its ID"""
+        return self.extend((path,))[0]
+
+    def extend(self, paths):
+        """Add many tracks, return a range of their IDs"""
+        first_id = self.next_id
+        intern = self.folders.intern
+        folder_ids = self.folder_ids
+        name_data = self.name_data
+        name_ends = self.name_ends
+        for path in paths:
+            folder, name = split_path(path)
+            folder_ids.append(intern(folder))
+            name_data += name.encode('utf-8', 'surrogatepass')
+            name_ends.append(len(name_data))
+        added = self.next_id - first_id
+        self.live += added
+        if self.durations:
+            self._grow_metadata()
+        return range(first_id, first_id + added)
+
+    def discard(self, track_id):
+        """Drop a track, return its path"""
+        path = self.path(track_id)
+        # The name bytes stay behind until the next clear()
+        self.folder_ids[track_id - self.base] = NO_STRING
+        self.live -= 1
+        return path
+
+    def clear(self):
+        self.base = self.next_id
+        self._reset()
+
+    def _name(self, row):
+        start = self.name_ends[row - 1] if row else 0
+        return self.name_data[start:self.name_ends[row]].decode('utf-8', 'surrogatepass')
+
+    def path(self, track_id):
+        row = self.row(track_id)
+        return self.folders[self.folder_ids[row]] + self._name(row)
+
+    def name(self, track_id):
+        """File name of a track, without building its full path"""
+        return self._name(self.row(track_id))
+
+    def names_from(self, first_id):
+        """{track ID: file name} of the live tracks whose IDs are first_id or later, in one pass"""
+        first_row = max(first_id - self.base, 0)
+        name_data = self.name_data
+        folder_ids = self.folder_ids
+        names = {}
+        start = self.name_ends[first_row - 1] if 0 < first_row <= len(self.name_ends) else 0
+        for row in range(first_row, len(folder_ids)):
+            end = self.name_ends[row]
+            if folder_ids[row] != NO_STRING:
+                names[self.base + row] = name_data[start:end].decode('utf-8', 'surrogatepass')
+            start = end
+        return names
+
+    def split(self, track_id):
+        """(folder prefix, file name) of a track"""
+        row = self.row(track_id)
+        return self.folders[self.folder_ids[row]], self._name(row)
+
+    def _grow_metadata(self):
+        """Extend the metadata columns to cover every row"""
+        missing = len(self.folder_ids) - len(self.durations)
+        self.durations.extend(array('f', [math.nan]) * missing)
+        self.tag_ids.extend(array('i', [NO_STRING]) * (missing * len(TAG_FIELDS)))
+
+    def set_metadata(self, track_id, metadata):
+        """Remember duration and tags for a track (other keys are ignored)"""
+        row = self.row(track_id)
+        if len(self.durations) <= row:
+            self._grow_metadata()
+        duration = metadata.get('duration')
+        self.durations[row] = float(duration) if duration else math.nan
+        for i, field in enumerate(TAG_FIELDS):
+            text = metadata.get(field)
+            self.tag_ids[row * len(TAG_FIELDS) + i] = self.tag_strings.intern(text) if text else NO_STRING
+
+    def set_metadata_columns(self, first_id, durations, tag_strings=(), tag_ids=None):
+        """Set the metadata of consecutive tracks in one go.
+
+        durations is an array('f') with NaN for unknown values; tag_ids holds
+        len(TAG_FIELDS) indexes into tag_strings per track, anything out of
+        range meaning unset.
+        """
+        first_row = self.row(first_id)
+        count = len(durations)
+        if len(self.durations) < first_row + count:
+            self._grow_metadata()
+        self.durations[first_row:first_row + count] = durations
+        if tag_ids is not None:
+            pool_ids = [self.tag_strings.intern(text) if text else NO_STRING for text in tag_strings]
+            known = len(pool_ids)
+            start = first_row * len(TAG_FIELDS)
+            self.tag_ids[start:start + len(tag_ids)] = array(
+                'i', [pool_ids[tag_id] if tag_id < known else NO_STRING for tag_id in tag_ids])
+
+    def has_metadata(self, track_id):
+        row = self.row(track_id)
+        return row < len(self.durations) and not math.isnan(self.durations[row])
+
+    def metadata(self, track_id):
+        """Known {duration, title, artist, album} of a track, None for unknown values"""
+        metadata = dict.fromkeys(('duration',) + TAG_FIELDS)
+        row = self.row(track_id)
+        if row >= len(self.durations):
+            return metadata
+        duration = self.durations[row]
+        if not math.isnan(duration):
+            metadata['duration'] = duration
+        for i, field in enumerate(TAG_FIELDS):
+            string_id = self.tag_ids[row * len(TAG_FIELDS) + i]
+            if string_id != NO_STRING:
+                metadata[field] = self.tag_strings[string_id]
+        return metadata
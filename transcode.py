@@ -0,0 +1,180 @@
+"""On-disk cache of mixer-friendly copies of formats the mixer handles poorly.
+
+pygame's mixer has no duration or seeking for raw AAC (and can't open some
+files at all), so those are converted to FLAC by ffmpeg ahead of their turn
+in the queue. The copies are lossless, so nothing is lost a second time, and
+the prober reads and the mixer seeks FLAC. The cache is keyed by file identity
+and bounded in size; the least recently played copies are deleted first.
+
+Transcoding is optional: without an ffmpeg executable (on PATH or in
+LANDPLAYER_FFMPEG) get_transcoder() returns None and files play as before.
+"""
+import os
+import shutil
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from appdata import data_path, file_identity
+from instrument import log, span
+
+TRANSCODE_EXTENSIONS = ('.aac', '.m4a', '.wma')
+DEFAULT_CACHE_BYTES = 1 << 30  # 1 GiB of converted files
+CACHE_EXTENSION = '.flac'
+
+
+def needs_transcoding(file_path):
+    """Whether a file is in a format the mixer handles poorly"""
+    return os.path.splitext(file_path)[1].lower() in TRANSCODE_EXTENSIONS
+
+
+def find_ffmpeg():
+    return os.environ.get('LANDPLAYER_FFMPEG') or shutil.which('ffmpeg')
+
+
+class TranscodeCache:
+    """Converts files in the background and keeps the results in an LRU on disk"""
+
+    def __init__(self, ffmpeg, cache_dir=None, max_bytes=DEFAULT_CACHE_BYTES, workers=2):
+        self.ffmpeg = ffmpeg
+        self.cache_dir = cache_dir or data_path('transcoded')
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.entries = None  # name -> size, least recently used first
+        self.pending = {}
+        # Each worker drives one ffmpeg process, so conversions use separate cores
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcode")
+
+    def _cache_name(self, file_path, identity):
+        raw = f"{file_path}|{identity[0]}|{identity[1]}"
+        return hashlib.sha1(raw.encode('utf-8', 'surrogatepass')).hexdigest() + CACHE_EXTENSION
+
+    def _load_entries(self):
+        """Index the cache folder by last use (lock held)"""
+        if self.entries is not None:
+            return
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.tmp'):
+                # Left over from a conversion that never finished
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+            elif entry.name.endswith(CACHE_EXTENSION):
+                st = entry.stat()
+                found.append((st.st_mtime_ns, entry.name, st.st_size))
+        found.sort()
+        self.entries = OrderedDict((name, size) for _, name, size in found)
+
+    def lookup(self, file_path):
+        """Path of the converted copy if it is ready, else None"""
+        identity = file_identity(file_path)
+        if identity is None:
+            return None
+        name = self._cache_name(file_path, identity)
+        with self.lock:
+            self._load_entries()
+            if name not in self.entries:
+                return None
+            self.entries.move_to_end(name)
+        cached_path = os.path.join(self.cache_dir, name)
+        try:
+            # The file's mtime records its last use for the next run
+            os.utime(cached_path)
+        except OSError:
+            with self.lock:
+                self.entries.pop(name, None)
+            return None
+        return cached_path
+
+    def request(self, file_path):
+        """Start converting a file (if not already) and return its Future"""
+        with self.lock:
+            future = self.pending.get(file_path)
+            if future is not None:
+                return future
+            future = self.pool.submit(self._convert, file_path)
+            self.pending[file_path] = future
+        future.add_done_callback(lambda f: self._forget_pending(file_path))
+        return future
+
+    def _forget_pending(self, file_path):
+        with self.lock:
+            self.pending.pop(file_path, None)
+
+    def prefetch(self, file_paths):
+        """Convert upcoming files that need it ahead of time"""
+        for file_path in file_paths:
+            if needs_transcoding(file_path) and self.lookup(file_path) is None:
+                self.request(file_path)
+
+    def _convert(self, file_path):
+        """Run ffmpeg and add the result to the cache; returns the copy's path"""
+        cached_path = self.lookup(file_path)
+        if cached_path is not None:
+            return cached_path
+        identity = file_identity(file_path)
+        if identity is None:
+            raise FileNotFoundError(file_path)
+        name = self._cache_name(file_path, identity)
+        cached_path = os.path.join(self.cache_dir, name)
+        temp_path = cached_path[:-len(CACHE_EXTENSION)] + '.tmp'
+
+        command = [self.ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', file_path,
+                   '-map', '0:a:0', '-vn', '-c:a', 'flac', '-f', 'flac', temp_path]
+        with span('transcode', slow_ms=None):
+            result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            message = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise RuntimeError(message[-1] if message else f"ffmpeg exited with {result.returncode}")
+        os.replace(temp_path, cached_path)
+
+        with self.lock:
+            self._load_entries()
+            self.entries[name] = os.path.getsize(cached_path)
+            self.entries.move_to_end(name)
+        log.info(f"Converted {os.path.basename(file_path)} for playback")
+        self.evict()
+        return cached_path
+
+    def evict(self):
+        """Delete the least recently used copies until the cache fits its budget"""
+        with self.lock:
+            total = sum(self.entries.values())
+            # The newest copy always stays, even if it alone is over budget
+            while total > self.max_bytes and len(self.entries) > 1:
+                name, size = self.entries.popitem(last=False)
+                total -= size
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except OSError as e:
+                    # Still open for playback on Windows; try again next time
+                    log.warning(f"Could not remove converted file: {e}")
+
+
+_transcoder = None
+_transcoder_lock = threading.Lock()
+
+
+def get_transcoder():
+    """Get the shared TranscodeCache, or None if ffmpeg isn't available"""
+    global _transcoder
+    with _transcoder_lock:
+        if _transcoder is None:
+            ffmpeg = find_ffmpeg()
+            if ffmpeg is None:
+                log.info("ffmpeg not found, files the mixer can't handle play without conversion")
+                _transcoder = False
+            else:
+                _transcoder = TranscodeCache(ffmpeg)
+    return _transcoder or None
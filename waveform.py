@@ -0,0 +1,233 @@
+"""Waveform overviews for the progress bar, computed in the background.
+
+A track's overview is WAVEFORM_POINTS peak levels, one byte each, taken
+from its decoded PCM with NumPy on a worker thread. Overviews are kept in
+one memory-mapped file in the data folder that every session shares: a
+fixed table of 1 KiB records, each holding a key made from the file's path
+and identity, a last-use stamp and the levels. A key maps to a set of
+SET_WAYS records and a full set drops its least recently used record, so
+the file never grows past its initial (sparse where supported) size.
+
+NumPy is optional: without it no overviews are computed and the progress
+bar is drawn plain.
+"""
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from appdata import data_path, file_identity
+from pcm import read_pcm
+from loudness import numpy_available
+from instrument import log, span
+
+WAVEFORM_POINTS = 1000      # Peak levels per track
+BLOCK_FRAMES = 512          # Frames reduced to one peak while decoding
+RECORD_SIZE = 1024          # Key (20) + stamp (4) + levels, padded
+STORE_RECORDS = 8192        # 8 MiB of overviews
+SET_WAYS = 8                # Records a key may be stored in
+
+_MAGIC = b'LPWF'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIII')  # magic, version, records, points, stamp counter
+_KEY_SIZE = 20
+_STAMP = struct.Struct('<I')
+_EMPTY_KEY = bytes(_KEY_SIZE)
+
+# Marker remembered for files that have no overview (undecodable or silent)
+NO_WAVEFORM = b''
+
+
+def compute_peaks(file_path, ffmpeg=None, points=WAVEFORM_POINTS, start_mixer=True):
+    """Peak level (0-255) of each of `points` equal slices of a track, or None"""
+    import numpy as np
+    blocks = []
+    for _, samples in read_pcm(file_path, ffmpeg, start_mixer):
+        if not len(samples):
+            continue
+        levels = np.abs(samples).max(axis=1)
+        blocks.append(np.maximum.reduceat(levels, np.arange(0, len(levels), BLOCK_FRAMES)))
+    if not blocks:
+        return None
+    blocks = np.concatenate(blocks)
+    # Slice boundaries; tracks shorter than `points` blocks repeat blocks
+    edges = np.arange(points) * len(blocks) // points
+    peaks = np.maximum.reduceat(blocks, edges)
+    if not peaks.max() > 0:
+        return None
+    return np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8).tobytes()
+
+
+class WaveformStore:
+    """Fixed-size table of overviews in a memory-mapped file"""
+
+    def __init__(self, path=None, records=STORE_RECORDS, points=WAVEFORM_POINTS):
+        self.path = path or data_path('waveforms.bin')
+        self.records = records
+        self.points = points
+        self.sets = max(1, records // SET_WAYS)
+        self.lock = threading.Lock()
+        self.map = None
+
+    def _open(self):
+        """Map the file, (re)creating it if it's missing or laid out differently (lock held)"""
+        if self.map is not None:
+            return
+        size = (self.records + 1) * RECORD_SIZE
+        header = _HEADER.pack(_MAGIC, _VERSION, self.records, self.points, 0)
+        try:
+            f = open(self.path, 'r+b')
+        except FileNotFoundError:
+            f = open(self.path, 'w+b')
+        with f:
+            if f.read(_HEADER.size - _STAMP.size) != header[:-_STAMP.size] or os.path.getsize(self.path) != size:
+                f.truncate(0)
+                f.truncate(size)
+                f.seek(0)
+                f.write(header)
+                f.flush()
+            self.map = mmap.mmap(f.fileno(), size)
+
+    def _key(self, file_path, identity):
+        raw = f"{file_path}|{identity[0]}|{identity[1]}"
+        return hashlib.sha1(raw.encode('utf-8', 'surrogatepass')).digest()
+
+    def _offsets(self, key):
+        """Offsets of the records a key may be stored in"""
+        first = int.from_bytes(key[:4], 'little') % self.sets * SET_WAYS
+        return [(first + way + 1) * RECORD_SIZE for way in range(SET_WAYS)]
+
+    def _next_stamp(self):
+        offset = _HEADER.size - _STAMP.size
+        stamp = (_STAMP.unpack_from(self.map, offset)[0] + 1) & 0xFFFFFFFF
+        _STAMP.pack_into(self.map, offset, stamp)
+        return stamp
+
+    def get(self, file_path, identity):
+        """The stored levels for a file, or None"""
+        key = self._key(file_path, identity)
+        with self.lock:
+            self._open()
+            for offset in self._offsets(key):
+                if self.map[offset:offset + _KEY_SIZE] == key:
+                    _STAMP.pack_into(self.map, offset + _KEY_SIZE, self._next_stamp())
+                    start = offset + _KEY_SIZE + _STAMP.size
+                    return self.map[start:start + self.points]
+        return None
+
+    def put(self, file_path, identity, peaks):
+        key = self._key(file_path, identity)
+        with self.lock:
+            self._open()
+            offsets = self._offsets(key)
+            target = None
+            for offset in offsets:
+                if self.map[offset:offset + _KEY_SIZE] in (key, _EMPTY_KEY):
+                    target = offset
+                    break
+            if target is None:
+                # Replace the least recently used record of the set
+                target = min(offsets, key=lambda offset: _STAMP.unpack_from(self.map, offset + _KEY_SIZE)[0])
+            # Clear the key first so other sessions never pair it with half-written levels
+            self.map[target:target + _KEY_SIZE] = _EMPTY_KEY
+            start = target + _KEY_SIZE + _STAMP.size
+            self.map[start:start + self.points] = peaks
+            _STAMP.pack_into(self.map, target + _KEY_SIZE, self._next_stamp())
+            self.map[target:target + _KEY_SIZE] = key
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+
+
+class WaveformCache:
+    """Overviews by file path: in memory, in the shared store, or computed on a worker"""
+
+    def __init__(self, ffmpeg=None, store=None, capacity=32):
+        self.ffmpeg = ffmpeg
+        self.store = store or WaveformStore()
+        self.capacity = capacity
+        self.enabled = None  # Whether NumPy is there, checked by the first fetch
+        self.peaks = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        # One worker: overviews are never urgent enough to compete with playback
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="waveform")
+
+    def _remember(self, file_path, peaks):
+        with self.lock:
+            self.peaks[file_path] = peaks
+            self.peaks.move_to_end(file_path)
+            while len(self.peaks) > self.capacity:
+                self.peaks.popitem(last=False)
+
+    def lookup(self, file_path):
+        """Memory-only lookup: (found, peaks) where peaks is None if there is no overview"""
+        with self.lock:
+            peaks = self.peaks.get(file_path)
+            if peaks is None:
+                return False, None
+            self.peaks.move_to_end(file_path)
+        return True, (peaks or None)
+
+    def fetch(self, file_path):
+        """Get a file's overview (or None), computing it if needed. Blocking."""
+        found, peaks = self.lookup(file_path)
+        if found:
+            return peaks
+
+        identity = file_identity(file_path)
+        peaks = None
+        if identity is not None:
+            try:
+                peaks = self.store.get(file_path, identity)
+            except (OSError, ValueError) as e:
+                log.warning(f"Could not read waveform cache: {e}")
+        if self.enabled is None:
+            self.enabled = numpy_available()
+        if peaks is None and identity is not None and self.enabled:
+            try:
+                # The window's process plays through pygame, so leave its mixer alone
+                with span('waveform_compute', slow_ms=None):
+                    peaks = compute_peaks(file_path, self.ffmpeg, start_mixer=False)
+            except Exception as e:
+                log.warning(f"Could not compute waveform for {os.path.basename(file_path)}: {e}")
+            if peaks is not None:
+                try:
+                    self.store.put(file_path, identity, peaks)
+                except (OSError, ValueError) as e:
+                    log.warning(f"Could not write waveform cache: {e}")
+
+        self._remember(file_path, peaks or NO_WAVEFORM)
+        return peaks
+
+    def request(self, file_path):
+        """Start computing in the background (if not already) and return its Future"""
+        with self.lock:
+            future = self.pending.get(file_path)
+            if future is not None:
+                return future
+            future = self.pool.submit(self.fetch, file_path)
+            self.pending[file_path] = future
+        future.add_done_callback(lambda f: self._forget_pending(file_path))
+        return future
+
+    def _forget_pending(self, file_path):
+        with self.lock:
+            self.pending.pop(file_path, None)
+
+    def prefetch(self, file_paths):
+        """Prepare overviews for upcoming tracks ahead of time"""
+        for file_path in file_paths:
+            found, _ = self.lookup(file_path)
+            if not found:
+                self.request(file_path)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
@@ -0,0 +1,86 @@
+"""Progress bar that draws the track's waveform overview behind the position.
+
+Each pixel column of the overview is one canvas line, created when the
+overview or the width changes. Moving the position only recolours the
+columns it passed and moves the cursor line, so a tick costs a couple of
+canvas calls however wide the window is. Without an overview the bar looks
+like a plain progress bar.
+"""
+import tkinter as tk
+
+TROUGH_BG = '#e6e6e6'
+PLAYED_FILL = '#0a64c8'
+WAVE_FILL = '#9db4cc'
+CURSOR_FILL = '#003c80'
+
+
+class WaveformBar(tk.Canvas):
+    """Determinate progress bar; bar['value'] and bar['maximum'] work like ttk.Progressbar"""
+
+    def __init__(self, master, height=32, **kwargs):
+        super().__init__(master, height=height, bg=TROUGH_BG, highlightthickness=0, **kwargs)
+        self.value = 0.0
+        self.maximum = 100.0
+        self.peaks = None
+        self.columns = []  # Line item per pixel column of the overview
+        self.played = 0    # Columns currently coloured as played
+        self.fill = self.create_rectangle(0, 0, 0, 0, width=0, fill=PLAYED_FILL)
+        self.cursor = self.create_line(0, 0, 0, 0, fill=CURSOR_FILL, width=2)
+        self.bind('<Configure>', lambda e: self.redraw())
+
+    def __getitem__(self, key):
+        if key in ('value', 'maximum'):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        if key in ('value', 'maximum'):
+            setattr(self, key, float(value))
+            self.update_position()
+        else:
+            super().__setitem__(key, value)
+
+    def set_peaks(self, peaks):
+        """Show an overview (bytes of 0-255 levels), or None for a plain bar"""
+        if peaks != self.peaks:
+            self.peaks = peaks
+            self.redraw()
+
+    def redraw(self):
+        """Rebuild the overview columns for the current size"""
+        self.delete('column')
+        self.columns = []
+        self.played = 0
+        width, height = self.winfo_width(), self.winfo_height()
+        if self.peaks and width > 1:
+            peaks = self.peaks
+            count = len(peaks)
+            # Scale the loudest part of the track to the full height
+            scale = (height / 2 - 1) / max(max(peaks), 1)
+            middle = height / 2
+            for x in range(width):
+                start = x * count // width
+                level = max(peaks[start:max(start + 1, (x + 1) * count // width)]) * scale
+                self.columns.append(self.create_line(x, middle - level, x, middle + level + 1,
+                                                     fill=WAVE_FILL, tags='column'))
+        self.tag_raise(self.cursor)
+        self.update_position()
+
+    def update_position(self):
+        width, height = self.winfo_width(), self.winfo_height()
+        fraction = min(max(self.value / self.maximum, 0.0), 1.0) if self.maximum > 0 else 0.0
+        x = int(fraction * width)
+        if self.columns:
+            # Only recolour the columns the position moved across
+            played = min(x, len(self.columns))
+            if played > self.played:
+                for item in self.columns[self.played:played]:
+                    self.itemconfigure(item, fill=PLAYED_FILL)
+            elif played < self.played:
+                for item in self.columns[played:self.played]:
+                    self.itemconfigure(item, fill=WAVE_FILL)
+            self.played = played
+            self.coords(self.fill, 0, 0, 0, 0)
+        else:
+            self.coords(self.fill, 0, 0, x, height)
+        self.coords(self.cursor, x, 0, x, height)